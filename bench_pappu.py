@@ -0,0 +1,634 @@
+"""
+Pappu offline benchmark – on_message hot path ko bina Discord / Gemini / network ke chalao.
+
+Fake discord objects (User / Channel / Message / Guild), stub Gemini model aur
+fake search provider ke saath:
+  - synthetic ya recorded (JSONL) message stream ko diye gaye rate par replay
+  - handler (on_message) aur ask_pappu latency p50/p99, throughput
+  - event-loop blocking (lag monitor)
+  - state bytes written per message (main.PERSIST_STATS)
+  - hot helpers ke micro-benchmarks: process_deep_memory, build_normal_prompt,
+    handle_secret_admin routing, send_long_message, data reload (pappu reload)
+
+Output ek JSON object hai (stdout ya --out), taaki versions ke beech compare ho sake.
+
+    python bench_pappu.py --messages 2000 --users 200 --channels 4 --out run.json
+    python bench_pappu.py --replay recorded.jsonl --speed 2
+    python bench_pappu.py --startup 10        # cold start → ready, fast vs eager startup
+
+Startup mode: har run ek naya `python` process hai jo main import karke persisted
+state load karta hai (bot ke on_ready tak ka path, Discord login ke bina). Parent
+spawn se "ready" line tak ka wall time naapta hai; fast mode me Gemini SDK import
+(jo pehli LLM call tak tal jaata hai) alag se report hota hai.
+
+Replay file: har line {"author": 12, "channel": 1, "content": "pappu ...",
+"reply_to_bot": false, "owner": false, "at": 0.25}  ("at" = seconds since start, optional)
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+BENCH_OWNER_ID = 1
+BENCH_BOT_ID = 999_999
+
+# main import hone se pehle: koi real key/network nahi, state ek temp dir me
+os.environ["GEMINI_API_KEY"] = ""
+os.environ["SERPAPI_KEY"] = ""
+os.environ["GOOGLE_API_KEY"] = ""
+os.environ["PAPPU_SEARCH_FAKE"] = "1"
+os.environ["OWNER_ID"] = str(BENCH_OWNER_ID)
+os.environ.setdefault("PAPPU_SEARCH_FAKE_DELAY", "0.05")
+
+REPO_DIR = Path(__file__).resolve().parent
+sys.path.insert(0, str(REPO_DIR))
+
+
+# ---------- Stub model ----------
+class _StubResponse:
+    def __init__(self, text: str):
+        self.text = text
+
+
+class StubModel:
+    """generate_content ka blocking stand-in (executor thread me chalta hai, jaise Gemini)."""
+
+    def __init__(self, latency: float, chunks: int, error_rate: float = 0.0, seed: int = 1):
+        self.latency = latency
+        self.chunks = max(1, chunks)
+        self.error_rate = error_rate
+        self.calls = 0
+        self._rng = random.Random(seed)
+
+    def _answer(self, prompt: str) -> str:
+        if "### 1" in prompt:
+            n = prompt.count("\n### ")
+            return "\n".join(f"### {i + 1}\nBatch jawab {i + 1}. Sab badhiya hai." for i in range(n))
+        return "Haan bhai, ye raha jawab. " + "Pappu samjha raha hai step by step. " * 6
+
+    def generate_content(self, prompt: str, stream: bool = False):
+        self.calls += 1
+        if self.error_rate and self._rng.random() < self.error_rate:
+            time.sleep(self.latency)
+            raise RuntimeError("stub model: simulated provider error")
+        text = self._answer(prompt)
+        if not stream:
+            time.sleep(self.latency)
+            return _StubResponse(text)
+        return self._stream(text)
+
+    def _stream(self, text: str):
+        step = max(1, len(text) // self.chunks)
+        for i in range(0, len(text), step):
+            time.sleep(self.latency / self.chunks)
+            yield _StubResponse(text[i:i + step])
+
+
+# ---------- Fake discord objects ----------
+class FakeUser:
+    def __init__(self, uid: int, name: str, bot: bool = False):
+        self.id = uid
+        self.name = name
+        self.display_name = name
+        self.discriminator = "0"
+        self.bot = bot
+        self.mention = f"<@{uid}>"
+
+    def mentioned_in(self, message) -> bool:
+        return any(u.id == self.id for u in message.mentions)
+
+    def __eq__(self, other):
+        return getattr(other, "id", None) == self.id
+
+    def __hash__(self):
+        return self.id
+
+    def __str__(self):
+        return self.name
+
+
+class FakeGuild:
+    def __init__(self, gid: int, me: FakeUser):
+        self.id = gid
+        self.me = me
+        self.roles = []
+
+
+class FakeSentMessage:
+    _next_id = 10_000_000
+
+    def __init__(self, channel, content: str, author: FakeUser):
+        FakeSentMessage._next_id += 1
+        self.id = FakeSentMessage._next_id
+        self.channel = channel
+        self.content = content
+        self.author = author
+        self.reference = None
+        self.mentions = []
+        self.guild = channel.guild
+
+    async def edit(self, content=None, **_):
+        self.content = content
+        self.channel.edits += 1
+
+    async def delete(self):
+        self.channel.sent.pop(self.id, None)
+
+
+class _Typing:
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+
+class FakeChannel:
+    def __init__(self, cid: int, guild: FakeGuild, send_latency: float):
+        self.id = cid
+        self.guild = guild
+        self.mention = f"<#{cid}>"
+        self.send_latency = send_latency
+        self.sent = {}
+        self.sends = 0
+        self.edits = 0
+
+    async def send(self, content=None, **_):
+        if self.send_latency:
+            await asyncio.sleep(self.send_latency)
+        msg = FakeSentMessage(self, content, BOT_USER)
+        self.sent[msg.id] = msg
+        self.sends += 1
+        return msg
+
+    def typing(self):
+        return _Typing()
+
+    def last_bot_message(self):
+        return next(reversed(self.sent.values()), None) if self.sent else None
+
+    def get_partial_message(self, mid):
+        return self.sent.get(mid)
+
+    async def fetch_message(self, mid):
+        return self.sent[mid]
+
+    async def delete_messages(self, messages):
+        for msg in messages:
+            self.sent.pop(msg.id, None)
+
+    async def history(self, limit: int = 100, before=None, after=None, oldest_first=None):
+        """discord.abc.Messageable.history jaisa: before/after = message (ya ID), default naya pehle."""
+        before_id = getattr(before, "id", before)
+        after_id = getattr(after, "id", after)
+        msgs = [
+            m for m in self.sent.values()
+            if (before_id is None or m.id < before_id) and (after_id is None or m.id > after_id)
+        ]
+        if oldest_first is None:
+            oldest_first = after is not None
+        msgs.sort(key=lambda m: m.id, reverse=not oldest_first)
+        for msg in msgs[:limit]:
+            yield msg
+
+
+class FakeReference:
+    def __init__(self, msg):
+        self.message_id = msg.id
+        self.resolved = msg
+        self.cached_message = msg
+
+
+class FakeMessage:
+    _next_id = 1
+
+    def __init__(self, author: FakeUser, content: str, channel: FakeChannel, reply_to=None):
+        FakeMessage._next_id += 1
+        self.id = FakeMessage._next_id
+        self.author = author
+        self.content = content
+        self.channel = channel
+        self.guild = channel.guild
+        self.mentions = []
+        self.channel_mentions = []
+        self.reference = FakeReference(reply_to) if reply_to is not None else None
+        self._reply_to = reply_to
+
+    async def fetch_reference(self):
+        return self._reply_to
+
+
+BOT_USER = FakeUser(BENCH_BOT_ID, "Pappu", bot=True)
+
+
+# ---------- Message streams ----------
+SYNTHETIC_TEMPLATES = [
+    # (weight, kind, text)
+    (30, "chat", "aaj ka match dekha kya {n}"),
+    (10, "chat", "bhai game me lag aa raha hai {n}"),
+    (20, "ask", "pappu python me list sort kaise karte hai"),
+    (10, "ask", "pappu mera naam yaad hai kya"),
+    (8, "ask", "pappu latest news about cricket {n}"),
+    (6, "reply", "isko detail me samjha"),
+    (4, "reply", "isko simple way me bta"),
+    (4, "toxic", "pappu tu chutiya hai"),
+    (4, "admin", "pappu outbox"),
+    (2, "admin", "pappu cache"),
+    (2, "admin", "pappu limits"),
+    (1, "admin", "pappu edit last sahi jawab {n}"),
+    (1, "admin", "pappu delete last 2"),
+]
+
+
+def synthetic_stream(count: int, users: int, channels: int, seed: int):
+    rng = random.Random(seed)
+    weights = [w for w, _, _ in SYNTHETIC_TEMPLATES]
+    for _ in range(count):
+        _, kind, text = rng.choices(SYNTHETIC_TEMPLATES, weights=weights)[0]
+        yield {
+            "author": BENCH_OWNER_ID if kind == "admin" else rng.randint(2, users + 1),
+            "channel": rng.randint(1, channels),
+            "content": text.format(n=rng.randint(1, 50)),
+            "reply_to_bot": kind == "reply",
+        }
+
+
+def replay_stream(path: Path):
+    with open(path, encoding="utf-8") as fh:
+        for line in fh:
+            line = line.strip()
+            if line:
+                rec = json.loads(line)
+                if rec.get("owner"):
+                    rec["author"] = BENCH_OWNER_ID
+                yield rec
+
+
+# ---------- Measurement helpers ----------
+def percentiles(samples, scale: float = 1000.0) -> dict:
+    """Seconds ki list => ms (scale) me count/p50/p99/max/mean."""
+    if not samples:
+        return {"count": 0}
+    data = sorted(samples)
+    n = len(data)
+
+    def pick(q):
+        return data[min(n - 1, int(q * n))] * scale
+
+    return {
+        "count": n,
+        "p50": round(pick(0.50), 4),
+        "p99": round(pick(0.99), 4),
+        "max": round(data[-1] * scale, 4),
+        "mean": round(sum(data) / n * scale, 4),
+    }
+
+
+class LoopLagMonitor:
+    """Chhoti sleep ke overshoot se event-loop blocking naapo."""
+
+    def __init__(self, interval: float = 0.005, threshold: float = 0.002):
+        self.interval = interval
+        self.threshold = threshold
+        self.lags = []
+        self._task = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            start = loop.time()
+            await asyncio.sleep(self.interval)
+            self.lags.append(max(0.0, loop.time() - start - self.interval))
+
+    def start(self):
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+
+    def report(self) -> dict:
+        blocked = [lag for lag in self.lags if lag >= self.threshold]
+        out = percentiles(self.lags)
+        out["blocked_ms_total"] = round(sum(blocked) * 1000, 3)
+        out["blocked_events"] = len(blocked)
+        return out
+
+
+async def micro(fn, iterations: int) -> dict:
+    samples = []
+    for i in range(iterations):
+        t0 = time.perf_counter()
+        res = fn(i)
+        if asyncio.iscoroutine(res):
+            await res
+        samples.append(time.perf_counter() - t0)
+    return percentiles(samples, scale=1_000_000.0)  # microseconds
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=REPO_DIR, stderr=subprocess.DEVNULL, text=True
+        ).strip()
+    except Exception:
+        return "unknown"
+
+
+# ---------- Startup (cold start → ready) ----------
+_STARTUP_CHILD = """
+import asyncio, json, sys, time
+t0 = time.perf_counter()
+import main
+t1 = time.perf_counter()
+asyncio.run(main.ensure_state_loaded())
+t2 = time.perf_counter()
+print(json.dumps({"import_s": t1 - t0, "state_s": t2 - t1, "ready_s": t2 - t0,
+                  "phases": main.STARTUP_TIMINGS}), flush=True)
+t3 = time.perf_counter()
+try:
+    main._genai()
+except Exception:
+    pass
+print(json.dumps({"genai_s": time.perf_counter() - t3}), flush=True)
+"""
+
+
+def _startup_state(workdir: Path):
+    """Typical persisted settings, taaki state load khaali file na padhe."""
+    state = {
+        "owner_dm_only": False, "stealth": False, "english_lock": False, "allow_profanity": False,
+        "mode": "funny", "streaming": True, "memory": {}, "memory_meta": {},
+        "rate_limits": {"llm": {"user": [6, 60], "guild": [60, 60]}},
+    }
+    (workdir / "pappu_state.json").write_text(json.dumps(state), encoding="utf-8")
+
+
+def run_startup(runs: int) -> dict:
+    out = {}
+    for mode, fast in (("fast", "1"), ("eager", "0")):
+        env = dict(os.environ, PAPPU_FAST_START=fast, PAPPU_DEFER_STATE=fast, GEMINI_API_KEY="bench-no-network")
+        env["PYTHONPATH"] = os.pathsep.join(filter(None, [str(REPO_DIR), env.get("PYTHONPATH", "")]))
+        cold, imports, states, genai, phases = [], [], [], [], {}
+        for _ in range(runs):
+            with tempfile.TemporaryDirectory(prefix="pappu-startup-") as workdir:
+                _startup_state(Path(workdir))
+                t0 = time.perf_counter()
+                proc = subprocess.Popen(
+                    [sys.executable, "-c", _STARTUP_CHILD], cwd=workdir, env=env,
+                    stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True,
+                )
+                ready = json.loads(proc.stdout.readline())
+                cold.append(time.perf_counter() - t0)
+                tail = proc.stdout.readline()
+                proc.wait()
+            imports.append(ready["import_s"])
+            states.append(ready["state_s"])
+            for phase, sec in ready["phases"].items():
+                phases.setdefault(phase, []).append(sec)
+            if tail:
+                genai.append(json.loads(tail)["genai_s"])
+        out[mode] = {
+            "cold_to_ready_ms": percentiles(cold),
+            "import_ms": percentiles(imports),
+            "state_load_ms": percentiles(states),
+            # fast mode: ye cost pehli LLM call (worker thread) par; eager me import me hi shaamil
+            "genai_after_ready_ms": percentiles(genai),
+            "phases_ms": {phase: percentiles(v) for phase, v in phases.items()},
+        }
+    return {"bench": "pappu-startup", "runs": runs, "git": git_revision(),
+            "python": platform.python_version(), "startup": out}
+
+
+# ---------- Runner ----------
+async def run_bench(args, main) -> dict:
+    # commands parser discord.py ka hai, hot path ka hissa nahi
+    async def _no_commands(_message):
+        return None
+
+    main.bot.process_commands = _no_commands
+    main.bot._connection.user = BOT_USER
+    main.model = StubModel(args.model_latency, args.stream_chunks, args.model_error_rate, args.seed)
+    main.LLM_CLIENT = main.LLMClient([main.ModelEndpoint("stub", main.model)])
+    main.RUNTIME_SETTINGS["streaming"] = not args.no_stream
+    if args.send_rate <= 0:
+        main.OUTBOUND.rate = 10 ** 9  # Discord bucket off => sirf bot ka apna overhead
+    else:
+        main.OUTBOUND.rate = args.send_rate
+
+    ask_samples = []
+    orig_ask = main.ask_pappu
+
+    async def timed_ask(*a, **kw):
+        t0 = time.perf_counter()
+        try:
+            return await orig_ask(*a, **kw)
+        finally:
+            ask_samples.append(time.perf_counter() - t0)
+
+    main.ask_pappu = timed_ask
+
+    guild = FakeGuild(1, BOT_USER)
+    channels = {}
+    users = {}
+
+    def channel(cid):
+        ch = channels.get(cid)
+        if ch is None:
+            ch = channels[cid] = FakeChannel(cid, guild, args.send_latency)
+        return ch
+
+    def user(uid):
+        u = users.get(uid)
+        if u is None:
+            u = users[uid] = FakeUser(uid, f"user{uid}")
+        return u
+
+    stream = replay_stream(Path(args.replay)) if args.replay else synthetic_stream(
+        args.messages, args.users, args.channels, args.seed
+    )
+    records = list(stream)
+
+    main.start_background_task("persistence", main.persistence_loop)
+    main.start_background_task("expiry", main.expiry_loop)
+    monitor = LoopLagMonitor()
+    monitor.start()
+
+    handler_samples = []
+    errors = 0
+    interval = 1.0 / args.rate if args.rate > 0 else 0.0
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+    for i, rec in enumerate(records):
+        if "at" in rec and args.replay:
+            target = start + float(rec["at"]) / args.speed
+        else:
+            target = start + i * interval
+        delay = target - loop.time()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        ch = channel(int(rec.get("channel", 1)))
+        reply_to = ch.last_bot_message() if rec.get("reply_to_bot") else None
+        msg = FakeMessage(user(int(rec["author"])), rec["content"], ch, reply_to=reply_to)
+        t0 = time.perf_counter()
+        try:
+            await main.on_message(msg)
+        except Exception as e:
+            errors += 1
+            if errors <= 5:
+                print("bench: on_message failed:", repr(e), file=sys.stderr)
+        handler_samples.append(time.perf_counter() - t0)
+        if not interval:
+            await asyncio.sleep(0)  # background workers ko bhi chalne do
+    submitted_in = loop.time() - start
+
+    # scheduler + outbound queues khali hone tak ruko
+    drain_deadline = loop.time() + args.drain_timeout
+    drained = False
+    while loop.time() < drain_deadline:
+        busy = any(main.ASK_SCHEDULER.depth(cid) for cid in channels) or main.ASK_SCHEDULER._workers
+        busy = busy or any(main.OUTBOUND.depth(cid) for cid in channels)
+        if not busy:
+            drained = True
+            break
+        await asyncio.sleep(0.01)
+    total = loop.time() - start
+    await monitor.stop()
+
+    await main.flush_persistent_state()
+    main.save_persistent_state()
+    persisted = dict(main.PERSIST_STATS)
+    n = max(1, len(records))
+    written = persisted["state_bytes"] + persisted["row_bytes"]
+
+    # ---- micro-benchmarks ----
+    ch = channel(1)
+    owner = user(BENCH_OWNER_ID)
+    sample_feats = main.analyze_text("pappu aaj game khelte hai bhai thanks")
+    micro_users = [user(2 + (i % max(1, args.users))) for i in range(args.users)]
+    long_text = ("Pappu ka lamba jawab. " * 60 + "\n") * 5
+    it = args.micro_iterations
+    micro_results = {
+        "process_deep_memory_us": await micro(
+            lambda i: main.process_deep_memory(micro_users[i % len(micro_users)].id, sample_feats), it
+        ),
+        "build_normal_prompt_us": await micro(
+            lambda i: main.build_normal_prompt(
+                "user", "pappu python me list sort kaise", False, "hi", uid=micro_users[i % len(micro_users)].id
+            ), it
+        ),
+        "handle_secret_admin_route_us": await micro(
+            lambda i: main.handle_secret_admin(FakeMessage(owner, "pappu kya haal", ch), "pappu kya haal"), it
+        ),
+        "send_long_message_us": await micro(
+            lambda i: main.send_long_message(ch, long_text), max(1, it // 10)
+        ),
+        # data files padh ke matcher compile + swap (pappu reload / file watcher)
+        "reload_chat_data_us": await micro(lambda i: main.reload_chat_data(), max(1, it // 100)),
+    }
+
+    return {
+        "bench": "pappu",
+        "version": git_revision(),
+        "python": platform.python_version(),
+        "timestamp": int(time.time()),
+        "config": {
+            "messages": len(records),
+            "users": args.users,
+            "channels": len(channels),
+            "rate": args.rate,
+            "replay": args.replay,
+            "seed": args.seed,
+            "model_latency": args.model_latency,
+            "model_error_rate": args.model_error_rate,
+            "streaming": not args.no_stream,
+            "send_rate": args.send_rate,
+            "send_latency": args.send_latency,
+            "memory_backend": main.DEEP_MEMORY_BACKEND,
+        },
+        "throughput_msgs_per_s": round(len(records) / total, 2) if total else None,
+        "ingest_msgs_per_s": round(len(records) / submitted_in, 2) if submitted_in else None,
+        "wall_s": round(total, 3),
+        "drained": drained,
+        "errors": errors,
+        "latency_ms": {
+            "on_message": percentiles(handler_samples),
+            "ask_pappu": percentiles(ask_samples),
+        },
+        "event_loop_lag_ms": monitor.report(),
+        "persistence": {
+            **persisted,
+            "bytes_per_message": round(written / n, 2),
+        },
+        "sends": sum(c.sends for c in channels.values()),
+        "edits": sum(c.edits for c in channels.values()),
+        "model_calls": main.model.calls,
+        "ask_scheduler": dict(main.ASK_SCHEDULER.stats),
+        "micro": micro_results,
+    }
+
+
+def parse_args(argv=None):
+    p = argparse.ArgumentParser(description="Offline benchmark for Pappu's on_message hot path")
+    p.add_argument("--messages", type=int, default=1000, help="synthetic messages (replay ke bina)")
+    p.add_argument("--users", type=int, default=100)
+    p.add_argument("--channels", type=int, default=4)
+    p.add_argument("--rate", type=float, default=0.0, help="messages/sec, 0 = jitna tez ho sake")
+    p.add_argument("--replay", default="", help="recorded JSONL stream")
+    p.add_argument("--speed", type=float, default=1.0, help="replay time scale ('at' field ke liye)")
+    p.add_argument("--seed", type=int, default=1)
+    p.add_argument("--model-latency", type=float, default=0.05, help="stub model seconds per call")
+    p.add_argument("--stream-chunks", type=int, default=5)
+    p.add_argument("--model-error-rate", type=float, default=0.0, help="stub model failure probability")
+    p.add_argument("--no-stream", action="store_true", help="streaming replies off")
+    p.add_argument("--send-rate", type=int, default=0, help="Discord bucket per 5s per channel, 0 = off")
+    p.add_argument("--send-latency", type=float, default=0.0, help="fake channel.send seconds")
+    p.add_argument("--drain-timeout", type=float, default=60.0)
+    p.add_argument("--micro-iterations", type=int, default=2000)
+    p.add_argument("--out", default="", help="JSON output file (default stdout)")
+    p.add_argument("--startup", type=int, default=0, help="N cold-start runs per mode (message bench skip)")
+    return p.parse_args(argv)
+
+
+def main_cli(argv=None):
+    args = parse_args(argv)
+    out_path = Path(args.out).resolve() if args.out else None
+    replay = Path(args.replay).resolve() if args.replay else None
+    if args.startup:
+        result = run_startup(args.startup)
+        payload = json.dumps(result, indent=2, sort_keys=True)
+        if out_path:
+            out_path.write_text(payload + "\n", encoding="utf-8")
+        else:
+            print(payload)
+        return
+    with tempfile.TemporaryDirectory(prefix="pappu-bench-") as workdir:
+        os.chdir(workdir)  # pappu_state.json / pappu_memory.db yahin bante hai
+        if replay:
+            args.replay = str(replay)
+        # bot ke print() warnings stderr par, taaki stdout par sirf JSON rahe
+        with contextlib.redirect_stdout(sys.stderr):
+            import main  # noqa: E402  (env + cwd set hone ke baad)
+
+            result = asyncio.run(run_bench(args, main))
+        os.chdir(REPO_DIR)
+    payload = json.dumps(result, indent=2, sort_keys=True)
+    if out_path:
+        out_path.write_text(payload + "\n", encoding="utf-8")
+    else:
+        print(payload)
+
+
+if __name__ == "__main__":
+    main_cli()
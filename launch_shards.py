@@ -0,0 +1,157 @@
+"""
+Pappu sharded launcher – shards ko kai worker processes (clusters) me baanto.
+
+Har cluster ek alag `python main.py` process hai (AutoShardedBot, apni shard range,
+apna event loop / core). Settings, rate-limit buckets aur deep memory shared SQLite
+file me rehte hain (PAPPU_SHARED_DB / PAPPU_MEMORY_DB), isliye `pappu mode`,
+`pappu stealth` jaise toggles saare clusters me pahuch jaate hain.
+
+    python launch_shards.py                       # shards = Discord recommended, processes = CPU cores
+    python launch_shards.py --shards 8 --processes 4
+
+Crash hua cluster backoff ke saath restart hota hai; koi cluster clean exit (0)
+kare (owner ne `pappu shutdown` bola) to saare clusters band.
+"""
+import argparse
+import json
+import os
+import signal
+import subprocess
+import sys
+import time
+import urllib.request
+from pathlib import Path
+
+from dotenv import load_dotenv
+
+REPO_DIR = Path(__file__).resolve().parent
+GATEWAY_URL = "https://discord.com/api/v10/gateway/bot"
+RESTART_BACKOFF_MAX = 60.0
+
+
+def recommended_shards(token: str) -> int:
+    """Discord ka recommended shard count (GET /gateway/bot)."""
+    req = urllib.request.Request(
+        GATEWAY_URL, headers={"Authorization": f"Bot {token}", "User-Agent": "pappu-launcher"}
+    )
+    with urllib.request.urlopen(req, timeout=10) as resp:
+        return int(json.load(resp)["shards"])
+
+
+def shard_ranges(shards: int, processes: int) -> list:
+    """Shards ko lagbhag barabar contiguous ranges me baanto: [(first, last), ...]."""
+    processes = max(1, min(processes, shards))
+    base, extra = divmod(shards, processes)
+    ranges = []
+    start = 0
+    for i in range(processes):
+        size = base + (1 if i < extra else 0)
+        ranges.append((start, start + size - 1))
+        start += size
+    return ranges
+
+
+class Cluster:
+    def __init__(self, cluster_id: int, first: int, last: int, shards: int):
+        self.cluster_id = cluster_id
+        self.first = first
+        self.last = last
+        self.shards = shards
+        self.proc = None
+        self.restarts = 0
+        self.next_start = 0.0
+
+    def env(self) -> dict:
+        env = dict(os.environ)
+        env.update({
+            "PAPPU_SHARDED": "1",
+            "PAPPU_SHARD_COUNT": str(self.shards),
+            "PAPPU_SHARD_IDS": f"{self.first}-{self.last}",
+            "PAPPU_CLUSTER_ID": str(self.cluster_id),
+        })
+        base_port = int(os.getenv("METRICS_PORT", "0"))
+        if base_port:
+            env["METRICS_PORT"] = str(base_port + self.cluster_id)
+        return env
+
+    def start(self):
+        print(f"[launcher] cluster {self.cluster_id}: shards {self.first}-{self.last} of {self.shards}")
+        self.proc = subprocess.Popen([sys.executable, str(REPO_DIR / "main.py")], env=self.env(), cwd=os.getcwd())
+
+    def stop(self):
+        if self.proc is not None and self.proc.poll() is None:
+            self.proc.terminate()
+
+
+def run(args) -> int:
+    load_dotenv()
+    shards = args.shards or int(os.getenv("PAPPU_SHARD_COUNT", "0"))
+    if not shards:
+        token = os.getenv("DISCORD_TOKEN", "")
+        if not token:
+            print("❌ DISCORD_TOKEN missing in .env")
+            return 1
+        try:
+            shards = recommended_shards(token)
+        except Exception as e:
+            print("Warning: recommended shard count fetch failed, using 1:", e)
+            shards = 1
+    processes = args.processes or os.cpu_count() or 1
+    clusters = [Cluster(i, a, b, shards) for i, (a, b) in enumerate(shard_ranges(shards, processes))]
+
+    stopping = False
+
+    def handle_signal(signum, _frame):
+        nonlocal stopping
+        stopping = True
+
+    signal.signal(signal.SIGTERM, handle_signal)
+    signal.signal(signal.SIGINT, handle_signal)
+
+    # identify rate limit: clusters ek saath login na karein
+    for i, cluster in enumerate(clusters):
+        cluster.next_start = time.monotonic() + i * args.stagger
+
+    exit_code = 0
+    while not stopping:
+        now = time.monotonic()
+        for cluster in clusters:
+            if cluster.proc is None:
+                if now >= cluster.next_start:
+                    cluster.start()
+                continue
+            code = cluster.proc.poll()
+            if code is None:
+                continue
+            if code == 0:
+                print(f"[launcher] cluster {cluster.cluster_id} exited cleanly, stopping all clusters")
+                stopping = True
+                break
+            cluster.restarts += 1
+            delay = min(RESTART_BACKOFF_MAX, 2 ** min(cluster.restarts, 6))
+            print(f"[launcher] cluster {cluster.cluster_id} crashed (exit {code}), restarting in {delay:.0f}s")
+            cluster.proc = None
+            cluster.next_start = now + delay
+        time.sleep(0.5)
+
+    for cluster in clusters:
+        cluster.stop()
+    for cluster in clusters:
+        if cluster.proc is not None:
+            try:
+                cluster.proc.wait(timeout=20)
+            except subprocess.TimeoutExpired:
+                cluster.proc.kill()
+    return exit_code
+
+
+def parse_args(argv=None):
+    p = argparse.ArgumentParser(description="Run Pappu as several sharded worker processes")
+    p.add_argument("--shards", type=int, default=0, help="total shards (default: env / Discord recommended)")
+    p.add_argument("--processes", type=int, default=0, help="worker processes (default: CPU cores)")
+    p.add_argument("--stagger", type=float, default=5.0, help="seconds between cluster logins")
+    return p.parse_args(argv)
+
+
+if __name__ == "__main__":
+    sys.exit(run(parse_args()))
@@ -0,0 +1,405 @@
+"""
+Pappu ka resilient LLM call layer – bot process (main.py) aur LLM gateway
+(llm_gateway.py) dono yahi use karte hain, taaki retries, circuit breaker,
+fallback models, hedging aur stream ke first-chunk timeout har jagah same hon.
+
+Model objects kuch bhi ho sakte hain jinke paas genai jaisa
+generate_content(prompt, stream=False) ho. Metrics by default off; bot process
+use_metrics(METRICS) se apna registry de deta hai.
+"""
+import asyncio
+import contextlib
+import os
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, List, Optional
+
+
+class _NoMetrics:
+    def inc(self, name: str, value: float = 1, **labels):
+        pass
+
+    def timer(self, name: str, **labels):
+        return contextlib.nullcontext()
+
+
+METRICS: Any = _NoMetrics()
+
+
+def use_metrics(metrics: Any):
+    """inc() / timer() wala registry (main.py ka Metrics)."""
+    global METRICS
+    METRICS = metrics
+
+
+# LLM execution layer: generate_content blocking hai, isliye bounded thread pool
+# me chalao. Semaphore asyncio side par wait karata hai (cancel ho sakta hai),
+# executor me sirf utne hi jobs jaate hain jitne workers hain. Slot tab chhootta hai
+# jab worker thread sach me free ho – timeout ke baad bhi atka thread slot gherta hai,
+# to naye requests hung threads ke peeche executor queue me nahi phanste.
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "45"))                    # poori request ka deadline (seconds)
+LLM_ATTEMPT_TIMEOUT = float(os.getenv("LLM_ATTEMPT_TIMEOUT", "20"))    # ek attempt ka max
+LLM_FIRST_CHUNK_TIMEOUT = float(os.getenv("LLM_FIRST_CHUNK_TIMEOUT", "15"))  # stream ka pehla chunk
+LLM_RETRIES = int(os.getenv("LLM_RETRIES", "2"))                       # per model, pehle attempt ke baad
+LLM_BACKOFF_BASE = 0.5
+LLM_BACKOFF_MAX = 4.0
+LLM_BREAKER_FAILURES = int(os.getenv("LLM_BREAKER_FAILURES", "5"))     # lagataar failures => open
+LLM_BREAKER_COOLDOWN = float(os.getenv("LLM_BREAKER_COOLDOWN", "30"))  # seconds open rehta hai
+LLM_HEDGE_PERCENTILE = float(os.getenv("LLM_HEDGE_PERCENTILE", "0.95"))
+LLM_HEDGE_MIN_SAMPLES = 20
+
+_LLM_EXECUTOR = ThreadPoolExecutor(max_workers=LLM_MAX_CONCURRENCY, thread_name_prefix="pappu-llm")
+_LLM_SEMAPHORE = asyncio.Semaphore(LLM_MAX_CONCURRENCY)
+# jin jobs ka caller timeout/cancel se chala gaya par thread abhi bhi provider par atka hai
+_LLM_ABANDONED: set = set()
+# in errors par retry/fallback bekaar hai (request hi galat hai)
+_LLM_FATAL_ERRORS = {"InvalidArgument", "PermissionDenied", "Unauthenticated", "BlockedPromptException"}
+
+
+class CircuitBreaker:
+    """
+    closed -> (N lagataar failures) -> open (cooldown tak model skip) ->
+    half-open (ek probe request) -> success par closed, failure par phir open.
+    Probe bina nateeje ke khatam ho (cancel / hedge haar gaya / stream beech me chhoda)
+    to release(); warna bhi probe slot cooldown ke baad khud expire ho jaata hai.
+    """
+
+    def __init__(self, failures: int, cooldown: float):
+        self.max_failures = failures
+        self.cooldown = cooldown
+        self.failures = 0
+        self.open_until = 0.0
+        self._probe_until = 0.0  # 0 => koi probe chal nahi raha
+
+    @property
+    def state(self) -> str:
+        if self.failures < self.max_failures:
+            return "closed"
+        return "open" if time.monotonic() < self.open_until else "half-open"
+
+    def allow(self) -> bool:
+        state = self.state
+        if state == "closed":
+            return True
+        now = time.monotonic()
+        if state == "half-open" and self._probe_until <= now:
+            self._probe_until = now + self.cooldown
+            return True
+        return False
+
+    def release(self):
+        self._probe_until = 0.0
+
+    def record_success(self):
+        self.failures = 0
+        self._probe_until = 0.0
+
+    def record_failure(self):
+        self.failures += 1
+        self._probe_until = 0.0
+        if self.failures >= self.max_failures:
+            self.open_until = time.monotonic() + self.cooldown
+
+
+class ModelEndpoint:
+    """Ek Gemini model + uska breaker + recent latencies (hedge threshold ke liye)."""
+
+    def __init__(self, name: str, client: Any):
+        self.name = name
+        self.client = client
+        self.breaker = CircuitBreaker(LLM_BREAKER_FAILURES, LLM_BREAKER_COOLDOWN)
+        self.latencies: deque = deque(maxlen=200)
+
+    def percentile(self, q: float) -> Optional[float]:
+        if len(self.latencies) < LLM_HEDGE_MIN_SAMPLES:
+            return None
+        data = sorted(self.latencies)
+        return data[min(len(data) - 1, int(q * len(data)))]
+
+
+def _generate_blocking(client: Any, prompt: str) -> Optional[str]:
+    with METRICS.timer("pappu_llm_seconds", kind="generate"):
+        resp = client.generate_content(prompt)
+    try:
+        return getattr(resp, "text", None)
+    except Exception:
+        # blocked/empty candidates par .text raise karta hai
+        return None
+
+
+def _generate_stream_blocking(client: Any, prompt: str, emit, stop: threading.Event):
+    with METRICS.timer("pappu_llm_seconds", kind="stream"):
+        for chunk in client.generate_content(prompt, stream=True):
+            if stop.is_set():
+                break
+            try:
+                piece = chunk.text
+            except Exception:
+                piece = ""
+            if piece:
+                emit(piece)
+
+
+async def _llm_slot(timeout: float):
+    """Semaphore slot, deadline ke andar hi (pool bhara ho to TimeoutError)."""
+    await asyncio.wait_for(_LLM_SEMAPHORE.acquire(), max(0.01, timeout))
+
+
+def _llm_submit(loop: asyncio.AbstractEventLoop, fn, *args) -> asyncio.Future:
+    """
+    Slot le chuke caller ka executor job. Slot future ke done hone par (yaani thread
+    free hone par) release hota hai, caller ke timeout par nahi.
+    """
+    try:
+        fut = loop.run_in_executor(_LLM_EXECUTOR, fn, *args)
+    except BaseException:
+        _LLM_SEMAPHORE.release()
+        raise
+
+    def _done(f):
+        _LLM_ABANDONED.discard(f)
+        _LLM_SEMAPHORE.release()
+
+    fut.add_done_callback(_done)
+    return fut
+
+
+def _abandon(fut: asyncio.Future):
+    if not fut.done():
+        _LLM_ABANDONED.add(fut)
+
+
+def _backoff(attempt: int) -> float:
+    """Full-jitter exponential backoff."""
+    return random.uniform(0, min(LLM_BACKOFF_MAX, LLM_BACKOFF_BASE * (2 ** attempt)))
+
+
+class LLMUnavailable(RuntimeError):
+    """Saare models fail / breaker open / deadline khatam."""
+
+
+class LLMClient:
+    """
+    genai models ke aage resilient wrapper:
+    - har model par jittered exponential backoff ke saath retries
+    - per-model circuit breaker: fail ho raha model seedha skip
+    - ordered fallback models
+    - optional hedge: primary apne p95 se slow ho to lighter model ko duplicate request,
+      jo pehle aaye wahi jawab
+    Poori request LLM_TIMEOUT deadline ke andar – tail latency bounded.
+    """
+
+    def __init__(self, endpoints: List[ModelEndpoint], hedge: Optional[ModelEndpoint] = None):
+        self.endpoints = endpoints
+        self.hedge = hedge
+
+    # ---- non-streaming ----
+    async def _attempt(self, ep: ModelEndpoint, prompt: str, timeout: float) -> Optional[str]:
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        try:
+            await _llm_slot(timeout)
+        except asyncio.CancelledError:
+            ep.breaker.release()
+            raise
+        except asyncio.TimeoutError:
+            ep.breaker.release()  # pool bhara tha – model ki galti nahi
+            raise LLMUnavailable("LLM worker pool saturated")
+        start = loop.time()
+        fut = _llm_submit(loop, _generate_blocking, ep.client, prompt)
+        try:
+            # shield: timeout par future cancel nahi hota, slot thread khatam hone tak ghira rehta hai
+            out = await asyncio.wait_for(asyncio.shield(fut), max(0.01, deadline - start))
+        except asyncio.CancelledError:
+            _abandon(fut)
+            ep.breaker.release()  # hedge haar gaya – model ki galti nahi, probe slot wapas
+            raise
+        except Exception:
+            _abandon(fut)
+            ep.breaker.record_failure()
+            raise
+        ep.latencies.append(loop.time() - start)
+        ep.breaker.record_success()
+        return out
+
+    async def _hedged(self, ep: ModelEndpoint, prompt: str, timeout: float) -> Optional[str]:
+        hedge = self.hedge
+        after = ep.percentile(LLM_HEDGE_PERCENTILE) if hedge is not None and hedge is not ep else None
+        primary = asyncio.ensure_future(self._attempt(ep, prompt, timeout))
+        if after is None or after >= timeout:
+            return await primary
+        done, _ = await asyncio.wait({primary}, timeout=after)
+        # pool already full ho to duplicate request sirf load badhayega
+        if done or _LLM_SEMAPHORE.locked() or not hedge.breaker.allow():
+            return await primary
+        METRICS.inc("pappu_llm_hedges_total")
+        backup = asyncio.ensure_future(self._attempt(hedge, prompt, max(0.01, timeout - after)))
+        pending = {primary, backup}
+        error: Optional[BaseException] = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is backup:
+                            METRICS.inc("pappu_llm_hedge_wins_total")
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+            if backup in pending:
+                # shuru hone se pehle cancel hua task _attempt tak pahuchta hi nahi
+                hedge.breaker.release()
+
+    async def generate(self, prompt: str, timeout: Optional[float] = None) -> Optional[str]:
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + (timeout or LLM_TIMEOUT)
+        last_error: Optional[BaseException] = None
+        for index, ep in enumerate(self.endpoints):
+            if index:
+                METRICS.inc("pappu_llm_fallbacks_total", model=ep.name)
+            for attempt in range(LLM_RETRIES + 1):
+                if not ep.breaker.allow():
+                    break
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    raise LLMUnavailable("LLM deadline exceeded") from last_error
+                try:
+                    return await self._hedged(ep, prompt, min(remaining, LLM_ATTEMPT_TIMEOUT))
+                except Exception as e:
+                    last_error = e
+                    METRICS.inc("pappu_llm_failures_total", model=ep.name)
+                    if type(e).__name__ in _LLM_FATAL_ERRORS:
+                        break
+                    delay = _backoff(attempt)
+                    if attempt < LLM_RETRIES and loop.time() + delay < deadline:
+                        METRICS.inc("pappu_llm_retries_total")
+                        await asyncio.sleep(delay)
+        raise LLMUnavailable("all LLM models failing or circuit open") from last_error
+
+    # ---- streaming ----
+    async def _stream_once(self, ep: ModelEndpoint, prompt: str, deadline: float):
+        """
+        Ek model ka stream. Worker thread chunks ko loop ki queue me daalta hai;
+        consumer ruk jaaye (timeout/cancel) to thread ko stop signal milta hai.
+        """
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue()
+        stop = threading.Event()
+        done = object()
+
+        def emit(item):
+            try:
+                loop.call_soon_threadsafe(queue.put_nowait, item)
+            except RuntimeError:
+                stop.set()  # loop band ho chuka
+
+        def run():
+            try:
+                _generate_stream_blocking(ep.client, prompt, emit, stop)
+            except Exception as e:
+                emit(e)
+            finally:
+                emit(done)
+
+        try:
+            await _llm_slot(deadline - loop.time())
+        except asyncio.TimeoutError:
+            raise LLMUnavailable("LLM worker pool saturated")
+        job = _llm_submit(loop, run)
+        first_by = min(deadline, loop.time() + LLM_FIRST_CHUNK_TIMEOUT)
+        try:
+            while True:
+                wait_until = first_by if first_by is not None else deadline
+                item = await asyncio.wait_for(queue.get(), max(0.01, wait_until - loop.time()))
+                first_by = None
+                if item is done:
+                    break
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        finally:
+            stop.set()
+            _abandon(job)
+
+    async def stream(self, prompt: str, timeout: Optional[float] = None):
+        """Retry/fallback sirf pehla chunk aane se pehle; uske baad error caller tak."""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + (timeout or LLM_TIMEOUT)
+        last_error: Optional[BaseException] = None
+        for index, ep in enumerate(self.endpoints):
+            if index:
+                METRICS.inc("pappu_llm_fallbacks_total", model=ep.name)
+            for attempt in range(LLM_RETRIES + 1):
+                if not ep.breaker.allow():
+                    break
+                if deadline - loop.time() <= 0:
+                    raise LLMUnavailable("LLM deadline exceeded") from last_error
+                started = False
+                # explicit aclose: consumer ruke to worker ko stop signal turant (GC ke bharose nahi)
+                chunks = self._stream_once(ep, prompt, deadline)
+                try:
+                    try:
+                        async for piece in chunks:
+                            started = True
+                            yield piece
+                    finally:
+                        await chunks.aclose()
+                    ep.breaker.record_success()
+                    return
+                except (asyncio.CancelledError, GeneratorExit):
+                    # consumer ne stream chhoda / cancel: chunk aa chuka tha to model theek hai
+                    if started:
+                        ep.breaker.record_success()
+                    else:
+                        ep.breaker.release()
+                    raise
+                except Exception as e:
+                    if isinstance(e, LLMUnavailable):
+                        ep.breaker.release()  # pool saturated – model ki galti nahi
+                    else:
+                        ep.breaker.record_failure()
+                    METRICS.inc("pappu_llm_failures_total", model=ep.name)
+                    if started:
+                        raise
+                    last_error = e
+                    if type(e).__name__ in _LLM_FATAL_ERRORS:
+                        break
+                    delay = _backoff(attempt)
+                    if attempt < LLM_RETRIES and loop.time() + delay < deadline:
+                        METRICS.inc("pappu_llm_retries_total")
+                        await asyncio.sleep(delay)
+        raise LLMUnavailable("all LLM models failing or circuit open") from last_error
+
+    def status(self) -> List[str]:
+        lines = []
+        for ep in self.endpoints + ([self.hedge] if self.hedge and self.hedge not in self.endpoints else []):
+            p95 = ep.percentile(0.95)
+            lines.append(
+                f"{ep.name}: breaker {ep.breaker.state}, failures {ep.breaker.failures}"
+                + (f", p95 {p95 * 1000:.0f}ms" if p95 is not None else "")
+            )
+        return lines
+
+
+def resize_pool(workers: int):
+    """
+    Worker pool ka size badlo (gateway process apna concurrency cap deta hai).
+    Sirf startup par, koi LLM call chalne se pehle.
+    """
+    global LLM_MAX_CONCURRENCY, _LLM_EXECUTOR, _LLM_SEMAPHORE
+    LLM_MAX_CONCURRENCY = max(1, workers)
+    _LLM_EXECUTOR.shutdown(wait=False)
+    _LLM_EXECUTOR = ThreadPoolExecutor(max_workers=LLM_MAX_CONCURRENCY, thread_name_prefix="pappu-llm")
+    _LLM_SEMAPHORE = asyncio.Semaphore(LLM_MAX_CONCURRENCY)
+
+
+def abandoned_count() -> int:
+    """Timeout/cancel ke baad bhi provider par atke worker threads."""
+    return len(_LLM_ABANDONED)
@@ -0,0 +1,604 @@
+"""
+Pappu LLM gateway – ek local process jo saare bot processes ke prompt jobs leta hai.
+
+Bot processes (PAPPU_LLM_GATEWAY set ho to) apna Gemini call yahan bhejte hain;
+gateway centrally:
+  - response cache (cache_key wale jobs, saare processes ke beech shared)
+  - in-flight dedup: same prompt/cache_key already chal raha ho to wahi result
+  - provider quota: global requests-per-minute token bucket
+  - concurrency cap (GATEWAY_MAX_CONCURRENCY)
+  - micro-batching: chhote "batchable" generate jobs (same preamble) GATEWAY_BATCH_WINDOW
+    ke andar aaye to ek hi model call, "### n" numbered format me
+Backends: "gemini" (GEMINI_API_KEY; llm_client.LLMClient ke through – retries, breaker,
+fallback/hedge models wahi jo bot process me) ya "stub" (offline, network nahi).
+
+    python llm_gateway.py                                  # pappu_llm.sock par, gemini backend
+    python llm_gateway.py --backend stub --listen 127.0.0.1:8765
+    python llm_gateway.py --backend stub --selftest 2000   # offline throughput test, JSON output
+
+Protocol: newline-delimited JSON. Request
+  {"id": 1, "op": "generate"|"stream", "prompt": "...", "timeout": 45,
+   "cache_key": "...", "ttl": 600, "batchable": false, "preamble": "...", "question": "..."}
+  batchable job akela rahe to "prompt" hi model tak jaata hai; preamble + question sirf
+  2+ jobs ke combined batch prompt me use hote hain.
+Response: {"id": 1, "ok": true, "text": "...", "cached": false}
+          stream: {"id": 1, "chunk": "..."} ... {"id": 1, "ok": true, "done": true}
+          error:  {"id": 1, "ok": false, "error": "unavailable" | "rate_limited" | "timeout" | "bad_request"}
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import re
+import sys
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+DEFAULT_ADDRESS = os.getenv("PAPPU_LLM_GATEWAY_LISTEN", "pappu_llm.sock")
+GATEWAY_MAX_CONCURRENCY = int(os.getenv("GATEWAY_MAX_CONCURRENCY", "16"))
+GATEWAY_RPM = float(os.getenv("GATEWAY_RPM", "600"))              # provider quota (0 = unlimited)
+GATEWAY_CACHE_SIZE = int(os.getenv("GATEWAY_CACHE_SIZE", "2048"))
+GATEWAY_BATCH_WINDOW = float(os.getenv("GATEWAY_BATCH_WINDOW", "0.02"))  # seconds
+GATEWAY_BATCH_MAX = int(os.getenv("GATEWAY_BATCH_MAX", "4"))
+GATEWAY_TIMEOUT = 45.0
+_STREAM_LIMIT = 2 ** 24  # ek JSON line ka max size
+_BATCH_SPLIT_RE = re.compile(r"^###\s*(\d+)\s*$", re.M)
+
+
+def parse_address(address: str):
+    """"host:port" => ("tcp", host, port); warna unix socket path."""
+    host, sep, port = address.rpartition(":")
+    if sep and port.isdigit():
+        return ("tcp", host or "127.0.0.1", int(port))
+    return ("unix", address, None)
+
+
+class GatewayError(RuntimeError):
+    """Gateway ne job reject/fail kiya (code = error field)."""
+
+    def __init__(self, code: str):
+        super().__init__(f"LLM gateway: {code}")
+        self.code = code
+
+
+# ---------- Backends ----------
+class StubBackend:
+    """Offline backend: fixed latency, deterministic jawab, batch format samajhta hai."""
+
+    def __init__(self, latency: float = 0.2, chunks: int = 4):
+        self.latency = latency
+        self.chunks = max(1, chunks)
+        self.calls = 0
+
+    def _answer(self, prompt: str) -> str:
+        numbers = _BATCH_SPLIT_RE.findall(prompt)
+        if numbers:
+            return "\n".join(f"### {n}\nStub jawab {n}." for n in numbers)
+        return "Stub jawab: " + prompt[-60:].strip()
+
+    async def generate(self, prompt: str, timeout: Optional[float] = None) -> str:
+        self.calls += 1
+        await asyncio.sleep(self.latency)
+        return self._answer(prompt)
+
+    async def stream(self, prompt: str, timeout: Optional[float] = None):
+        self.calls += 1
+        text = self._answer(prompt)
+        step = max(1, len(text) // self.chunks)
+        for i in range(0, len(text), step):
+            await asyncio.sleep(self.latency / self.chunks)
+            yield text[i:i + step]
+
+
+class GeminiBackend:
+    """
+    Gemini models llm_client.LLMClient ke through: wahi retries, per-model breaker,
+    fallbacks (GEMINI_FALLBACK_MODELS), hedge (GEMINI_HEDGE_MODEL) aur stream
+    stop/first-chunk timeout jo bot process me direct calls ko milte hain.
+    """
+
+    def __init__(self, model_name: str, workers: int):
+        import google.generativeai as genai
+        import llm_client  # dotenv load ke baad (LLM_* env isi import par padhe jaate hain)
+
+        genai.configure(api_key=os.getenv("GEMINI_API_KEY", ""))
+        llm_client.resize_pool(workers)
+        fallbacks = [m.strip() for m in os.getenv("GEMINI_FALLBACK_MODELS", "").split(",") if m.strip()]
+        hedge_name = os.getenv("GEMINI_HEDGE_MODEL", "").strip()
+        by_name: Dict[str, Any] = {}
+        for name in [model_name] + fallbacks + ([hedge_name] if hedge_name else []):
+            if name not in by_name:
+                by_name[name] = llm_client.ModelEndpoint(name, genai.GenerativeModel(name))
+        endpoints = [by_name[name] for name in dict.fromkeys([model_name] + fallbacks)]
+        self.client = llm_client.LLMClient(endpoints, hedge=by_name.get(hedge_name))
+        self.calls = 0
+
+    async def generate(self, prompt: str, timeout: Optional[float] = None) -> Optional[str]:
+        self.calls += 1
+        return await self.client.generate(prompt, timeout)
+
+    async def stream(self, prompt: str, timeout: Optional[float] = None):
+        self.calls += 1
+        chunks = self.client.stream(prompt, timeout)
+        try:
+            async for piece in chunks:
+                yield piece
+        finally:
+            await chunks.aclose()
+
+    def status(self) -> List[str]:
+        return self.client.status()
+
+
+# ---------- Gateway ----------
+class _TTLCache:
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._data: "OrderedDict[str, tuple]" = OrderedDict()
+
+    def get(self, key: str) -> Optional[str]:
+        entry = self._data.get(key)
+        if entry is None or entry[0] < time.monotonic():
+            self._data.pop(key, None)
+            return None
+        self._data.move_to_end(key)
+        return entry[1]
+
+    def put(self, key: str, value: str, ttl: float):
+        self._data[key] = (time.monotonic() + ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+
+class _QuotaBucket:
+    """Provider requests-per-minute; khali ho to job intezaar kare (deadline tak)."""
+
+    def __init__(self, rpm: float):
+        self.rate = rpm / 60.0
+        self.capacity = max(1.0, rpm / 6.0)  # ~10s ka burst
+        self.tokens = self.capacity
+        self.stamp = time.monotonic()
+
+    def wait_time(self) -> float:
+        if not self.rate:
+            return 0.0
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.stamp) * self.rate)
+        self.stamp = now
+        self.tokens -= 1  # reserve; negative => queue me aage wale
+        return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+    def refund(self):
+        self.tokens = min(self.capacity, self.tokens + 1)
+
+
+class _BatchJob:
+    """
+    prompt = bot ka poora prompt (akele call ke liye); question sirf batch prompt me jaata hai.
+    from_batch = jawab combined batch prompt se nikla (cache karne layak nahi).
+    """
+
+    __slots__ = ("question", "prompt", "future", "from_batch")
+
+    def __init__(self, question: str, prompt: str, future: asyncio.Future):
+        self.question = question
+        self.prompt = prompt
+        self.future = future
+        self.from_batch = False
+
+
+class LLMGateway:
+    def __init__(self, backend: Any, max_concurrency: int = GATEWAY_MAX_CONCURRENCY, rpm: float = GATEWAY_RPM,
+                 batch_window: float = GATEWAY_BATCH_WINDOW, batch_max: int = GATEWAY_BATCH_MAX):
+        self.backend = backend
+        self.cache = _TTLCache(GATEWAY_CACHE_SIZE)
+        self.quota = _QuotaBucket(rpm)
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        self.batch_window = batch_window
+        self.batch_max = batch_max
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._batches: Dict[str, List[_BatchJob]] = {}
+        self.stats = {"requests": 0, "cache_hits": 0, "dedup_hits": 0, "batches": 0, "batched": 0,
+                      "rate_limited": 0, "errors": 0, "backend_calls": 0}
+
+    # ---- backend access (quota + concurrency cap) ----
+    async def _admit(self, deadline: float):
+        wait = self.quota.wait_time()
+        if wait and time.monotonic() + wait > deadline:
+            self.quota.refund()
+            self.stats["rate_limited"] += 1
+            raise GatewayError("rate_limited")
+        if wait:
+            await asyncio.sleep(wait)
+
+    async def _call(self, prompt: str, deadline: float) -> Optional[str]:
+        await self._admit(deadline)
+        async with self.semaphore:
+            self.stats["backend_calls"] += 1
+            remaining = max(0.01, deadline - time.monotonic())
+            return await asyncio.wait_for(self.backend.generate(prompt, remaining), remaining)
+
+    # ---- micro-batching ----
+    async def _batched(self, preamble: str, question: str, prompt: str, deadline: float) -> tuple:
+        """(text, from_batch)."""
+        fut = asyncio.get_running_loop().create_future()
+        group = self._batches.get(preamble)
+        if group is None:
+            group = self._batches[preamble] = []
+            asyncio.get_running_loop().call_later(
+                self.batch_window, lambda: asyncio.ensure_future(self._flush_batch(preamble, deadline))
+            )
+        job = _BatchJob(question, prompt, fut)
+        group.append(job)
+        if len(group) >= self.batch_max:
+            self._batches.pop(preamble, None)
+            asyncio.ensure_future(self._run_batch(preamble, group, deadline))
+        text = await fut
+        return text, job.from_batch
+
+    async def _flush_batch(self, preamble: str, deadline: float):
+        group = self._batches.pop(preamble, None)
+        if group:
+            await self._run_batch(preamble, group, deadline)
+
+    async def _run_batch(self, preamble: str, jobs: List[_BatchJob], deadline: float):
+        if len(jobs) == 1:
+            job = jobs[0]
+            await self._settle(job.future, self._call(job.prompt, deadline))
+            return
+        self.stats["batches"] += 1
+        self.stats["batched"] += len(jobs)
+        questions = "\n".join(f"### {i + 1}\n{job.question}" for i, job in enumerate(jobs))
+        prompt = (
+            preamble
+            + "\n\nSeveral different users asked you questions at the same time. "
+            "Answer each one separately and independently, in the same numbered format: "
+            "a line '### <number>' followed by that answer. Do not add anything else.\n\n"
+            + questions
+        )
+        answers: Dict[int, str] = {}
+        try:
+            out = await self._call(prompt, deadline) or ""
+            parts = _BATCH_SPLIT_RE.split(out)
+            for i in range(1, len(parts) - 1, 2):
+                ans = parts[i + 1].strip()
+                if ans:
+                    answers[int(parts[i])] = ans
+        except Exception:
+            pass
+        for i, job in enumerate(jobs):
+            if job.future.done():
+                continue
+            if i + 1 in answers:
+                job.from_batch = True
+                job.future.set_result(answers[i + 1])
+            else:
+                # batch se nahi nikla – is job ke liye akela call
+                await self._settle(job.future, self._call(job.prompt, deadline))
+
+    @staticmethod
+    async def _settle(fut: asyncio.Future, coro):
+        try:
+            result = await coro
+        except BaseException as e:
+            if not fut.done():
+                fut.set_exception(e)
+            return
+        if not fut.done():
+            fut.set_result(result)
+
+    # ---- request handling ----
+    async def generate(self, req: Dict[str, Any]) -> Dict[str, Any]:
+        batchable = bool(req.get("batchable") and req.get("preamble") and req.get("question"))
+        prompt = req.get("prompt") or (req["preamble"] + "\n\n" + req["question"] if batchable else "")
+        deadline = time.monotonic() + float(req.get("timeout") or GATEWAY_TIMEOUT)
+        cache_key = req.get("cache_key")
+        if cache_key:
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                self.stats["cache_hits"] += 1
+                return {"ok": True, "text": cached, "cached": True}
+        flight_key = cache_key or ("p:" + prompt)
+        pending = self._inflight.get(flight_key)
+        if pending is not None:
+            self.stats["dedup_hits"] += 1
+            text = await asyncio.shield(pending)
+            return {"ok": True, "text": text, "cached": False}
+
+        fut = asyncio.get_running_loop().create_future()
+        self._inflight[flight_key] = fut
+        try:
+            from_batch = False
+            if batchable and self.batch_max > 1:
+                text, from_batch = await self._batched(req["preamble"], req["question"], prompt, deadline)
+            else:
+                text = await self._call(prompt, deadline)
+            fut.set_result(text)
+        except BaseException as e:
+            fut.set_exception(e)
+            fut.exception()  # "never retrieved" warning mat do
+            raise
+        finally:
+            self._inflight.pop(flight_key, None)
+        # batch fragment akele sawaal ke jawab jaisa nahi – cache me nahi
+        if cache_key and text and not from_batch:
+            self.cache.put(cache_key, text, float(req.get("ttl") or 600))
+        return {"ok": True, "text": text, "cached": False}
+
+    async def stream(self, req: Dict[str, Any], send):
+        deadline = time.monotonic() + float(req.get("timeout") or GATEWAY_TIMEOUT)
+        await self._admit(deadline)
+        async with self.semaphore:
+            self.stats["backend_calls"] += 1
+            agen = self.backend.stream(req.get("prompt") or "", max(0.01, deadline - time.monotonic()))
+            try:
+                while True:
+                    try:
+                        piece = await asyncio.wait_for(agen.__anext__(), max(0.01, deadline - time.monotonic()))
+                    except StopAsyncIteration:
+                        break
+                    await send({"id": req.get("id"), "chunk": piece})
+            finally:
+                await agen.aclose()
+        return {"ok": True, "done": True}
+
+    async def handle(self, req: Dict[str, Any], send):
+        self.stats["requests"] += 1
+        rid = req.get("id")
+        try:
+            op = req.get("op")
+            if op == "generate":
+                resp = await self.generate(req)
+            elif op == "stream":
+                resp = await self.stream(req, send)
+            elif op == "stats":
+                resp = {"ok": True, "stats": dict(self.stats, backend_calls_total=getattr(self.backend, "calls", 0))}
+                if hasattr(self.backend, "status"):
+                    resp["stats"]["models"] = self.backend.status()
+            else:
+                resp = {"ok": False, "error": "bad_request"}
+        except GatewayError as e:
+            resp = {"ok": False, "error": e.code}
+        except asyncio.TimeoutError:
+            self.stats["errors"] += 1
+            resp = {"ok": False, "error": "timeout"}
+        except Exception as e:
+            self.stats["errors"] += 1
+            print("Warning: gateway job failed:", repr(e))
+            resp = {"ok": False, "error": "unavailable"}
+        resp["id"] = rid
+        await send(resp)
+
+    async def serve_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        lock = asyncio.Lock()
+        tasks = set()
+
+        async def send(obj):
+            data = (json.dumps(obj, ensure_ascii=False) + "\n").encode("utf-8")
+            async with lock:
+                writer.write(data)
+                await writer.drain()
+
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    req = json.loads(line)
+                except ValueError:
+                    await send({"ok": False, "error": "bad_request"})
+                    continue
+                task = asyncio.ensure_future(self.handle(req, send))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.CancelledError):
+            pass
+        finally:
+            for task in tasks:
+                task.cancel()
+            writer.close()
+
+    async def start(self, address: str):
+        kind, host, port = parse_address(address)
+        if kind == "tcp":
+            return await asyncio.start_server(self.serve_connection, host, port, limit=_STREAM_LIMIT)
+        if os.path.exists(host):
+            os.unlink(host)  # purane run ka stale socket
+        return await asyncio.start_unix_server(self.serve_connection, host, limit=_STREAM_LIMIT)
+
+
+# ---------- Client (bot processes isse use karte hain) ----------
+class GatewayClient:
+    """
+    Ek persistent connection, request ids se multiplexed. Connection toote to
+    pending jobs fail (caller ka fallback chalega) aur agli call par reconnect.
+    """
+
+    def __init__(self, address: str):
+        self.address = address
+        self._reader: Optional[asyncio.StreamReader] = None
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._read_task: Optional[asyncio.Task] = None
+        self._connect_lock: Optional[asyncio.Lock] = None
+        self._ids = itertools.count(1)
+        self._waiters: Dict[int, Any] = {}  # id -> Future (generate) ya Queue (stream)
+
+    async def _ensure(self):
+        if self._writer is not None and not self._writer.is_closing():
+            return
+        if self._connect_lock is None:
+            self._connect_lock = asyncio.Lock()
+        async with self._connect_lock:
+            if self._writer is not None and not self._writer.is_closing():
+                return
+            kind, host, port = parse_address(self.address)
+            if kind == "tcp":
+                self._reader, self._writer = await asyncio.open_connection(host, port, limit=_STREAM_LIMIT)
+            else:
+                self._reader, self._writer = await asyncio.open_unix_connection(host, limit=_STREAM_LIMIT)
+            self._read_task = asyncio.ensure_future(self._read_loop())
+
+    async def _read_loop(self):
+        try:
+            while True:
+                line = await self._reader.readline()
+                if not line:
+                    break
+                msg = json.loads(line)
+                waiter = self._waiters.get(msg.get("id"))
+                if waiter is None:
+                    continue
+                if isinstance(waiter, asyncio.Queue):
+                    waiter.put_nowait(msg)
+                elif not waiter.done():
+                    waiter.set_result(msg)
+        except Exception:
+            pass
+        finally:
+            self._writer = None
+            for waiter in list(self._waiters.values()):
+                if isinstance(waiter, asyncio.Queue):
+                    waiter.put_nowait({"ok": False, "error": "unavailable"})
+                elif not waiter.done():
+                    waiter.set_exception(GatewayError("unavailable"))
+
+    async def _send(self, req: Dict[str, Any]):
+        await self._ensure()
+        self._writer.write((json.dumps(req, ensure_ascii=False) + "\n").encode("utf-8"))
+        await self._writer.drain()
+
+    async def generate(self, prompt: str, timeout: float = GATEWAY_TIMEOUT, **extra) -> Optional[str]:
+        rid = next(self._ids)
+        fut = asyncio.get_running_loop().create_future()
+        self._waiters[rid] = fut
+        try:
+            await self._send({"id": rid, "op": "generate", "prompt": prompt, "timeout": timeout, **extra})
+            msg = await asyncio.wait_for(fut, timeout + 1)
+        finally:
+            self._waiters.pop(rid, None)
+        if not msg.get("ok"):
+            raise GatewayError(msg.get("error", "unavailable"))
+        return msg.get("text")
+
+    async def stream(self, prompt: str, timeout: float = GATEWAY_TIMEOUT):
+        rid = next(self._ids)
+        queue: asyncio.Queue = asyncio.Queue()
+        self._waiters[rid] = queue
+        deadline = time.monotonic() + timeout + 1
+        try:
+            await self._send({"id": rid, "op": "stream", "prompt": prompt, "timeout": timeout})
+            while True:
+                msg = await asyncio.wait_for(queue.get(), max(0.01, deadline - time.monotonic()))
+                if "chunk" in msg:
+                    yield msg["chunk"]
+                    continue
+                if not msg.get("ok"):
+                    raise GatewayError(msg.get("error", "unavailable"))
+                return
+        finally:
+            self._waiters.pop(rid, None)
+
+    async def stats(self) -> Dict[str, Any]:
+        rid = next(self._ids)
+        fut = asyncio.get_running_loop().create_future()
+        self._waiters[rid] = fut
+        try:
+            await self._send({"id": rid, "op": "stats"})
+            return (await asyncio.wait_for(fut, 5)).get("stats", {})
+        finally:
+            self._waiters.pop(rid, None)
+
+    async def close(self):
+        if self._writer is not None:
+            self._writer.close()
+        if self._read_task is not None:
+            self._read_task.cancel()
+
+
+# ---------- CLI ----------
+def make_backend(args):
+    if args.backend == "stub":
+        return StubBackend(args.stub_latency)
+    return GeminiBackend(args.model, GATEWAY_MAX_CONCURRENCY)
+
+
+async def selftest(args) -> Dict[str, Any]:
+    """Offline throughput: stub backend + N concurrent jobs (kuch repeat, kuch batchable)."""
+    address = args.listen if parse_address(args.listen)[0] == "tcp" else f"pappu_llm_selftest_{os.getpid()}.sock"
+    gateway = LLMGateway(make_backend(args), rpm=args.rpm)
+    server = await gateway.start(address)
+    client = GatewayClient(address)
+    sem = asyncio.Semaphore(args.concurrency)
+    latencies = []
+
+    async def one(i: int):
+        async with sem:
+            t0 = time.perf_counter()
+            if i % 3 == 0:
+                await client.generate(f"common question {i % 20}", cache_key=f"q{i % 20}", ttl=60)
+            elif i % 3 == 1:
+                await client.generate("", batchable=True, preamble="You are Pappu.", question=f"sawaal {i}")
+            else:
+                async for _ in client.stream(f"stream prompt {i}"):
+                    pass
+            latencies.append(time.perf_counter() - t0)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(args.selftest)))
+    wall = time.perf_counter() - start
+    stats = await client.stats()
+    await client.close()
+    server.close()
+    if parse_address(address)[0] == "unix" and os.path.exists(address):
+        os.unlink(address)
+    latencies.sort()
+    n = len(latencies)
+    return {
+        "jobs": n,
+        "wall_s": round(wall, 3),
+        "jobs_per_s": round(n / wall, 1) if wall else None,
+        "p50_ms": round(latencies[n // 2] * 1000, 2) if n else None,
+        "p99_ms": round(latencies[min(n - 1, int(n * 0.99))] * 1000, 2) if n else None,
+        "gateway": stats,
+    }
+
+
+async def serve(args):
+    gateway = LLMGateway(make_backend(args), rpm=args.rpm)
+    server = await gateway.start(args.listen)
+    print(f"LLM gateway listening on {args.listen} ({args.backend} backend)")
+    async with server:
+        await server.serve_forever()
+
+
+def parse_args(argv=None):
+    p = argparse.ArgumentParser(description="Local LLM gateway for Pappu bot processes")
+    p.add_argument("--listen", default=DEFAULT_ADDRESS, help="unix socket path ya host:port")
+    p.add_argument("--backend", choices=("gemini", "stub"), default=os.getenv("GATEWAY_BACKEND", "gemini"))
+    p.add_argument("--model", default=os.getenv("GEMINI_MODEL", "gemini-2.5-flash"))
+    p.add_argument("--stub-latency", type=float, default=0.2)
+    p.add_argument("--rpm", type=float, default=GATEWAY_RPM, help="provider requests/minute, 0 = unlimited")
+    p.add_argument("--selftest", type=int, default=0, help="N jobs ka offline throughput test chalao")
+    p.add_argument("--concurrency", type=int, default=64, help="selftest me parallel clients")
+    return p.parse_args(argv)
+
+
+if __name__ == "__main__":
+    try:
+        from dotenv import load_dotenv
+
+        load_dotenv()
+    except ImportError:
+        pass
+    cli = parse_args()
+    if cli.selftest:
+        print(json.dumps(asyncio.run(selftest(cli)), indent=2, sort_keys=True))
+    else:
+        try:
+            asyncio.run(serve(cli))
+        except KeyboardInterrupt:
+            sys.exit(0)
@@ -2,23 +2,46 @@
 import os
 import sys
 import re
+import heapq
 import json
 import time
 import random
+import shutil
+import sqlite3
 import asyncio
+import bisect
+import functools
+import threading
+from array import array
+from collections import OrderedDict, deque
+from dataclasses import dataclass
 from pathlib import Path
 from typing import Optional, List, Dict, Any
 
-import requests
+# Startup timing: har phase ka process start se cumulative time (seconds)
+_STARTUP_T0 = time.perf_counter()
+STARTUP_TIMINGS: Dict[str, float] = {}
+
+
+def startup_mark(phase: str):
+    STARTUP_TIMINGS.setdefault(phase, time.perf_counter() - _STARTUP_T0)
+
+
+def startup_report() -> str:
+    return " → ".join(f"{phase} {sec * 1000:.0f}ms" for phase, sec in STARTUP_TIMINGS.items())
+
+
+import aiohttp
 from dotenv import load_dotenv
 
-# Gemini (Google generative AI)
-import google.generativeai as genai
+# Gemini (google.generativeai) ka import bhaari hai – _genai() pehli zaroorat par karta hai
 
 # Discord
 import discord
 from discord.ext import commands
 
+startup_mark("imports")
+
 # Load .env
 load_dotenv()
 
@@ -37,23 +60,64 @@ SERPAPI_KEY = os.getenv("SERPAPI_KEY", "")
 GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY", "")
 GOOGLE_CSE_ID = os.getenv("GOOGLE_CSE_ID", "")
 
-# Configure Gemini safely if key present
-if GEMINI_API_KEY:
-    try:
-        genai.configure(api_key=GEMINI_API_KEY)
-    except Exception as e:
-        print("Warning: Gemini config failed:", e)
+# Offline/testing: "1" => network ki jagah fake search provider
+SEARCH_FAKE = os.getenv("PAPPU_SEARCH_FAKE", "") == "1"
+SEARCH_TIMEOUT = float(os.getenv("SEARCH_TIMEOUT", "8"))
+SEARCH_CACHE_TTL = int(os.getenv("SEARCH_CACHE_TTL", "600"))       # seconds
+SEARCH_CACHE_SIZE = int(os.getenv("SEARCH_CACHE_SIZE", "256"))
+
+# Fast start (default): Gemini SDK pehli LLM call par import; bot process me persisted
+# state gateway connect ke saath background me load (messages tab tak wait karte hain).
+# PAPPU_FAST_START=0 => purana eager startup (sab kuch import time par).
+FAST_START = os.getenv("PAPPU_FAST_START", "1") == "1"
+DEFER_STATE = FAST_START and os.getenv("PAPPU_DEFER_STATE", "1" if __name__ == "__main__" else "0") == "1"
+
+# Sharded mode: launch_shards.py har worker process ko shard range deta hai
+SHARDED = os.getenv("PAPPU_SHARDED", "") == "1"
+SHARD_COUNT = int(os.getenv("PAPPU_SHARD_COUNT", "0")) or None
+CLUSTER_ID = os.getenv("PAPPU_CLUSTER_ID", "")
+# pappu_state.json ek hi process likhe (sharded mode me cluster 0), warna last flush jeet-ta hai
+STATE_FILE_WRITER = not SHARDED or CLUSTER_ID in ("", "0")
+
+
+def _parse_shard_ids(spec: str) -> Optional[List[int]]:
+    """"0-3,8" => [0, 1, 2, 3, 8]; khali => None (saare shards ek process me)."""
+    ids: List[int] = []
+    for part in spec.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        if "-" in part:
+            lo, hi = part.split("-", 1)
+            ids.extend(range(int(lo), int(hi) + 1))
+        else:
+            ids.append(int(part))
+    return ids or None
+
+
+SHARD_IDS = _parse_shard_ids(os.getenv("PAPPU_SHARD_IDS", ""))
 
 # Bot init
 PREFIX = "!"
 INTENTS = discord.Intents.default()
 INTENTS.message_content = True
 INTENTS.members = True
-bot = commands.Bot(command_prefix=PREFIX, intents=INTENTS)
+if SHARDED:
+    bot = commands.AutoShardedBot(
+        command_prefix=PREFIX, intents=INTENTS, shard_count=SHARD_COUNT, shard_ids=SHARD_IDS
+    )
+else:
+    bot = commands.Bot(command_prefix=PREFIX, intents=INTENTS)
 
 # Persistence file
 PERSIST_FILE = Path("pappu_state.json")
 
+# Ultra Deep Memory storage backend: "sqlite" (default) ya "json" (purana pappu_state.json)
+DEEP_MEMORY_BACKEND = os.getenv("PAPPU_MEMORY_BACKEND", "sqlite").lower()
+DEEP_MEMORY_DB = Path(os.getenv("PAPPU_MEMORY_DB", "pappu_memory.db"))
+# Kitne recently-active users ki profile RAM me rahe (baaki lazy load)
+DEEP_HOT_USERS = int(os.getenv("PAPPU_MEMORY_HOT_USERS", "2000"))
+
 # ---------- PART 2: Runtime settings, persistence, model init, helpers ----------
 RUNTIME_SETTINGS: Dict[str, Any] = {
     "owner_dm_only": False,
@@ -61,26 +125,791 @@ RUNTIME_SETTINGS: Dict[str, Any] = {
     "english_lock": False,     # True => only English replies; False => only Hinglish
     "allow_profanity": False,  # owner toggles this
     "mode": "funny",
-    "memory": {},              # yahi per-user Ultra Memory store hogi
-    "memory_meta": {}          # last_reset vs time
+    "streaming": True,         # replies ko Gemini stream ke saath progressively edit karo
+    "memory": {},              # per-user Ultra Memory (sirf json backend me yahan rehti hai)
+    "memory_meta": {}          # legacy (purane monthly reset ka last_reset)
 }
 
 # convenience var (kept in sync)
 ALLOW_PROFANITY = RUNTIME_SETTINGS.get("allow_profanity", False)
 
 
+# ---------- Metrics: counters, timing histograms, event-loop lag (Prometheus text) ----------
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))            # 0 => HTTP endpoint off
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+SLOW_OP_MS = float(os.getenv("PAPPU_SLOW_OP_MS", "1000"))     # isse slow timed op => log + call site
+LOOP_LAG_INTERVAL = 0.5                                       # seconds
+LOOP_LAG_WARN_MS = float(os.getenv("PAPPU_LOOP_LAG_WARN_MS", "250"))
+_METRIC_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+class _Histogram:
+    __slots__ = ("counts", "sum", "count", "max")
+
+    def __init__(self):
+        self.counts = [0] * (len(_METRIC_BUCKETS) + 1)  # last = +Inf
+        self.sum = 0.0
+        self.count = 0
+        self.max = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(_METRIC_BUCKETS, value)] += 1
+        self.sum += value
+        self.count += 1
+        if value > self.max:
+            self.max = value
+
+    def quantile(self, q: float) -> float:
+        """Bucket upper bound jisme q-th observation padta hai (+Inf => max)."""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for i, c in enumerate(self.counts):
+            seen += c
+            if seen >= rank and c:
+                return min(_METRIC_BUCKETS[i], self.max) if i < len(_METRIC_BUCKETS) else self.max
+        return self.max
+
+
+class _Timer:
+    __slots__ = ("metrics", "name", "labels", "start", "site")
+
+    def __init__(self, metrics: "Metrics", name: str, labels: Dict[str, str]):
+        self.metrics = metrics
+        self.name = name
+        self.labels = labels
+
+    def __enter__(self):
+        frame = sys._getframe(1)
+        self.site = (frame.f_code, frame.f_lineno)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        elapsed = time.perf_counter() - self.start
+        self.metrics.observe(self.name, elapsed, **self.labels)
+        if elapsed * 1000 >= SLOW_OP_MS:
+            code, line = self.site
+            print(
+                f"Warning: slow {self.name}{self.labels or ''} {elapsed * 1000:.0f}ms "
+                f"at {Path(code.co_filename).name}:{line} ({code.co_name})"
+            )
+        return False
+
+
+class Metrics:
+    """
+    Process-local registry. Thread-safe (LLM worker threads + flask thread bhi
+    likhte/padhte hain). collectors: scrape ke time extra gauges dene wale callables,
+    har ek [(name, labels_dict, value), ...] return kare.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: Dict[tuple, float] = {}
+        self._gauges: Dict[tuple, float] = {}
+        self._hists: Dict[tuple, _Histogram] = {}
+        self.collectors: List[Any] = []
+        self.started = time.time()
+
+    @staticmethod
+    def _key(name: str, labels: Dict[str, Any]) -> tuple:
+        return (name, tuple(sorted((k, str(v)) for k, v in labels.items())))
+
+    def inc(self, name: str, value: float = 1, **labels):
+        key = self._key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def set(self, name: str, value: float, **labels):
+        with self._lock:
+            self._gauges[self._key(name, labels)] = value
+
+    def observe(self, name: str, seconds: float, **labels):
+        key = self._key(name, labels)
+        with self._lock:
+            hist = self._hists.get(key)
+            if hist is None:
+                hist = self._hists[key] = _Histogram()
+            hist.observe(seconds)
+
+    def timer(self, name: str, **labels) -> _Timer:
+        """`with METRICS.timer("pappu_x_seconds", kind="y"):` – histogram + slow-op log."""
+        return _Timer(self, name, labels)
+
+    def counter(self, name: str, **labels) -> float:
+        with self._lock:
+            return self._counters.get(self._key(name, labels), 0)
+
+    def _collected(self) -> List[tuple]:
+        out = []
+        for fn in self.collectors:
+            try:
+                out.extend((name, self._key(name, labels)[1], value) for name, labels, value in fn())
+            except Exception:
+                pass  # scrape kabhi fail na ho
+        return out
+
+    @staticmethod
+    def _fmt(name: str, labels: tuple) -> str:
+        if not labels:
+            return name
+        inner = ",".join(f'{k}="{v}"' for k, v in labels)
+        return f"{name}{{{inner}}}"
+
+    def render(self) -> str:
+        with self._lock:
+            counters = sorted(self._counters.items())
+            gauges = sorted(self._gauges.items())
+            hists = [(k, list(h.counts), h.sum, h.count) for k, h in sorted(self._hists.items())]
+        gauges += [((name, labels), value) for name, labels, value in self._collected()]
+        lines = []
+        typed = set()
+
+        def header(name, kind):
+            if name not in typed:
+                lines.append(f"# TYPE {name} {kind}")
+                typed.add(name)
+
+        for (name, labels), value in counters:
+            header(name, "counter")
+            lines.append(f"{self._fmt(name, labels)} {value}")
+        for (name, labels), value in gauges:
+            header(name, "gauge")
+            lines.append(f"{self._fmt(name, labels)} {value}")
+        for (name, labels), counts, total, count in hists:
+            header(name, "histogram")
+            cum = 0
+            for bound, c in zip(list(_METRIC_BUCKETS) + ["+Inf"], counts):
+                cum += c
+                lines.append(f"{self._fmt(name + '_bucket', labels + (('le', str(bound)),))} {cum}")
+            lines.append(f"{self._fmt(name + '_sum', labels)} {total}")
+            lines.append(f"{self._fmt(name + '_count', labels)} {count}")
+        return "\n".join(lines) + "\n"
+
+    def summary_lines(self) -> List[str]:
+        """`pappu stats` ke liye chhota human summary."""
+        up = int(time.time() - self.started)
+        with self._lock:
+            counters = dict(self._counters)
+            hists = [(k, h.count, h.quantile(0.5), h.quantile(0.99), h.max) for k, h in sorted(self._hists.items())]
+            lag = self._gauges.get(("pappu_event_loop_lag_last_seconds", ()), 0.0)
+
+        def total(name):
+            return sum(v for (n, _), v in counters.items() if n == name)
+
+        lines = [
+            f"Uptime {up // 3600}h {up % 3600 // 60}m | messages {total('pappu_messages_total'):.0f}, "
+            f"invocations {total('pappu_invocations_total'):.0f}, errors {total('pappu_errors_total'):.0f}",
+            f"Event loop lag: last {lag * 1000:.0f}ms",
+        ]
+        for (name, labels), count, p50, p99, mx in hists:
+            tag = ",".join(v for _, v in labels)
+            lines.append(
+                f"{name}{'[' + tag + ']' if tag else ''}: n={count} p50≤{p50 * 1000:.0f}ms "
+                f"p99≤{p99 * 1000:.0f}ms max {mx * 1000:.0f}ms"
+            )
+        errors = [(dict(lb).get("where", "?"), v) for (n, lb), v in counters.items() if n == "pappu_errors_total"]
+        if errors:
+            lines.append("Errors: " + ", ".join(f"{w}={v:.0f}" for w, v in sorted(errors)))
+        return lines
+
+
+METRICS = Metrics()
+
+
+async def loop_lag_loop():
+    """Sleep ke overshoot se event-loop blocking naapo."""
+    loop = asyncio.get_running_loop()
+    while True:
+        start = loop.time()
+        await asyncio.sleep(LOOP_LAG_INTERVAL)
+        lag = max(0.0, loop.time() - start - LOOP_LAG_INTERVAL)
+        METRICS.observe("pappu_event_loop_lag_seconds", lag)
+        METRICS.set("pappu_event_loop_lag_last_seconds", lag)
+        if lag * 1000 >= LOOP_LAG_WARN_MS:
+            print(f"Warning: event loop blocked for ~{lag * 1000:.0f}ms")
+
+
+def start_metrics_server(port: int):
+    """/metrics (Prometheus text) ek daemon thread me; flask sirf yahin import hota hai."""
+    try:
+        from flask import Flask, Response
+    except ImportError:
+        print("Warning: flask not installed, metrics endpoint disabled")
+        return
+    app = Flask("pappu-metrics")
+
+    @app.route("/metrics")
+    def metrics_view():
+        return Response(METRICS.render(), mimetype="text/plain; version=0.0.4")
+
+    threading.Thread(
+        target=app.run,
+        kwargs={"host": METRICS_HOST, "port": port, "use_reloader": False},
+        name="pappu-metrics",
+        daemon=True,
+    ).start()
+
+
+# Write-behind persistence: mutations sirf dirty mark karte hain, background
+# task coalesced snapshot ko interval ya dirty-count threshold par flush karta hai.
+PERSIST_FLUSH_INTERVAL = float(os.getenv("PERSIST_FLUSH_INTERVAL", "5"))     # seconds
+PERSIST_FLUSH_THRESHOLD = int(os.getenv("PERSIST_FLUSH_THRESHOLD", "50"))    # dirty marks
+
+_PERSIST_DIRTY = 0
+_PERSIST_WAKE: Optional[asyncio.Event] = None
+# write-behind stores (take_dirty / write_rows / requeue / dirty_count) jo settings ke saath flush hote hain
+PERSISTED_STORES: List[Any] = []
+_PERSIST_WRITE_LOCK = threading.Lock()
+# kitna data disk ko diya (bench_pappu.py isse bytes-per-message nikalta hai)
+PERSIST_STATS = {"flushes": 0, "state_bytes": 0, "row_bytes": 0, "rows": 0}
+
+
+def _snapshot_state() -> str:
+    return json.dumps(RUNTIME_SETTINGS, ensure_ascii=False, separators=(",", ":"))
+
+
+def _write_state_atomic(payload: str):
+    """
+    Temp file me likho, fsync karo, phir rename – crash ke beech bhi
+    pappu_state.json kabhi half-written nahi milegi.
+    """
+    with _PERSIST_WRITE_LOCK:
+        # per-process tmp naam: sharded mode me kai processes same file likhte hain
+        tmp = PERSIST_FILE.with_name(f"{PERSIST_FILE.name}.{os.getpid()}.tmp")
+        with open(tmp, "w", encoding="utf-8") as fh:
+            fh.write(payload)
+            fh.flush()
+            os.fsync(fh.fileno())
+        os.replace(tmp, PERSIST_FILE)
+
+
+def _maybe_wake_flush():
+    if _PERSIST_WAKE is None:
+        return
+    if _PERSIST_DIRTY + sum(st.dirty_count() for st in PERSISTED_STORES) >= PERSIST_FLUSH_THRESHOLD:
+        _PERSIST_WAKE.set()
+
+
+def mark_state_dirty(count: int = 1):
+    global _PERSIST_DIRTY
+    _PERSIST_DIRTY += count
+    _maybe_wake_flush()
+
+
+def _take_store_batches() -> List[tuple]:
+    return [(st, st.take_dirty()) for st in PERSISTED_STORES]
+
+
+def _row_bytes(rows: List[tuple]) -> int:
+    return sum(len(v.encode("utf-8")) if isinstance(v, str) else 8 for row in rows for v in row)
+
+
+def _write_snapshot(batches: List[tuple], payload: Optional[str]):
+    with METRICS.timer("pappu_persist_seconds"):
+        _write_snapshot_rows(batches, payload)
+
+
+def _write_snapshot_rows(batches: List[tuple], payload: Optional[str]):
+    for store, rows in batches:
+        store.write_rows(rows)
+        if rows:
+            PERSIST_STATS["rows"] += len(rows)
+            PERSIST_STATS["row_bytes"] += _row_bytes(rows)
+    # deferred load se pehle default settings file ke upar nahi likhni
+    if payload is not None and STATE_LOADED and STATE_FILE_WRITER:
+        _write_state_atomic(payload)
+        PERSIST_STATS["state_bytes"] += len(payload.encode("utf-8"))
+    PERSIST_STATS["flushes"] += 1
+
+
 def save_persistent_state():
+    """
+    Synchronous flush (shutdown/restart/exit ke liye). Normal code path
+    mark_state_dirty() use kare, ye nahi.
+    """
+    global _PERSIST_DIRTY
     try:
-        PERSIST_FILE.write_text(
-            json.dumps(RUNTIME_SETTINGS, ensure_ascii=False, indent=2),
-            encoding="utf-8"
-        )
+        batches = _take_store_batches()
+        payload = _snapshot_state()
+        _PERSIST_DIRTY = 0
+        _write_snapshot(batches, payload)
     except Exception as e:
+        METRICS.inc("pappu_errors_total", where="persist")
         print("Warning: failed saving persistent state:", e)
 
 
+async def flush_persistent_state():
+    global _PERSIST_DIRTY
+    # snapshot event loop par hi lo taaki consistent rahe; disk write thread me
+    batches = [(st, rows) for st, rows in _take_store_batches() if rows]
+    pending = _PERSIST_DIRTY
+    payload = _snapshot_state() if pending else None
+    _PERSIST_DIRTY = 0
+    if not batches and payload is None:
+        return
+    try:
+        await asyncio.to_thread(_write_snapshot, batches, payload)
+    except Exception as e:
+        for store, rows in batches:
+            store.requeue(rows)
+        if pending:
+            mark_state_dirty(pending)
+        METRICS.inc("pappu_errors_total", where="persist")
+        print("Warning: failed saving persistent state:", e)
+
+
+async def persistence_loop():
+    global _PERSIST_WAKE
+    _PERSIST_WAKE = asyncio.Event()
+    while True:
+        try:
+            await asyncio.wait_for(_PERSIST_WAKE.wait(), timeout=PERSIST_FLUSH_INTERVAL)
+        except asyncio.TimeoutError:
+            pass
+        _PERSIST_WAKE.clear()
+        await flush_persistent_state()
+
+
+# on_ready reconnect par dobara fire hota hai – har background loop sirf ek baar chale
+_BACKGROUND_TASKS: Dict[str, asyncio.Task] = {}
+
+
+def start_background_task(name: str, factory):
+    task = _BACKGROUND_TASKS.get(name)
+    if task is None or task.done():
+        _BACKGROUND_TASKS[name] = asyncio.get_running_loop().create_task(factory(), name=f"pappu-{name}")
+
+
+class DeepMemoryStore:
+    """
+    Ultra Deep Memory ka storage interface. Memory me sirf recently active
+    users ke UserProfile objects rehte hain (bounded LRU hot set); baaki
+    backend se pehli access par load hote hain. Disk par plain-dict records
+    (messages/topics/personality/mood/last_interaction), key = str(user_id).
+
+    Subclasses _load() / _spill() / clear() / take_dirty() implement karti hain.
+    """
+
+    def __init__(self, hot_size: int):
+        self.hot_size = max(1, hot_size)
+        self._hot: "OrderedDict[str, UserProfile]" = OrderedDict()
+        self._dirty: set = set()
+
+    def get(self, key: str) -> Optional["UserProfile"]:
+        prof = self._hot.get(key)
+        if prof is not None:
+            self._hot.move_to_end(key)
+            return prof
+        prof = self._load(key)
+        if prof is not None:
+            self._admit(key, prof)
+        return prof
+
+    def put(self, key: str, profile: "UserProfile"):
+        self._admit(key, profile)
+        self.touch(key)
+
+    def touch(self, key: str):
+        """Profile in-place badla gaya – agle flush me likhna hai."""
+        self._dirty.add(key)
+        self._on_dirty()
+
+    def hot_count(self) -> int:
+        return len(self._hot)
+
+    def _admit(self, key: str, profile: "UserProfile"):
+        self._hot[key] = profile
+        self._hot.move_to_end(key)
+        while len(self._hot) > self.hot_size:
+            cold_key, cold = self._hot.popitem(last=False)
+            # cold profile dirty ho to pehle spill (flush queue me), phir bhool jao
+            if cold_key in self._dirty:
+                self._dirty.discard(cold_key)
+                self._spill(cold_key, cold)
+            self._evicted(cold_key)
+
+    def _on_dirty(self):
+        _maybe_wake_flush()
+
+    def _load(self, key: str) -> Optional["UserProfile"]:
+        raise NotImplementedError
+
+    def _spill(self, key: str, profile: "UserProfile"):
+        raise NotImplementedError
+
+    def clear(self):
+        raise NotImplementedError
+
+    def expire(self, keys: List[str]):
+        """TTL lapse hue users ko hot set + backend dono se hatao."""
+        raise NotImplementedError
+
+    async def expire_before(self, cutoff: int):
+        """Backend me pade cold users jinka last_interaction cutoff se purana hai."""
+        raise NotImplementedError
+
+    def _evicted(self, key: str):
+        """Hot set se nikla (spill ke baad) – subclass apni per-key bookkeeping saaf kare."""
+
+    def _forget(self, key: str):
+        self._hot.pop(key, None)
+        self._dirty.discard(key)
+
+    def dirty_count(self) -> int:
+        return len(self._dirty)
+
+    def take_dirty(self) -> List[tuple]:
+        """Dirty records ke serialized rows (event loop par snapshot)."""
+        return []
+
+    def requeue(self, rows: List[tuple]):
+        pass
+
+    def write_rows(self, rows: List[tuple]):
+        """Rows ko disk par likho (worker thread se call hota hai)."""
+        pass
+
+
+class JsonDeepMemoryStore(DeepMemoryStore):
+    """
+    Purana behaviour: records RUNTIME_SETTINGS["memory"] ke andar, pappu_state.json me.
+    Profiles sirf access par inflate hote hain; dirty/evicted profiles flush se
+    pehle wapas record dict me sync ho jaate hain.
+    """
+
+    def _root(self) -> Dict[str, Any]:
+        mem = RUNTIME_SETTINGS.get("memory")
+        if not isinstance(mem, dict):
+            mem = {}
+            RUNTIME_SETTINGS["memory"] = mem
+        return mem
+
+    def _load(self, key: str) -> Optional["UserProfile"]:
+        rec = self._root().get(key)
+        if not isinstance(rec, dict):
+            return None
+        return UserProfile.from_record(rec)
+
+    def _spill(self, key: str, profile: "UserProfile"):
+        self._root()[key] = profile.to_record()
+
+    def _on_dirty(self):
+        mark_state_dirty()
+
+    def clear(self):
+        self._hot.clear()
+        self._dirty.clear()
+        RUNTIME_SETTINGS["memory"] = {}
+        mark_state_dirty()
+
+    def take_dirty(self) -> List[tuple]:
+        for key in self._dirty:
+            prof = self._hot.get(key)
+            if prof is not None:
+                self._spill(key, prof)
+        self._dirty.clear()
+        return []
+
+    def expire(self, keys: List[str]):
+        root = self._root()
+        for key in keys:
+            self._forget(key)
+            root.pop(key, None)
+        mark_state_dirty()
+
+    async def expire_before(self, cutoff: int):
+        root = self._root()
+        stale = [
+            k for k, rec in root.items()
+            if k not in self._hot and isinstance(rec, dict) and int(rec.get("last_interaction", 0) or 0) < cutoff
+        ]
+        if stale:
+            self.expire(stale)
+
+
+class SqliteDeepMemoryStore(DeepMemoryStore):
+    """
+    Per-user rows in SQLite (WAL mode). Ek user ka update sirf uski row
+    rewrite karta hai; startup par kuch bhi eager load nahi hota.
+
+    shared=True (sharded mode, kai processes ek hi DB): hot set sirf ek flush
+    window ka write buffer hai – flush par khali, agli access row dobara padhti
+    hai. Rows poora record nahi, balki load ke baad ke changes (naye messages,
+    naye topics, trait deltas, mood) hote hain jo disk wali row ke upar merge
+    hote hain, taaki doosre process ke updates overwrite na hon.
+    """
+
+    def __init__(self, path: Path, hot_size: int, shared: bool = False):
+        super().__init__(hot_size)
+        self.path = path
+        self.shared = shared
+        self._lock = threading.Lock()
+        # evicted-but-unflushed rows: key -> (uid, data, last_interaction)
+        self._spilled: Dict[str, tuple] = {}
+        # shared mode: evicted-but-unflushed delta rows (ek key ke kai ho sakte hain)
+        self._deltas: List[tuple] = []
+        # shared mode: key -> load ke waqt ki (traits, topics, mood, added)
+        self._base: Dict[str, tuple] = {}
+        self._conn = sqlite3.connect(str(path), check_same_thread=False)
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS deep_users ("
+                " uid TEXT PRIMARY KEY,"
+                " data TEXT NOT NULL,"
+                " last_interaction INTEGER NOT NULL DEFAULT 0)"
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS deep_users_last ON deep_users(last_interaction)"
+            )
+            self._conn.commit()
+
+    @staticmethod
+    def _row(key: str, profile: "UserProfile") -> tuple:
+        return (
+            key,
+            json.dumps(profile.to_record(), ensure_ascii=False, separators=(",", ":")),
+            int(profile.last_interaction),
+        )
+
+    @staticmethod
+    def _snapshot(profile: "UserProfile") -> tuple:
+        return (tuple(profile.traits), set(profile.topics), profile.mood, profile.added)
+
+    def _delta_row(self, key: str, profile: "UserProfile") -> tuple:
+        traits, topics, mood, added = self._base.get(key) or self._snapshot(UserProfile())
+        new = profile.added - added
+        delta = {
+            "messages": profile.messages[-new:] if new > 0 else [],
+            "topics": [t for t in profile.topics if t not in topics],
+            "personality": {
+                name: profile.traits[i] - traits[i]
+                for i, name in enumerate(TRAIT_NAMES)
+                if profile.traits[i] != traits[i]
+            },
+            "mood": profile.mood if profile.mood != mood else None,
+            "last_interaction": int(profile.last_interaction),
+        }
+        return (key, json.dumps(delta, ensure_ascii=False, separators=(",", ":")), int(profile.last_interaction))
+
+    @staticmethod
+    def _merge(rec: Dict[str, Any], delta: Dict[str, Any]) -> Dict[str, Any]:
+        """Disk record ke upar ek process ke changes (plain dicts)."""
+        msgs = list(rec.get("messages") or []) + list(delta.get("messages") or [])
+        rec["messages"] = msgs[-DEEP_MAX_MESSAGES:]
+        topics = list(rec.get("topics") or [])
+        for t in delta.get("topics") or []:
+            if t not in topics:
+                topics.append(t)
+        rec["topics"] = topics[-DEEP_MAX_TOPICS:]
+        traits = dict(rec.get("personality") or {})
+        for name, diff in (delta.get("personality") or {}).items():
+            try:
+                base = float(traits.get(name, 5))
+            except (TypeError, ValueError):
+                base = 5.0
+            traits[name] = max(0.0, min(10.0, base + diff))
+        rec["personality"] = traits
+        if delta.get("mood"):
+            rec["mood"] = delta["mood"]
+        rec["last_interaction"] = max(
+            int(rec.get("last_interaction", 0) or 0), int(delta.get("last_interaction", 0) or 0)
+        )
+        return rec
+
+    def _admit(self, key: str, profile: "UserProfile"):
+        if self.shared and key not in self._base:
+            self._base[key] = self._snapshot(profile)
+        super()._admit(key, profile)
+
+    def _evicted(self, key: str):
+        self._base.pop(key, None)
+
+    def _load(self, key: str) -> Optional["UserProfile"]:
+        row = None if self.shared else self._spilled.pop(key, None)
+        if row is not None:
+            # abhi disk tak nahi pahucha – wapas hot set me aa raha hai, dirty rakho
+            self._dirty.add(key)
+            data = row[1]
+        else:
+            with self._lock:
+                found = self._conn.execute("SELECT data FROM deep_users WHERE uid = ?", (key,)).fetchone()
+            pending = [r for r in self._deltas if r[0] == key] if self.shared else []
+            if not found and not pending:
+                return None
+            data = found[0] if found else "{}"
+        try:
+            rec = json.loads(data)
+            # shared: abhi-unflushed deltas bhi dikhein; naya base inke baad ka hai
+            for r in pending:
+                rec = self._merge(rec, json.loads(r[1]))
+            return UserProfile.from_record(rec)
+        except Exception:
+            return None
+
+    def _spill(self, key: str, profile: "UserProfile"):
+        if self.shared:
+            self._deltas.append(self._delta_row(key, profile))
+        else:
+            self._spilled[key] = self._row(key, profile)
+
+    def clear(self):
+        self._hot.clear()
+        self._dirty.clear()
+        self._spilled.clear()
+        self._deltas.clear()
+        self._base.clear()
+        with self._lock:
+            self._conn.execute("DELETE FROM deep_users")
+            self._conn.commit()
+
+    def expire(self, keys: List[str]):
+        for key in keys:
+            self._forget(key)
+            self._spilled.pop(key, None)
+            self._base.pop(key, None)
+        if self._deltas:
+            gone = set(keys)
+            self._deltas = [r for r in self._deltas if r[0] not in gone]
+        with self._lock:
+            self._conn.executemany("DELETE FROM deep_users WHERE uid = ?", [(k,) for k in keys])
+            self._conn.commit()
+
+    def _delete_before(self, cutoff: int, keep: List[str]) -> int:
+        with self._lock:
+            conn = self._conn
+            # keep = memory me pade active users: disk row purani ho sakti hai, unflushed changes naye
+            conn.execute("CREATE TEMP TABLE IF NOT EXISTS deep_keep (uid TEXT PRIMARY KEY)")
+            conn.execute("DELETE FROM deep_keep")
+            conn.executemany("INSERT OR IGNORE INTO deep_keep (uid) VALUES (?)", [(k,) for k in keep])
+            cur = conn.execute(
+                "DELETE FROM deep_users WHERE last_interaction < ? AND uid NOT IN (SELECT uid FROM deep_keep)",
+                (cutoff,),
+            )
+            conn.commit()
+            return cur.rowcount
+
+    async def expire_before(self, cutoff: int):
+        # memory wale expired users bhi hatao (Json store ki tarah), warna agla flush unhe wapas likh deta
+        stale = [k for k, prof in self._hot.items() if int(prof.last_interaction) < cutoff]
+        for key in stale:
+            self._forget(key)
+            self._base.pop(key, None)
+        for key, row in list(self._spilled.items()):
+            if row[2] < cutoff:
+                del self._spilled[key]
+        self._deltas = [r for r in self._deltas if r[2] >= cutoff]
+        keep = set(self._hot) | set(self._spilled) | {r[0] for r in self._deltas}
+        # indexed range delete worker thread me
+        await asyncio.to_thread(self._delete_before, cutoff, list(keep))
+
+    def dirty_count(self) -> int:
+        return len(self._dirty) + len(self._spilled) + len(self._deltas)
+
+    def take_dirty(self) -> List[tuple]:
+        if self.shared:
+            rows = self._deltas
+            self._deltas = []
+            for key in self._dirty:
+                prof = self._hot.get(key)
+                if prof is not None:
+                    rows.append(self._delta_row(key, prof))
+            self._dirty.clear()
+            # doosre processes bhi likhte hain – agli access disk se fresh padhe
+            self._hot.clear()
+            self._base.clear()
+            return rows
+        rows = list(self._spilled.values())
+        self._spilled.clear()
+        for key in self._dirty:
+            prof = self._hot.get(key)
+            if prof is not None:
+                rows.append(self._row(key, prof))
+        self._dirty.clear()
+        return rows
+
+    def requeue(self, rows: List[tuple]):
+        if self.shared:
+            # deltas additive hain – sab wapas, kuch replace nahi
+            self._deltas[:0] = rows
+            return
+        for row in rows:
+            if row[0] not in self._dirty:
+                self._spilled[row[0]] = row
+
+    def write_rows(self, rows: List[tuple]):
+        if not rows:
+            return
+        if self.shared:
+            self._merge_rows(rows)
+        else:
+            self._upsert(rows)
+
+    def _upsert(self, rows: List[tuple]):
+        with self._lock:
+            self._conn.executemany(
+                "INSERT INTO deep_users (uid, data, last_interaction) VALUES (?, ?, ?) "
+                "ON CONFLICT(uid) DO UPDATE SET data = excluded.data, "
+                "last_interaction = excluded.last_interaction",
+                rows,
+            )
+            self._conn.commit()
+
+    def _merge_rows(self, rows: List[tuple]):
+        """Read-modify-write ek IMMEDIATE transaction me: beech me koi aur process nahi likh sakta."""
+        with self._lock:
+            conn = self._conn
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                for key, delta, _last in rows:
+                    found = conn.execute("SELECT data FROM deep_users WHERE uid = ?", (key,)).fetchone()
+                    try:
+                        rec = json.loads(found[0]) if found else {}
+                    except ValueError:
+                        rec = {}
+                    rec = self._merge(rec, json.loads(delta))
+                    conn.execute(
+                        "INSERT INTO deep_users (uid, data, last_interaction) VALUES (?, ?, ?) "
+                        "ON CONFLICT(uid) DO UPDATE SET data = excluded.data, "
+                        "last_interaction = excluded.last_interaction",
+                        (key, json.dumps(rec, ensure_ascii=False, separators=(",", ":")), rec["last_interaction"]),
+                    )
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+
+    def import_records(self, records: Dict[str, Any]) -> int:
+        rows = [
+            (str(k), json.dumps(v, ensure_ascii=False, separators=(",", ":")),
+             int(v.get("last_interaction", 0) or 0))
+            for k, v in records.items()
+            if isinstance(v, dict)
+        ]
+        if rows:
+            self._upsert(rows)
+        return len(rows)
+
+
+def _make_deep_store() -> DeepMemoryStore:
+    if DEEP_MEMORY_BACKEND == "sqlite":
+        try:
+            return SqliteDeepMemoryStore(DEEP_MEMORY_DB, DEEP_HOT_USERS, shared=SHARDED)
+        except Exception as e:
+            print("Warning: SQLite memory store failed, falling back to JSON:", e)
+    return JsonDeepMemoryStore(DEEP_HOT_USERS)
+
+
+STATE_LOADED = False
+_STATE_LOAD_TASK: Optional[asyncio.Task] = None
+
+
 def load_persistent_state():
-    global RUNTIME_SETTINGS, ALLOW_PROFANITY
+    global ALLOW_PROFANITY, STATE_LOADED
     try:
         if PERSIST_FILE.exists():
             data = json.loads(PERSIST_FILE.read_text(encoding="utf-8"))
@@ -92,18 +921,577 @@ def load_persistent_state():
                 ALLOW_PROFANITY = RUNTIME_SETTINGS.get("allow_profanity", ALLOW_PROFANITY)
     except Exception as e:
         print("Warning: failed loading persistent state:", e)
+    STATE_LOADED = True
+    migrate_json_memory_to_store()
+
+
+def migrate_json_memory_to_store():
+    """
+    One-shot migration: pappu_state.json me pada purana "memory" blob SQLite
+    store me daal do, backup rakh ke JSON se hata do.
+    """
+    if not isinstance(DEEP_STORE, SqliteDeepMemoryStore) or not STATE_FILE_WRITER:
+        return
+    legacy = RUNTIME_SETTINGS.get("memory")
+    if not isinstance(legacy, dict) or not legacy:
+        return
+    try:
+        if PERSIST_FILE.exists():
+            shutil.copyfile(PERSIST_FILE, PERSIST_FILE.with_name(PERSIST_FILE.name + ".premigration"))
+        moved = DEEP_STORE.import_records(legacy)
+        RUNTIME_SETTINGS["memory"] = {}
+        save_persistent_state()
+        print(f"Deep memory: migrated {moved} users from {PERSIST_FILE} to {DEEP_STORE.path}")
+    except Exception as e:
+        print("Warning: deep memory migration failed:", e)
+
+
+DEEP_STORE: DeepMemoryStore = _make_deep_store()
+PERSISTED_STORES.append(DEEP_STORE)
+
+# Load persisted settings at startup (fast start me bot ke setup_hook se, background me)
+if not DEFER_STATE:
+    load_persistent_state()
+
+
+# ---------- Shared state across processes (sharded mode) ----------
+# Admin toggles + per-user rate buckets ek SQLite file me; har process
+# settings_sync_loop se doosron ke changes utha leta hai.
+SHARED_STATE = os.getenv("PAPPU_SHARED_STATE", "1" if SHARDED else "0") == "1"
+SHARED_DB = Path(os.getenv("PAPPU_SHARED_DB", str(DEEP_MEMORY_DB)))
+SETTINGS_SYNC_INTERVAL = float(os.getenv("SETTINGS_SYNC_INTERVAL", "2"))  # seconds
+SHARED_SETTING_KEYS = (
+    "owner_dm_only", "stealth", "english_lock", "allow_profanity", "mode", "streaming", "rate_limits",
+)
+
+
+class SharedSettings:
+    """
+    settings(key, value JSON, rev). Har write ek naya global rev leta hai;
+    reader sirf apne last dekhe rev ke baad wale rows padhta hai, aur
+    PRAGMA data_version na badla ho to query bhi nahi karta.
+    """
+
+    def __init__(self, path: Path):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(path), check_same_thread=False, timeout=5)
+        self._seen_rev = 0
+        self._data_version = None
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS settings ("
+                " key TEXT PRIMARY KEY,"
+                " value TEXT NOT NULL,"
+                " rev INTEGER NOT NULL)"
+            )
+            self._conn.commit()
+
+    def publish(self, key: str, value: Any):
+        payload = json.dumps(value, ensure_ascii=False, separators=(",", ":"))
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.execute(
+                    "INSERT INTO settings (key, value, rev) "
+                    "VALUES (?, ?, (SELECT COALESCE(MAX(rev), 0) + 1 FROM settings)) "
+                    "ON CONFLICT(key) DO UPDATE SET value = excluded.value, rev = excluded.rev",
+                    (key, payload),
+                )
+                self._conn.commit()
+            except Exception:
+                self._conn.rollback()
+                raise
+
+    def changes(self) -> List[tuple]:
+        """(key, value) jo pichli call ke baad badle (apne writes bhi, harmless)."""
+        with self._lock:
+            version = self._conn.execute("PRAGMA data_version").fetchone()[0]
+            if version == self._data_version and self._seen_rev:
+                return []
+            self._data_version = version
+            rows = self._conn.execute(
+                "SELECT key, value, rev FROM settings WHERE rev > ? ORDER BY rev", (self._seen_rev,)
+            ).fetchall()
+        out = []
+        for key, value, rev in rows:
+            self._seen_rev = max(self._seen_rev, rev)
+            try:
+                out.append((key, json.loads(value)))
+            except Exception:
+                continue
+        return out
+
+
+class SharedRateBuckets:
+    """
+    rate_buckets(key, tokens, stamp) – ek user ke buckets saare processes me
+    common. Check + consume ek IMMEDIATE transaction me (atomic).
+    """
+
+    def __init__(self, path: Path):
+        self._lock = threading.Lock()
+        # chhota busy timeout: lock contention me event loop der tak na ruke
+        self._conn = sqlite3.connect(str(path), check_same_thread=False, timeout=0.2, isolation_level=None)
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS rate_buckets ("
+                " key TEXT PRIMARY KEY,"
+                " tokens REAL NOT NULL,"
+                " stamp REAL NOT NULL)"
+            )
+
+    def take(self, checks: List[tuple], consume: bool) -> Optional[str]:
+        """checks = [(key, capacity, seconds)]. Denied key return karo, sab ok ho to None."""
+        now = time.time()
+        with self._lock:
+            conn = self._conn
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                updates = []
+                for key, capacity, seconds in checks:
+                    row = conn.execute("SELECT tokens, stamp FROM rate_buckets WHERE key = ?", (key,)).fetchone()
+                    tokens = float(capacity) if row is None else min(
+                        capacity, row[0] + max(0.0, now - row[1]) * capacity / max(seconds, 0.001)
+                    )
+                    if tokens < 1:
+                        conn.execute("ROLLBACK")
+                        return key
+                    updates.append((key, tokens - 1, now))
+                if consume:
+                    conn.executemany(
+                        "INSERT INTO rate_buckets (key, tokens, stamp) VALUES (?, ?, ?) "
+                        "ON CONFLICT(key) DO UPDATE SET tokens = excluded.tokens, stamp = excluded.stamp",
+                        updates,
+                    )
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        return None
+
+    def reset(self, prefix: str):
+        with self._lock:
+            self._conn.execute("DELETE FROM rate_buckets WHERE key LIKE ?", (prefix + "%",))
+
+
+def _apply_setting(key: str, value: Any):
+    global ALLOW_PROFANITY
+    RUNTIME_SETTINGS[key] = value
+    if key == "allow_profanity":
+        ALLOW_PROFANITY = bool(value)
+    elif key == "rate_limits" and "RATE_LIMITER" in globals():
+        RATE_LIMITER.reset_buckets()
+
+
+def update_setting(key: str, value: Any):
+    """
+    Runtime setting badlo: local apply + snapshot dirty + (sharded mode me)
+    shared table me publish, taaki baaki processes bhi utha lein.
+    """
+    _apply_setting(key, value)
+    mark_state_dirty()
+    if SHARED_SETTINGS is not None and key in SHARED_SETTING_KEYS:
+        try:
+            SHARED_SETTINGS.publish(key, value)
+        except Exception as e:
+            print("Warning: shared setting publish failed:", e)
+
+
+async def apply_presence():
+    try:
+        if RUNTIME_SETTINGS.get("stealth"):
+            await bot.change_presence(status=discord.Status.invisible)
+        else:
+            await bot.change_presence(status=discord.Status.online)
+    except Exception:
+        pass
+
+
+def sync_shared_settings() -> List[str]:
+    """Doosre processes ke changes lagao; jo keys sach me badli unki list."""
+    if SHARED_SETTINGS is None:
+        return []
+    changed = []
+    for key, value in SHARED_SETTINGS.changes():
+        if key in SHARED_SETTING_KEYS and RUNTIME_SETTINGS.get(key) != value:
+            _apply_setting(key, value)
+            changed.append(key)
+    if changed:
+        mark_state_dirty()
+    return changed
+
+
+async def settings_sync_loop():
+    while True:
+        await asyncio.sleep(SETTINGS_SYNC_INTERVAL)
+        try:
+            changed = sync_shared_settings()
+        except Exception as e:
+            METRICS.inc("pappu_errors_total", where="settings_sync")
+            print("Warning: shared settings sync failed:", e)
+            continue
+        if "stealth" in changed:
+            await apply_presence()
+
+
+SHARED_SETTINGS: Optional[SharedSettings] = None
+SHARED_BUCKETS: Optional[SharedRateBuckets] = None
+if SHARED_STATE:
+    try:
+        SHARED_SETTINGS = SharedSettings(SHARED_DB)
+        SHARED_BUCKETS = SharedRateBuckets(SHARED_DB)
+        if not DEFER_STATE:
+            sync_shared_settings()  # shared table file wali settings se upar
+    except Exception as e:
+        print("Warning: shared state store failed, settings stay process-local:", e)
+        SHARED_SETTINGS = None
+        SHARED_BUCKETS = None
+    if SHARDED and DEEP_MEMORY_BACKEND != "sqlite":
+        print("Warning: sharded mode with JSON memory backend – processes will overwrite each other's memory")
+
+
+def load_startup_state():
+    """Settings file + shared settings (isi order me – shared table file se upar)."""
+    load_persistent_state()
+    sync_shared_settings()
+    startup_mark("state")
+
+
+def start_state_load() -> asyncio.Task:
+    """Deferred state load ek hi baar, worker thread me (event loop free rehta hai)."""
+    global _STATE_LOAD_TASK
+    if _STATE_LOAD_TASK is None:
+        _STATE_LOAD_TASK = asyncio.get_running_loop().create_task(asyncio.to_thread(load_startup_state))
+    return _STATE_LOAD_TASK
 
 
-# Load persisted settings at startup
-load_persistent_state()
+async def ensure_state_loaded():
+    if not STATE_LOADED or (_STATE_LOAD_TASK is not None and not _STATE_LOAD_TASK.done()):
+        await start_state_load()
+
+
+# ---------- Rate limiting: per-user / per-guild token buckets + quota accounting ----------
+# op => {"user": [capacity, seconds], "guild": [capacity, seconds]}; capacity 0 => unlimited
+RATE_LIMIT_OPS = ("llm", "search", "rewrite")
+DEFAULT_RATE_LIMITS: Dict[str, Dict[str, List[float]]] = {
+    "llm": {"user": [6, 60], "guild": [60, 60]},
+    "search": {"user": [3, 60], "guild": [20, 60]},
+    "rewrite": {"user": [4, 60], "guild": [30, 60]},
+}
+
+
+class QuotaUsage:
+    """
+    Per-key allowed/denied counters (key = "op:scope:id"), restart ke baad bhi.
+    SQLite backend par deltas write-behind upsert hote hain; JSON backend par
+    RUNTIME_SETTINGS["quota_usage"] me.
+    """
+
+    def __init__(self, db_path: Optional[Path]):
+        self._pending: Dict[str, List[int]] = {}
+        self._conn = None
+        self._lock = threading.Lock()
+        if db_path is not None:
+            self._conn = sqlite3.connect(str(db_path), check_same_thread=False)
+            with self._lock:
+                self._conn.execute("PRAGMA journal_mode=WAL")
+                self._conn.execute(
+                    "CREATE TABLE IF NOT EXISTS quota_usage ("
+                    " key TEXT PRIMARY KEY,"
+                    " allowed INTEGER NOT NULL DEFAULT 0,"
+                    " denied INTEGER NOT NULL DEFAULT 0)"
+                )
+                self._conn.commit()
+
+    def _json_root(self) -> Dict[str, List[int]]:
+        root = RUNTIME_SETTINGS.get("quota_usage")
+        if not isinstance(root, dict):
+            root = {}
+            RUNTIME_SETTINGS["quota_usage"] = root
+        return root
+
+    def record(self, key: str, allowed: bool):
+        if self._conn is None:
+            counts = self._json_root().setdefault(key, [0, 0])
+            counts[0 if allowed else 1] += 1
+            mark_state_dirty()
+            return
+        counts = self._pending.setdefault(key, [0, 0])
+        counts[0 if allowed else 1] += 1
+        _maybe_wake_flush()
+
+    def totals(self, key: str) -> List[int]:
+        if self._conn is None:
+            return list(self._json_root().get(key, [0, 0]))
+        with self._lock:
+            row = self._conn.execute("SELECT allowed, denied FROM quota_usage WHERE key = ?", (key,)).fetchone()
+        pend = self._pending.get(key, [0, 0])
+        base = row or (0, 0)
+        return [base[0] + pend[0], base[1] + pend[1]]
+
+    def top(self, n: int = 10) -> List[tuple]:
+        """(key, allowed, denied) – sabse zyada use wale."""
+        if self._conn is None:
+            items = [(k, v[0], v[1]) for k, v in self._json_root().items()]
+        else:
+            with self._lock:
+                items = self._conn.execute(
+                    "SELECT key, allowed, denied FROM quota_usage ORDER BY allowed + denied DESC LIMIT ?", (n,)
+                ).fetchall()
+        return sorted(items, key=lambda r: r[1] + r[2], reverse=True)[:n]
+
+    def dirty_count(self) -> int:
+        return len(self._pending)
+
+    def take_dirty(self) -> List[tuple]:
+        rows = [(k, v[0], v[1]) for k, v in self._pending.items()]
+        self._pending.clear()
+        return rows
+
+    def requeue(self, rows: List[tuple]):
+        for key, allowed, denied in rows:
+            counts = self._pending.setdefault(key, [0, 0])
+            counts[0] += allowed
+            counts[1] += denied
+
+    def write_rows(self, rows: List[tuple]):
+        if not rows or self._conn is None:
+            return
+        with self._lock:
+            self._conn.executemany(
+                "INSERT INTO quota_usage (key, allowed, denied) VALUES (?, ?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET allowed = allowed + excluded.allowed, "
+                "denied = denied + excluded.denied",
+                rows,
+            )
+            self._conn.commit()
+
+
+class RateLimiter:
+    """
+    Token buckets keyed by (op, scope, id). Ek request tabhi allow jab user aur
+    guild dono buckets me token ho; limits owner RUNTIME_SETTINGS["rate_limits"]
+    se badal sakta hai.
+    """
+
+    def __init__(self, usage: QuotaUsage, shared: Optional["SharedRateBuckets"] = None):
+        self.usage = usage
+        self.shared = shared  # sharded mode: user buckets saare processes me common
+        self._buckets: Dict[tuple, List[float]] = {}  # key -> [tokens, stamp]
+
+    @staticmethod
+    def limits() -> Dict[str, Dict[str, List[float]]]:
+        cfg = RUNTIME_SETTINGS.get("rate_limits")
+        if not isinstance(cfg, dict):
+            cfg = {}
+        merged = {}
+        for op, scopes in DEFAULT_RATE_LIMITS.items():
+            merged[op] = {scope: list((cfg.get(op) or {}).get(scope, default)) for scope, default in scopes.items()}
+        return merged
+
+    def set_limit(self, op: str, scope: str, capacity: float, seconds: float):
+        cfg = json.loads(json.dumps(RUNTIME_SETTINGS.get("rate_limits") or {}))
+        cfg.setdefault(op, {})[scope] = [capacity, seconds]
+        update_setting("rate_limits", cfg)
+
+    def reset_buckets(self):
+        # limits badle => buckets naye capacity ke saath dobara banenge
+        self._buckets.clear()
+        if self.shared is not None:
+            try:
+                self.shared.reset("")
+            except Exception as e:
+                print("Warning: shared rate bucket reset failed:", e)
+
+    def _has_token(self, key: tuple, capacity: float, seconds: float, now: float) -> bool:
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = [float(capacity), now]
+        bucket[0] = min(capacity, bucket[0] + (now - bucket[1]) * capacity / max(seconds, 0.001))
+        bucket[1] = now
+        return bucket[0] >= 1
+
+    def allow(self, op: str, user_id: Optional[int], guild_id: Optional[int], consume: bool = True) -> bool:
+        if user_id == OWNER_ID:
+            return True
+        now = time.monotonic()
+        limits = self.limits().get(op, {})
+        keys = []
+        shared_checks = []
+        for scope, ident in (("user", user_id), ("guild", guild_id)):
+            capacity, seconds = limits.get(scope, (0, 0))
+            if ident is None or not capacity:
+                continue
+            if self.shared is not None and scope == "user":
+                # guild ek hi shard (process) par rehta hai, user kai par ho sakta hai
+                shared_checks.append((f"{op}:{scope}:{ident}", capacity, seconds))
+                continue
+            key = (op, scope, ident)
+            if not self._has_token(key, capacity, seconds, now):
+                if consume:
+                    self.usage.record(f"{op}:{scope}:{ident}", False)
+                return False
+            keys.append(key)
+        if shared_checks:
+            try:
+                denied = self.shared.take(shared_checks, consume)
+            except Exception as e:
+                # shared store busy/down => fail open, local guild limit phir bhi laga hai
+                METRICS.inc("pappu_errors_total", where="rate_shared")
+                print("Warning: shared rate limit check failed:", e)
+                denied = None
+                shared_checks = []
+            if denied is not None:
+                if consume:
+                    self.usage.record(denied, False)
+                return False
+        if consume:
+            for key in keys:
+                self._buckets[key][0] -= 1
+                self.usage.record(f"{key[0]}:{key[1]}:{key[2]}", True)
+            for key, _, _ in shared_checks:
+                self.usage.record(key, True)
+        return True
+
+
+def _guild_id_of(channel: Any) -> Optional[int]:
+    guild = getattr(channel, "guild", None)
+    return getattr(guild, "id", None)
+
+
+QUOTA_USAGE = QuotaUsage(DEEP_STORE.path if isinstance(DEEP_STORE, SqliteDeepMemoryStore) else None)
+PERSISTED_STORES.append(QUOTA_USAGE)
+RATE_LIMITER = RateLimiter(QUOTA_USAGE, SHARED_BUCKETS)
+
+# Initialize Gemini model objects if configured (safe)
+# primary + ordered fallbacks (comma list), optional lighter hedge model
+GEMINI_MODEL = os.getenv("GEMINI_MODEL", "gemini-2.5-flash")
+GEMINI_FALLBACK_MODELS = [m.strip() for m in os.getenv("GEMINI_FALLBACK_MODELS", "").split(",") if m.strip()]
+GEMINI_HEDGE_MODEL = os.getenv("GEMINI_HEDGE_MODEL", "").strip()  # khali => hedging off
+
+_GENAI = None
+_GENAI_LOCK = threading.RLock()
+
+
+def _genai():
+    """google.generativeai pehli zaroorat par import + configure (thread-safe)."""
+    global _GENAI
+    if _GENAI is None:
+        with _GENAI_LOCK:
+            if _GENAI is None:
+                with METRICS.timer("pappu_genai_import_seconds"):
+                    import google.generativeai as genai
+
+                    genai.configure(api_key=GEMINI_API_KEY)
+                _GENAI = genai
+    return _GENAI
+
+
+class LazyGenerativeModel:
+    """
+    genai.GenerativeModel ka stand-in: SDK import + model object pehli call par
+    banta hai – aur wo call LLM worker thread me hoti hai, event loop par nahi.
+    """
+
+    def __init__(self, name: str):
+        self.model_name = name
+        self._model = None
+
+    def resolve(self):
+        if self._model is None:
+            with _GENAI_LOCK:
+                if self._model is None:
+                    self._model = _genai().GenerativeModel(self.model_name)
+        return self._model
+
+    def __getattr__(self, attr: str):
+        return getattr(self.resolve(), attr)
+
+
+def _gemini_model(name: str):
+    if FAST_START:
+        return LazyGenerativeModel(name)
+    return _genai().GenerativeModel(name)
+
 
-# Initialize Gemini model object if configured (safe)
 try:
-    model = genai.GenerativeModel("gemini-2.5-flash") if GEMINI_API_KEY else None
+    model = _gemini_model(GEMINI_MODEL) if GEMINI_API_KEY else None
 except Exception as e:
     print("Warning: Gemini model init failed:", e)
     model = None
 
+# LLM execution layer (retries / breaker / fallback / hedge) llm_client.py me hai –
+# LLM gateway process bhi wahi use karta hai.
+import llm_client
+from llm_client import LLM_TIMEOUT, LLMClient, LLMUnavailable, ModelEndpoint
+
+llm_client.use_metrics(METRICS)
+
+
+def _make_llm_client() -> LLMClient:
+    if model is None:
+        return LLMClient([])
+    endpoints = [ModelEndpoint(GEMINI_MODEL, model)]
+    by_name = {GEMINI_MODEL: endpoints[0]}
+    for name in GEMINI_FALLBACK_MODELS + ([GEMINI_HEDGE_MODEL] if GEMINI_HEDGE_MODEL else []):
+        if name in by_name:
+            continue
+        try:
+            by_name[name] = ModelEndpoint(name, _gemini_model(name))
+        except Exception as e:
+            print(f"Warning: Gemini model {name} init failed:", e)
+            continue
+        if name in GEMINI_FALLBACK_MODELS:
+            endpoints.append(by_name[name])
+    return LLMClient(endpoints, hedge=by_name.get(GEMINI_HEDGE_MODEL))
+
+
+LLM_CLIENT = _make_llm_client()
+
+# Optional out-of-process gateway (llm_gateway.py): set ho to saare model calls wahan jaate
+# hain – cache, quota, concurrency cap aur batching saare bot processes ke beech common.
+LLM_GATEWAY_ADDRESS = os.getenv("PAPPU_LLM_GATEWAY", "").strip()
+LLM_GATEWAY = None
+if LLM_GATEWAY_ADDRESS:
+    try:
+        from llm_gateway import GatewayClient
+
+        LLM_GATEWAY = GatewayClient(LLM_GATEWAY_ADDRESS)
+    except Exception as e:
+        print("Warning: LLM gateway client init failed, calling Gemini directly:", e)
+
+
+def llm_available() -> bool:
+    return model is not None or LLM_GATEWAY is not None
+
+
+async def generate_text(prompt: str, timeout: Optional[float] = None,
+                        job: Optional[Dict[str, Any]] = None) -> Optional[str]:
+    """
+    Event loop ko block kiye bina Gemini se text lao (retries/fallback/hedge ke saath).
+    job = gateway ke extra fields (cache_key, ttl, batchable, preamble, question);
+    direct path unhe ignore karta hai. Sab fail ho to exception (LLMUnavailable / GatewayError).
+    """
+    if LLM_GATEWAY is not None:
+        return await LLM_GATEWAY.generate(prompt, timeout or LLM_TIMEOUT, **(job or {}))
+    if model is None:
+        raise RuntimeError("Gemini model not configured")
+    return await LLM_CLIENT.generate(prompt, timeout)
+
+
+async def stream_text(prompt: str, timeout: Optional[float] = None):
+    """Async generator: Gemini ke streamed chunks jaise jaise aate hain."""
+    if LLM_GATEWAY is not None:
+        source = LLM_GATEWAY.stream(prompt, timeout or LLM_TIMEOUT)
+    elif model is None:
+        raise RuntimeError("Gemini model not configured")
+    else:
+        source = LLM_CLIENT.stream(prompt, timeout)
+    async for piece in source:
+        yield piece
+
 
 # Basic helpers
 def is_owner(user: discord.abc.User) -> bool:
@@ -126,25 +1514,37 @@ def get_nice_name(user: discord.abc.User) -> str:
         return "User"
 
 
+# Allowed modes => tone hint (khali = default tone). Defaults; pappu_keywords.txt ka
+# [modes] section inhe replace karta hai (CHAT_DATA.mode_tones).
+MODE_TONES: Dict[str, str] = {
+    "funny": "masti + light roast",
+    "angry": "short + savage",
+    "serious": "calm + informative",
+    "flirty": "playful",
+    "sarcastic": "sarcastic",
+    "bhaukaal": "mafia-tone",
+    "kid": "",
+    "toxic": "",
+    "coder": "technical",
+    "bhai-ji": "",
+    "dark": "",
+    "normal": "",
+}
+
+
 def apply_mode(mode: str) -> bool:
     if not mode:
         return False
     mode = mode.lower()
-    allowed = [
-        "funny", "angry", "serious", "flirty", "sarcastic",
-        "bhaukaal", "kid", "toxic", "coder", "bhai-ji", "dark", "normal"
-    ]
-    if mode not in allowed:
+    if mode not in CHAT_DATA.mode_tones:
         return False
     if mode == "normal":
         mode = "funny"
-    RUNTIME_SETTINGS["mode"] = mode
-    save_persistent_state()
+    update_setting("mode", mode)
     return True
 
 
-# Short context memory (per-user, transient)
-CONTEXT_MEMORY: Dict[int, Dict[str, Any]] = {}
+# Short conversation memory (per channel + user, transient)
 MEMORY_TTL = 60 * 60 * 6  # 6 hours
 
 
@@ -152,27 +1552,391 @@ def _now_ts() -> int:
     return int(time.time())
 
 
-def prune_memory():
-    now = _now_ts()
-    for uid in list(CONTEXT_MEMORY.keys()):
-        if now - CONTEXT_MEMORY[uid].get("ts", 0) > MEMORY_TTL:
-            CONTEXT_MEMORY.pop(uid, None)
+class TTLCache:
+    """
+    Chhota LRU + TTL cache (OrderedDict based). Har entry ka apna expiry;
+    maxsize cross hone par sabse purani entry nikal jaati hai.
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data: "OrderedDict[Any, tuple]" = OrderedDict()
+
+    def get(self, key: Any) -> Any:
+        entry = self._data.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        expires, value = entry
+        if expires < time.monotonic():
+            self._data.pop(key, None)
+            self.misses += 1
+            return None
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key: Any, value: Any, ttl: Optional[float] = None):
+        self._data[key] = (time.monotonic() + (self.ttl if ttl is None else ttl), value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def clear(self):
+        self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": (self.hits / total) if total else 0.0,
+        }
 
 
-def set_context(user_id: int, subject: str, query: str, items: Optional[List[str]] = None):
-    if not user_id:
-        return
-    CONTEXT_MEMORY[user_id] = {
-        "last_subject": subject,
-        "last_query": query,
-        "items": items or [],
-        "ts": _now_ts()
-    }
+class ExpiryScheduler:
+    """
+    Per-key TTL expiry (heap based). touch() message path par O(1) hai –
+    sirf deadline dict update hota hai; heap me har key ki ek entry rehti hai
+    aur pop par deadline aage badh chuki ho to wapas push ho jaati hai.
+    """
+
+    def __init__(self):
+        self._deadlines: Dict[Any, float] = {}
+        self._heap: List[tuple] = []
+        self._seq = 0
+
+    def touch(self, key: Any, ttl: float, now: Optional[float] = None):
+        deadline = (time.time() if now is None else now) + ttl
+        fresh = key not in self._deadlines
+        self._deadlines[key] = deadline
+        if fresh:
+            self._push(deadline, key)
+
+    def discard(self, key: Any):
+        self._deadlines.pop(key, None)
+
+    def _push(self, deadline: float, key: Any):
+        self._seq += 1
+        heapq.heappush(self._heap, (deadline, self._seq, key))
+
+    def pop_expired(self, now: Optional[float] = None, limit: int = 1000) -> List[Any]:
+        now = time.time() if now is None else now
+        out = []
+        while self._heap and self._heap[0][0] <= now and len(out) < limit:
+            _, _, key = heapq.heappop(self._heap)
+            current = self._deadlines.get(key)
+            if current is None:
+                continue  # discard ho chuka
+            if current > now:
+                self._push(current, key)
+                continue
+            del self._deadlines[key]
+            out.append(key)
+        return out
+
+    def __len__(self) -> int:
+        return len(self._deadlines)
+
+
+EXPIRY = ExpiryScheduler()
+EXPIRY_SWEEP_INTERVAL = float(os.getenv("EXPIRY_SWEEP_INTERVAL", "30"))  # seconds
+
+
+CONVO_MAX_TURNS = int(os.getenv("CONVO_MAX_TURNS", "8"))              # ring buffer per (channel, user)
+CONVO_MAX_THREADS = int(os.getenv("CONVO_MAX_THREADS", "5000"))        # (channel, user) keys, LRU
+CONVO_HISTORY_TOKENS = int(os.getenv("CONVO_HISTORY_TOKENS", "400"))   # prompt me history ka budget
+CONVO_TURN_MAX_CHARS = 600  # store karte waqt ek sawaal/jawab ka max hissa
+CHARS_PER_TOKEN = 4
+
+
+class _Turn:
+    __slots__ = ("question", "answer", "ts", "message_ids", "parent")
+
+    def __init__(self, question: str, answer: str, message_ids: tuple, parent: Optional[int]):
+        self.question = question
+        self.answer = answer
+        self.ts = _now_ts()
+        self.message_ids = message_ids
+        self.parent = parent  # pichhle turn ka (Pappu) message id – thread chain
+
+
+def _clip(text: str, limit: int) -> str:
+    text = (text or "").strip()
+    return text if len(text) <= limit else text[:limit] + "…"
+
+
+class ConversationStore:
+    """
+    Per (channel, user) pichhle CONVO_MAX_TURNS sawaal-jawab ka ring buffer.
+    Har turn Pappu ke bheje message ids se indexed hai aur apne parent turn ka
+    message id rakhta hai, to kisi bhi purane Pappu message ke reply par wahi
+    exact thread (parent chain) wapas ban jaata hai. Buffer se nikla turn index
+    se bhi nikal jaata hai; chain wahin khatam.
+    """
+
+    def __init__(self, max_turns: int, max_threads: int):
+        self.max_turns = max(1, max_turns)
+        self.max_threads = max(1, max_threads)
+        self._threads: "OrderedDict[tuple, deque]" = OrderedDict()
+        self._by_message: Dict[int, _Turn] = {}
+
+    def record(self, channel_id: int, user_id: int, question: str, answer: str,
+               message_ids, parent: Optional[int] = None) -> _Turn:
+        key = (channel_id, user_id)
+        turns = self._threads.get(key)
+        if turns is None:
+            turns = self._threads[key] = deque()
+            while len(self._threads) > self.max_threads:
+                _, old = self._threads.popitem(last=False)
+                self._unindex(old)
+        else:
+            self._threads.move_to_end(key)
+        if len(turns) >= self.max_turns:
+            self._unindex((turns.popleft(),))
+        turn = _Turn(_clip(question, CONVO_TURN_MAX_CHARS), _clip(answer, CONVO_TURN_MAX_CHARS),
+                     tuple(message_ids), parent)
+        turns.append(turn)
+        for mid in turn.message_ids:
+            self._by_message[mid] = turn
+        EXPIRY.touch(("ctx", key), MEMORY_TTL)
+        return turn
+
+    def _unindex(self, turns):
+        for turn in turns:
+            for mid in turn.message_ids:
+                if self._by_message.get(mid) is turn:
+                    del self._by_message[mid]
+
+    def drop(self, key: tuple):
+        turns = self._threads.pop(key, None)
+        if turns:
+            self._unindex(turns)
+
+    def last(self, channel_id: int, user_id: int) -> Optional[_Turn]:
+        turns = self._threads.get((channel_id, user_id))
+        if not turns:
+            return None
+        turn = turns[-1]
+        # sweep ke beech ka chhota gap: stale turn ko yahin ignore kar do
+        return turn if _now_ts() - turn.ts <= MEMORY_TTL else None
+
+    def thread(self, turn: Optional[_Turn]) -> List[_Turn]:
+        """turn tak ka thread, purana pehle (max CONVO_MAX_TURNS)."""
+        out = []
+        while turn is not None and len(out) < self.max_turns:
+            out.append(turn)
+            turn = self._by_message.get(turn.parent) if turn.parent is not None else None
+        out.reverse()
+        return out
+
+    def thread_for_message(self, message_id: int) -> List[_Turn]:
+        return self.thread(self._by_message.get(message_id))
+
+    @staticmethod
+    def render(turns: List[_Turn], budget_tokens: int = CONVO_HISTORY_TOKENS) -> str:
+        """Naye turns pehle budget me; jo fit na ho wo purane turns chhod do."""
+        budget = budget_tokens * CHARS_PER_TOKEN
+        blocks: List[str] = []
+        used = 0
+        for turn in reversed(turns):
+            block = f"User: {turn.question}\nPappu: {turn.answer}"
+            if used + len(block) > budget:
+                if not blocks and budget > 0:
+                    blocks.append(block[:budget])
+                break
+            blocks.append(block)
+            used += len(block) + 1
+        blocks.reverse()
+        return "\n".join(blocks)
+
+    def __len__(self) -> int:
+        return len(self._threads)
+
+    def stats(self) -> Dict[str, int]:
+        return {"threads": len(self._threads), "indexed_messages": len(self._by_message)}
+
+
+CONVERSATIONS = ConversationStore(CONVO_MAX_TURNS, CONVO_MAX_THREADS)
 
 
-def get_context(user_id: int) -> Optional[Dict[str, Any]]:
-    prune_memory()
-    return CONTEXT_MEMORY.get(user_id)
+# Reply references: ek event me zyada se zyada ek REST fetch. Pappu ke apne recent
+# messages LRU me rehte hain (OUTBOUND listener se), to "Pappu ko reply?" local hi.
+BOT_MESSAGE_CACHE_SIZE = int(os.getenv("BOT_MESSAGE_CACHE_SIZE", "2000"))
+BOT_CHANNEL_INDEX_SIZE = int(os.getenv("BOT_CHANNEL_INDEX_SIZE", "100"))  # har channel me yaad rakhe IDs
+_REF_MISSING = object()
+
+
+class BotMessageCache:
+    """
+    Bot ke recent bheje messages: message_id -> discord.Message (bounded LRU),
+    plus har channel ke last BOT_CHANNEL_INDEX_SIZE message IDs (purane se naye).
+    Message object LRU se nikal bhi jaaye to ID index me rehti hai.
+    """
+
+    def __init__(self, maxsize: int, per_channel: int):
+        self.maxsize = maxsize
+        self.per_channel = per_channel
+        self._data: "OrderedDict[int, discord.Message]" = OrderedDict()
+        self._by_channel: Dict[Any, deque] = {}
+        self._indexed: set = set()  # saare channel indexes ke IDs (delete event par O(1) check)
+
+    def _index(self, ch_id: Any) -> deque:
+        ids = self._by_channel.get(ch_id)
+        if ids is None:
+            ids = self._by_channel[ch_id] = deque(maxlen=self.per_channel)
+        return ids
+
+    def add(self, msg: discord.Message):
+        mid = getattr(msg, "id", None)
+        if mid is None:
+            return
+        if mid not in self._data:
+            ch_id = getattr(getattr(msg, "channel", None), "id", None)
+            if ch_id is not None:
+                ids = self._index(ch_id)
+                if mid not in ids:
+                    if len(ids) == ids.maxlen:
+                        self._indexed.discard(ids[0])  # append sabse purana gira dega
+                    ids.append(mid)
+                    self._indexed.add(mid)
+        self._data[mid] = msg
+        self._data.move_to_end(mid)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def add_older(self, msg: discord.Message):
+        """History scan se mila purana message: index me sabse purane ki jagah (jagah ho to)."""
+        mid = getattr(msg, "id", None)
+        ch_id = getattr(getattr(msg, "channel", None), "id", None)
+        if mid is None or ch_id is None:
+            return
+        ids = self._index(ch_id)
+        if mid in ids or len(ids) >= self.per_channel:
+            return
+        ids.appendleft(mid)
+        self._indexed.add(mid)
+        if mid not in self._data:
+            self._data[mid] = msg
+            self._data.move_to_end(mid, last=False)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def recent_ids(self, channel_id: Any, n: int) -> List[int]:
+        """Channel me Pappu ke last n message IDs, naya pehle."""
+        ids = self._by_channel.get(channel_id)
+        if not ids:
+            return []
+        return list(reversed(ids))[:n]
+
+    def get(self, message_id: Optional[int]) -> Optional[discord.Message]:
+        msg = self._data.get(message_id)
+        if msg is not None:
+            self._data.move_to_end(message_id)
+        return msg
+
+    def discard(self, message_id: Optional[int], channel_id: Any = None):
+        """Delete events har guild ke har message ke liye aate hain – Pappu ka na ho to turant return."""
+        msg = self._data.pop(message_id, None)
+        if message_id not in self._indexed:
+            return
+        self._indexed.discard(message_id)
+        if channel_id is None:
+            channel_id = getattr(getattr(msg, "channel", None), "id", None)
+        ids = self._by_channel.get(channel_id)
+        if ids is not None and message_id in ids:
+            ids.remove(message_id)
+            return
+        # channel pata nahi – ID Pappu ki hai, to hi saare indexes dekho (sach me rare)
+        for ids in self._by_channel.values():
+            if message_id in ids:
+                ids.remove(message_id)
+                break
+
+    def __contains__(self, message_id) -> bool:
+        return message_id in self._data
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+BOT_MESSAGES = BotMessageCache(BOT_MESSAGE_CACHE_SIZE, BOT_CHANNEL_INDEX_SIZE)
+
+
+def _bot_message_handle(channel: discord.abc.Messageable, message_id: int) -> Any:
+    """Cached object ho to wahi, warna partial message (delete/edit ke liye bas ID chahiye)."""
+    msg = BOT_MESSAGES.get(message_id)
+    if msg is not None:
+        return msg
+    return channel.get_partial_message(message_id)
+
+
+async def recent_bot_messages(channel: discord.abc.Messageable, n: int) -> List[Any]:
+    """
+    Channel me Pappu ke last n messages: pehle local index (koi API call nahi).
+    Index me kam hon (restart ke baad) to sabse purane indexed message se pehle ki
+    history scan karke baaki bharo, aur mile hue messages index me backfill.
+    """
+    ids = BOT_MESSAGES.recent_ids(channel.id, n)
+    found = [_bot_message_handle(channel, mid) for mid in ids]
+    if len(found) >= n:
+        return found
+    before = found[-1] if found else None
+    async for msg in channel.history(limit=BOT_CHANNEL_INDEX_SIZE * 2, before=before):
+        if msg.author == bot.user:
+            found.append(msg)
+            BOT_MESSAGES.add_older(msg)
+            if len(found) >= n:
+                break
+    return found
+
+
+# event ke dauraan resolved reference (message.id -> referenced message / _REF_MISSING)
+_REFERENCE_MEMO = TTLCache(512, 60)
+
+
+def _usable_message(obj: Any) -> bool:
+    # DeletedReferencedMessage / None ke paas author nahi hota
+    return obj is not None and getattr(obj, "author", None) is not None
+
+
+async def resolve_reference(message: discord.Message) -> Optional[discord.Message]:
+    """
+    Jis message par reply kiya gaya wo lao:
+    reference.resolved -> client cache -> Pappu ke apne messages ka LRU -> ek fetch.
+    Result (miss bhi) is message ke liye memoize hota hai.
+    """
+    ref = message.reference
+    if ref is None:
+        return None
+    memo = _REFERENCE_MEMO.get(message.id)
+    if memo is not None:
+        return None if memo is _REF_MISSING else memo
+
+    found = None
+    for candidate in (getattr(ref, "resolved", None), getattr(ref, "cached_message", None),
+                      BOT_MESSAGES.get(getattr(ref, "message_id", None))):
+        if _usable_message(candidate):
+            found = candidate
+            break
+    if found is None:
+        try:
+            fetched = await message.fetch_reference()
+            found = fetched if _usable_message(fetched) else None
+        except Exception:
+            found = None
+        if found is not None and found.author == bot.user:
+            BOT_MESSAGES.add(found)
+    _REFERENCE_MEMO.put(message.id, found if found is not None else _REF_MISSING)
+    return found
 
 
 async def resolve_target_user(message: discord.Message) -> discord.abc.User:
@@ -187,12 +1951,9 @@ async def resolve_target_user(message: discord.Message) -> discord.abc.User:
     try:
         # Reply target
         if message.reference:
-            try:
-                ref = await message.fetch_reference()
-                if ref and ref.author and not ref.author.bot and ref.author != bot.user:
-                    return ref.author
-            except Exception:
-                pass
+            ref = await resolve_reference(message)
+            if ref and ref.author and not ref.author.bot and ref.author != bot.user:
+                return ref.author
 
         # Mention target
         for u in message.mentions:
@@ -206,142 +1967,150 @@ async def resolve_target_user(message: discord.Message) -> discord.abc.User:
     return message.author
 
 
-# ---------- NEW: ULTRA DEEP MEMORY (M3) USING RUNTIME_SETTINGS["memory"] ----------
+# ---------- NEW: ULTRA DEEP MEMORY (M3) VIA DEEP_STORE BACKEND ----------
 
 DEEP_MAX_MESSAGES = 50
 DEEP_MAX_TOPICS = 10
-DEEP_RESET_DAYS = 30  # monthly
+# Global monthly wipe ki jagah: har user ki memory uske apne last interaction ke
+# DEEP_USER_TTL_DAYS baad expire hoti hai (background sweep, message path O(1)).
+DEEP_USER_TTL_DAYS = int(os.getenv("DEEP_USER_TTL_DAYS", "30"))
+DEEP_USER_TTL = DEEP_USER_TTL_DAYS * 86400
+DEEP_COLD_SWEEP_INTERVAL = 3600  # storage me pade cold users ka sweep (seconds)
 
 
-def _deep_root() -> Dict[str, Any]:
-    mem = RUNTIME_SETTINGS.get("memory")
-    if not isinstance(mem, dict):
-        mem = {}
-        RUNTIME_SETTINGS["memory"] = mem
-    return mem
+TRAIT_NAMES = ("friendliness", "toxicity", "respect", "sarcasm")
+_TRAIT_INDEX = {name: i for i, name in enumerate(TRAIT_NAMES)}
 
 
-def _deep_meta() -> Dict[str, Any]:
-    meta = RUNTIME_SETTINGS.get("memory_meta")
-    if not isinstance(meta, dict):
-        meta = {}
-        RUNTIME_SETTINGS["memory_meta"] = meta
-    return meta
+class UserProfile:
+    """
+    Ek user ki Ultra Memory, compact form me:
+    - messages: fixed-capacity ring buffer (slice-copy nahi hota)
+    - traits: 4 floats ek chhote array me
+    Disk/JSON format wahi purana dict hai (to_record / from_record).
+    """
 
+    __slots__ = (
+        "_msgs", "_head", "topics", "traits", "mood", "last_interaction", "version", "prompt_block", "added",
+    )
 
-def deep_monthly_reset_if_needed():
-    meta = _deep_meta()
-    now = _now_ts()
-    last = meta.get("last_reset", 0)
-    if not last:
-        meta["last_reset"] = now
-        save_persistent_state()
-        return
-    days = (now - last) // 86400
-    if days >= DEEP_RESET_DAYS:
-        RUNTIME_SETTINGS["memory"] = {}
-        meta["last_reset"] = now
-        save_persistent_state()
+    def __init__(self):
+        self._msgs: List[str] = []
+        self._head = 0  # ring full hone ke baad agla overwrite slot (= sabse purana)
+        self.topics: List[str] = []
+        self.traits = array("d", (5.0, 5.0, 5.0, 5.0))
+        self.mood = "normal"
+        self.last_interaction = _now_ts()
+        self.version = 0  # har memory update par +1 (process_deep_memory)
+        self.prompt_block: Optional[tuple] = None  # (version, budget, rendered memory block)
+        self.added = 0  # is object me kitne messages jude (sharded store ka delta isi se)
+
+    # --- messages ---
+    def add_message(self, text: str):
+        self.added += 1
+        if len(self._msgs) < DEEP_MAX_MESSAGES:
+            self._msgs.append(text)
+            return
+        self._msgs[self._head] = text
+        self._head = (self._head + 1) % len(self._msgs)
+
+    @property
+    def messages(self) -> List[str]:
+        """Oldest -> newest."""
+        return self._msgs[self._head:] + self._msgs[:self._head]
+
+    def recent_messages(self, n: int) -> List[str]:
+        return self.messages[-n:] if n > 0 else []
+
+    # --- topics / traits ---
+    def add_topic(self, topic: str):
+        if topic not in self.topics:
+            self.topics.append(topic)
+        if len(self.topics) > DEEP_MAX_TOPICS:
+            del self.topics[:-DEEP_MAX_TOPICS]
+
+    def trait(self, name: str) -> float:
+        return self.traits[_TRAIT_INDEX[name]]
+
+    def bump_trait(self, name: str, delta: float):
+        i = _TRAIT_INDEX[name]
+        self.traits[i] = max(0.0, min(10.0, self.traits[i] + delta))
+
+    # --- persistence ---
+    def to_record(self) -> Dict[str, Any]:
+        return {
+            "messages": self.messages,
+            "topics": list(self.topics),
+            "personality": dict(zip(TRAIT_NAMES, self.traits)),
+            "mood": self.mood,
+            "last_interaction": self.last_interaction,
+        }
+
+    @classmethod
+    def from_record(cls, rec: Dict[str, Any]) -> "UserProfile":
+        prof = cls()
+        msgs = rec.get("messages") or []
+        prof._msgs = [str(m) for m in msgs[-DEEP_MAX_MESSAGES:]]
+        prof.topics = [str(t) for t in (rec.get("topics") or [])][-DEEP_MAX_TOPICS:]
+        traits = rec.get("personality") or {}
+        for i, name in enumerate(TRAIT_NAMES):
+            try:
+                prof.traits[i] = float(traits.get(name, 5))
+            except (TypeError, ValueError):
+                pass
+        prof.mood = rec.get("mood", "normal") or "normal"
+        prof.last_interaction = int(rec.get("last_interaction", 0) or 0)
+        return prof
 
 
-def get_deep_user(uid: int) -> Dict[str, Any]:
-    deep_monthly_reset_if_needed()
-    root = _deep_root()
+def get_deep_user(uid: int) -> UserProfile:
     key = str(uid)
-    if key not in root:
-        root[key] = {
-            "messages": [],
-            "topics": [],
-            "personality": {
-                "friendliness": 5,
-                "toxicity": 5,
-                "respect": 5,
-                "sarcasm": 5,
-            },
-            "mood": "normal",
-            "last_interaction": _now_ts(),
-        }
-        save_persistent_state()
-    return root[key]
+    user = DEEP_STORE.get(key)
+    if user is None:
+        user = UserProfile()
+        DEEP_STORE.put(key, user)
+    return user
 
 
-def deep_add_message(uid: int, text: str):
-    user = get_deep_user(uid)
-    clean = (text or "").strip()
+def deep_add_message(user: UserProfile, feats: "MessageFeatures"):
+    clean = feats.text.strip()
     if not clean:
         return
-    user["messages"].append(clean)
-    if len(user["messages"]) > DEEP_MAX_MESSAGES:
-        user["messages"] = user["messages"][-DEEP_MAX_MESSAGES:]
-    user["last_interaction"] = _now_ts()
-    save_persistent_state()
+    user.add_message(clean)
+    user.last_interaction = _now_ts()
 
 
-def deep_add_topic(uid: int, text: str):
-    user = get_deep_user(uid)
-    tl = (text or "").lower()
-
-    topic_keywords = [
-        "game", "gaming", "discord", "bot", "pc", "phone", "server", "music",
-        "video", "ban", "error", "help", "school", "college", "love",
-        "breakup", "life", "youtube"
-    ]
-    topic = None
-    for k in topic_keywords:
-        if k in tl:
-            topic = k
-            break
-    if not topic:
-        return
-    if topic not in user["topics"]:
-        user["topics"].append(topic)
-    if len(user["topics"]) > DEEP_MAX_TOPICS:
-        user["topics"] = user["topics"][-DEEP_MAX_TOPICS:]
-    save_persistent_state()
+def deep_add_topic(user: UserProfile, feats: "MessageFeatures"):
+    if feats.topic:
+        user.add_topic(feats.topic)
 
 
-def deep_evolve_personality(uid: int, text: str):
-    user = get_deep_user(uid)
-    traits = user["personality"]
-    tl = (text or "").lower()
-
-    toxic_words = ["mc", "bc", "madarchod", "bhosd", "fuck", "gandu", "chutiya"]
-    polite_words = ["thanks", "thank you", "please", "pls", "bro", "bhai", "love u", "love you"]
-
-    if any(w in tl for w in toxic_words):
-        traits["toxicity"] = min(10, traits["toxicity"] + 1)
-        traits["respect"] = max(0, traits["respect"] - 1)
-    elif any(w in tl for w in polite_words):
-        traits["friendliness"] = min(10, traits["friendliness"] + 1)
-        traits["respect"] = min(10, traits["respect"] + 1)
+def deep_evolve_personality(user: UserProfile, feats: "MessageFeatures"):
+    if feats.toxic:
+        user.bump_trait("toxicity", 1)
+        user.bump_trait("respect", -1)
+    elif feats.polite:
+        user.bump_trait("friendliness", 1)
+        user.bump_trait("respect", 1)
     else:
-        traits["friendliness"] = min(10, traits["friendliness"] + 0.1)
+        user.bump_trait("friendliness", 0.1)
 
-    save_persistent_state()
 
-
-def deep_update_mood(uid: int, text: str):
-    user = get_deep_user(uid)
-    tl = (text or "").lower()
-    toxic_words = ["mc", "bc", "madarchod", "bhosd", "fuck", "gandu", "chutiya"]
-    positive_words = ["love", "thanks", "thank you", "nice", "good", "awesome", "bhai"]
-
-    if any(w in tl for w in toxic_words):
-        user["mood"] = "angry"
-    elif any(w in tl for w in positive_words):
-        user["mood"] = "happy"
-    elif len(text) > 50:
-        user["mood"] = "chill"
+def deep_update_mood(user: UserProfile, feats: "MessageFeatures"):
+    if feats.toxic:
+        user.mood = "angry"
+    elif feats.positive:
+        user.mood = "happy"
+    elif len(feats.text) > 50:
+        user.mood = "chill"
     else:
         # kabhi kabhi halka sarcastic mood
         if random.random() < 0.05:
-            user["mood"] = "sarcastic"
-    save_persistent_state()
+            user.mood = "sarcastic"
 
 
 def deep_mood_prefix(uid: int) -> str:
-    user = get_deep_user(uid)
-    mood = user.get("mood", "normal")
+    mood = get_deep_user(uid).mood
     if mood == "happy":
         return "😊 | "
     if mood == "angry":
@@ -353,18 +2122,50 @@ def deep_mood_prefix(uid: int) -> str:
     return ""
 
 
-def process_deep_memory(uid: int, text: str):
+def process_deep_memory(uid: int, feats: "MessageFeatures"):
     """
     Har user ke message par Ultra Memory update:
     - last 50 msgs
     - last 10 topics
     - personality traits
     - mood
+    Ek hi lookup + ek hi dirty mark; saare signals pre-computed feats se.
     """
-    deep_add_message(uid, text)
-    deep_add_topic(uid, text)
-    deep_evolve_personality(uid, text)
-    deep_update_mood(uid, text)
+    user = get_deep_user(uid)
+    deep_add_message(user, feats)
+    deep_add_topic(user, feats)
+    deep_evolve_personality(user, feats)
+    deep_update_mood(user, feats)
+    user.version += 1
+    key = str(uid)
+    DEEP_STORE.touch(key)
+    EXPIRY.touch(("deep", key), DEEP_USER_TTL)
+
+
+async def expiry_loop():
+    """
+    EXPIRY scheduler ke due keys evict karo; ghante me ek baar storage me
+    pade cold users (jo RAM me load hi nahi hue) ka bhi sweep.
+    """
+    last_cold = 0.0
+    while True:
+        await asyncio.sleep(EXPIRY_SWEEP_INTERVAL)
+        try:
+            deep_keys = []
+            for kind, key in EXPIRY.pop_expired():
+                if kind == "ctx":
+                    CONVERSATIONS.drop(key)
+                elif kind == "deep":
+                    deep_keys.append(key)
+            if deep_keys:
+                DEEP_STORE.expire(deep_keys)
+            now = time.time()
+            if now - last_cold >= DEEP_COLD_SWEEP_INTERVAL:
+                last_cold = now
+                await DEEP_STORE.expire_before(int(now) - DEEP_USER_TTL)
+        except Exception as e:
+            METRICS.inc("pappu_errors_total", where="expiry")
+            print("Warning: expiry sweep failed:", e)
 # ---------- PART 3: Roasts, profanity markers, language helpers, send_long_message ----------
 
 # LIGHT roasts (safe)
@@ -408,6 +2209,235 @@ PROFANE_KEYWORDS = [
     "randi", "harami", "launde", "lode", "Teri maa ki chut", "behan k lode", "mkc"
 ]
 
+# Baaki saari trigger lists (pehle functions ke andar har call par banti thi)
+DETAIL_KEYWORDS = [
+    "detail", "details", "thoda detail", "thodi detail",
+    "zyada detail", "aur detail", "deep me", "deep mein",
+    "in depth", "zyada smjha", "zyada samjha"
+]
+
+SIMPLIFY_KEYWORDS = [
+    "simple", "simpler", "easy", "easy way",
+    "asan", "aasan", "aasaan",
+    "short", "chhota", "chota",
+    "aasaan way", "asan way"
+]
+
+CREATOR_TRIGGERS = [
+    "kisne banaya", "kisne tumhe banaya", "kisne tume banaya",
+    "who made you", "who created you", "creator kaun",
+    "developer kaun", "programmer kaun",
+    "owner kaun", "tumhara owner", "tumhara malik",
+    "papa kaun", "pappa kaun", "papa ji kaun"
+]
+
+FOLLOWUP_KEYWORDS = [
+    "naam", "name",
+    "bta*", "bata",
+    "aur", "or", "bhi",
+    "wahi", "same",
+    "desh", "country",
+    "phir", "fir", "next",
+    "ek aur"
+]
+
+LIVE_SEARCH_TRIGGERS = [
+    "search", "kab", "aaj", "news", "release", "lyrics",
+    "khabar", "price", "brand", "date", "kab aayega"
+]
+
+TOXIC_WORDS = ["mc", "bc", "madarchod", "bhosd", "fuck", "gandu", "chutiya"]
+POLITE_WORDS = ["thanks", "thank you", "please", "pls", "bro", "bhai", "love u", "love you"]
+POSITIVE_WORDS = ["love", "thanks", "thank you", "nice", "good", "awesome", "bhai"]
+
+TOPIC_KEYWORDS = [
+    "game", "gaming", "discord", "bot*", "pc", "phone", "server", "music",
+    "video", "ban", "error", "help", "school", "college", "love",
+    "breakup", "life", "youtube"
+]
+
+
+class KeywordHits:
+    """Ek scan ka result: category -> matched keyword indexes (list order me)."""
+
+    __slots__ = ("_cats", "_matcher")
+
+    def __init__(self, matcher: "KeywordMatcher", cats: Dict[str, set]):
+        self._matcher = matcher
+        self._cats = cats
+
+    def has(self, category: str) -> bool:
+        return category in self._cats
+
+    def first(self, category: str) -> Optional[str]:
+        """Category list me sabse pehle aane wala matched keyword (purane for-loop jaisa)."""
+        idxs = self._cats.get(category)
+        if not idxs:
+            return None
+        return self._matcher.categories[category][min(idxs)]
+
+    def matched(self, category: str) -> List[str]:
+        kws = self._matcher.categories.get(category, [])
+        return [kws[i] for i in sorted(self._cats.get(category, ()))]
+
+    def categories(self) -> List[str]:
+        return list(self._cats)
+
+
+class KeywordMatcher:
+    """
+    Saari keyword lists ek combined regex me compile – message ek hi baar scan hota hai
+    aur har category ka hit mil jaata hai.
+
+    Matching rules:
+    - 3 ya kam chars wale keywords sirf poore word par ("mc" ab "mcdonalds" me match nahi)
+    - "*" suffix => word-prefix ("bta*" => bta, btao, btana)
+    - baaki sab substring (purana behaviour, stems jaise "bhosd" ke liye)
+    """
+
+    def __init__(self, categories: Dict[str, List[str]]):
+        self.categories: Dict[str, List[str]] = {}
+        owners: Dict[str, List[tuple]] = {}
+        for cat, kws in categories.items():
+            names = []
+            for idx, raw in enumerate(kws):
+                spec = raw.strip().lower()
+                names.append(spec.rstrip("*"))
+                owners.setdefault(spec, []).append((cat, idx))
+            self.categories[cat] = names
+
+        specs = sorted(owners, key=lambda k: len(k.rstrip("*")), reverse=True)
+        pats = {spec: self._pattern(spec) for spec in specs}
+        self._specs = specs
+        self._owners = owners
+        # lookahead => har position par longest keyword; chhote keywords jo
+        # uske andar hain woh _implied se aate hain (overlaps miss nahi hote)
+        self._regex = re.compile("(?=(?:" + "|".join(f"({pats[k]})" for k in specs) + "))")
+        self._implied: Dict[str, tuple] = {}
+        for spec in specs:
+            literal = spec.rstrip("*")
+            self._implied[spec] = tuple(
+                other for other in specs
+                if other != spec and re.search(pats[other], literal)
+            )
+
+    @staticmethod
+    def _pattern(spec: str) -> str:
+        if spec.endswith("*"):
+            return r"\b" + re.escape(spec[:-1])
+        if len(spec) <= 3:
+            return r"\b" + re.escape(spec) + r"\b"
+        return re.escape(spec)
+
+    def scan(self, text: str) -> KeywordHits:
+        found: set = set()
+        for m in self._regex.finditer((text or "").lower()):
+            spec = self._specs[m.lastindex - 1]
+            if spec in found:
+                continue
+            found.add(spec)
+            found.update(self._implied[spec])
+        cats: Dict[str, set] = {}
+        for spec in found:
+            for cat, idx in self._owners[spec]:
+                cats.setdefault(cat, set()).add(idx)
+        return KeywordHits(self, cats)
+
+
+# category => default keyword list (data files me section na ho to yahi)
+KEYWORD_LISTS: Dict[str, List[str]] = {
+    "detail": DETAIL_KEYWORDS,
+    "simplify": SIMPLIFY_KEYWORDS,
+    "creator": CREATOR_TRIGGERS,
+    "profane": PROFANE_KEYWORDS,
+    "followup": FOLLOWUP_KEYWORDS,
+    "live": LIVE_SEARCH_TRIGGERS,
+    "toxic": TOXIC_WORDS,
+    "polite": POLITE_WORDS,
+    "positive": POSITIVE_WORDS,
+    "topic": TOPIC_KEYWORDS,
+}
+# built-in lists se; data files load hone par apply_chat_data ise swap karta hai
+KEYWORD_MATCHER = KeywordMatcher(KEYWORD_LISTS)
+
+
+# ---------- Message analysis: har message ka ek immutable feature record ----------
+
+@dataclass(frozen=True)
+class MessageFeatures:
+    text: str                  # original content
+    lower: str
+    clean_text: str            # bot mention hata ke
+    clean_lower: str
+    hits: KeywordHits
+    topic: Optional[str]
+    toxic: bool
+    polite: bool
+    positive: bool
+    mentions_bot: bool         # @Pappu
+    says_pappu: bool           # text me "pappu"
+    is_reply: bool
+    other_mentions: tuple      # non-bot user mentions
+    word_count: int
+
+    @property
+    def sentiment(self) -> str:
+        if self.toxic:
+            return "toxic"
+        if self.polite:
+            return "polite"
+        if self.positive:
+            return "positive"
+        return "neutral"
+
+    @property
+    def invoked(self) -> bool:
+        """Reply-to-Pappu alag se check hota hai (reference resolve karna padta hai)."""
+        return self.mentions_bot or self.says_pappu
+
+
+def analyze_text(
+    text: str,
+    bot_id: Optional[int] = None,
+    mentions_bot: bool = False,
+    is_reply: bool = False,
+    other_mentions: tuple = (),
+) -> MessageFeatures:
+    text = text or ""
+    lower = text.lower()
+    clean = text
+    if bot_id is not None:
+        clean = clean.replace(f"<@{bot_id}>", "").replace(f"<@!{bot_id}>", "").strip()
+    # mention tokens me sirf digits hote hain, isliye ek hi scan dono ke liye kaafi
+    hits = KEYWORD_MATCHER.scan(lower)
+    return MessageFeatures(
+        text=text,
+        lower=lower,
+        clean_text=clean,
+        clean_lower=clean.lower(),
+        hits=hits,
+        topic=hits.first("topic"),
+        toxic=hits.has("toxic"),
+        polite=hits.has("polite"),
+        positive=hits.has("positive"),
+        mentions_bot=mentions_bot,
+        says_pappu="pappu" in lower,
+        is_reply=is_reply,
+        other_mentions=other_mentions,
+        word_count=len(text.split()),
+    )
+
+
+def analyze_message(message: discord.Message) -> MessageFeatures:
+    me = bot.user
+    return analyze_text(
+        message.content or "",
+        bot_id=me.id if me else None,
+        mentions_bot=bool(me and me.mentioned_in(message)),
+        is_reply=message.reference is not None,
+        other_mentions=tuple(u for u in message.mentions if not u.bot and u != me),
+    )
+
 # Language strictness: per your request english_lock == True => always English; False => only Hinglish
 def choose_language_for_reply(_: str) -> str:
     return "en" if RUNTIME_SETTINGS.get("english_lock", False) else "hi"
@@ -420,81 +2450,505 @@ DEVANAGARI_RE = re.compile(r"[\u0900-\u097F]")
 def choose_roast(name: str, profane: bool = False) -> str:
     # MIXED style (funny + savage + straight)
     if profane:
-        return random.choice(PROFANE_ROASTS).format(name=name)
-    return random.choice(SAFE_ROASTS).format(name=name)
+        return random.choice(CHAT_DATA.profane_roasts).format(name=name)
+    return random.choice(CHAT_DATA.safe_roasts).format(name=name)
+
+
+DISCORD_MSG_LIMIT = 1900
+_FENCE_RE = re.compile(r"```(\w*)")
+
+
+def _split_point(text: str, limit: int) -> int:
+    """limit se pehle sabse achha cut: newline > sentence end > space > hard cut."""
+    window = text[:limit]
+    for sep in ("\n", ". ", "! ", "? ", " "):
+        idx = window.rfind(sep)
+        if idx >= limit // 2:
+            return idx + len(sep)
+    return limit
+
+
+def _cut_chunk(text: str, limit: int) -> tuple:
+    """
+    (chunk, rest): limit ke andar achhi jagah se kaato. Code block beech me
+    kate to chunk ke end par fence band aur rest me same language ke saath
+    dobara khul jaata hai.
+    """
+    cut = _split_point(text, limit - 4)  # closing "\n```" ki jagah
+    chunk, rest = text[:cut], text[cut:]
+    fences = _FENCE_RE.findall(chunk)
+    if len(fences) % 2 == 1:
+        lang = fences[-1]
+        chunk = chunk.rstrip("\n") + "\n```"
+        rest = f"```{lang}\n" + rest
+    return chunk, rest
+
+
+def split_message(text: str, limit: int = DISCORD_MSG_LIMIT) -> List[str]:
+    """Discord-size chunks, line/sentence/word boundary par (code fences _cut_chunk repair karta hai)."""
+    chunks: List[str] = []
+    rest = text
+    while len(rest) > limit:
+        chunk, rest = _cut_chunk(rest, limit)
+        chunks.append(chunk)
+    if rest.strip():
+        chunks.append(rest)
+    return chunks
+
+
+class _ChannelBucket:
+    """Per-channel token bucket (Discord: ~5 messages / 5 sec per channel)."""
+
+    __slots__ = ("capacity", "refill", "tokens", "stamp")
+
+    def __init__(self, capacity: int, per: float):
+        self.capacity = capacity
+        self.refill = capacity / per
+        self.tokens = float(capacity)
+        self.stamp = time.monotonic()
+
+    def _refresh(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.stamp) * self.refill)
+        self.stamp = now
+
+    def delay(self) -> float:
+        """Token mila to 0, warna kitna rukna padega."""
+        self._refresh()
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.refill
+
+    def time_to_full(self) -> float:
+        """Kitni der me bucket poora bhar jaayega (tab naya bucket = yahi bucket)."""
+        self._refresh()
+        return (self.capacity - self.tokens) / self.refill
+
+
+class _Outgoing:
+    __slots__ = ("content", "future", "queued_at", "coalesce")
+
+    def __init__(self, content: str, future: asyncio.Future, coalesce: bool):
+        self.content = content
+        self.future = future
+        self.queued_at = time.monotonic()
+        self.coalesce = coalesce
+
+
+class OutboundDispatcher:
+    """
+    Saare bot sends yahan se: har channel ki apni FIFO queue + worker,
+    rate-limit bucket ke hisaab se back-to-back sends, aur queue me saath
+    pade chhote messages ek hi send me merge (coalesce).
+    Worker idle hone par bucket bharne tak rukta hai, phir channel ki queue +
+    bucket hata deta hai; stats sirf last stats_channels channels ke (LRU).
+    """
+
+    def __init__(self, rate: int = 5, per: float = 5.0, limit: int = DISCORD_MSG_LIMIT,
+                 stats_channels: int = 256):
+        self.rate = rate
+        self.per = per
+        self.limit = limit
+        self.stats_channels = stats_channels
+        self._queues: Dict[Any, Any] = {}
+        self._workers: Dict[Any, asyncio.Task] = {}
+        self._wakeups: Dict[Any, asyncio.Event] = {}  # idle worker ko naye message par jagao
+        self._buckets: Dict[Any, _ChannelBucket] = {}
+        self._stats: "OrderedDict[Any, Dict[str, float]]" = OrderedDict()
+        self.listeners: List[Any] = []  # callback(channel, sent_message)
+
+    async def send(self, channel: discord.abc.Messageable, content: str, coalesce: bool = True) -> discord.Message:
+        fut = self._enqueue(channel, content, coalesce)
+        return await fut
+
+    async def send_many(self, channel: discord.abc.Messageable, chunks: List[str]) -> List[discord.Message]:
+        # ek saath enqueue => order pakka, aur bucket allow kare to bina gap ke
+        futs = [self._enqueue(channel, c, False) for c in chunks]
+        return list(await asyncio.gather(*futs))
+
+    def _enqueue(self, channel, content: str, coalesce: bool) -> asyncio.Future:
+        key = getattr(channel, "id", None) or id(channel)
+        fut = asyncio.get_running_loop().create_future()
+        queue = self._queues.get(key)
+        if queue is None:
+            queue = self._queues[key] = deque()
+        queue.append(_Outgoing(content, fut, coalesce))
+        worker = self._workers.get(key)
+        if worker is None or worker.done():
+            self._wakeups[key] = asyncio.Event()
+            self._workers[key] = asyncio.get_running_loop().create_task(self._drain(key, channel))
+        else:
+            self._wakeups[key].set()
+        return fut
+
+    async def _drain(self, key, channel):
+        queue = self._queues[key]
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = _ChannelBucket(self.rate, self.per)
+        stats = self._channel_stats(key)
+        wake = self._wakeups[key]
+        try:
+            while True:
+                await self._send_queued(channel, queue, bucket, stats)
+                # idle: bucket bharne tak ruko – beech me aaya message isi bucket se (turant) jaaye
+                wake.clear()
+                try:
+                    await asyncio.wait_for(wake.wait(), bucket.time_to_full())
+                except asyncio.TimeoutError:
+                    pass
+                if not queue:
+                    break
+        finally:
+            self._workers.pop(key, None)
+            self._wakeups.pop(key, None)
+            if not queue:
+                self._queues.pop(key, None)
+                self._buckets.pop(key, None)
+
+    def _channel_stats(self, key) -> Dict[str, float]:
+        stats = self._stats.get(key)
+        if stats is None:
+            stats = self._stats[key] = {"sent": 0, "merged": 0, "errors": 0, "latency_sum": 0.0, "latency_max": 0.0}
+            while len(self._stats) > self.stats_channels:
+                self._stats.popitem(last=False)
+        self._stats.move_to_end(key)
+        return stats
+
+    async def _send_queued(self, channel, queue: deque, bucket: _ChannelBucket, stats: Dict[str, float]):
+        while queue:
+            wait = bucket.delay()
+            if wait:
+                await asyncio.sleep(wait)
+                continue
+            batch = [queue.popleft()]
+            if batch[0].coalesce:
+                size = len(batch[0].content)
+                while queue and queue[0].coalesce and size + 1 + len(queue[0].content) <= self.limit:
+                    item = queue.popleft()
+                    size += 1 + len(item.content)
+                    batch.append(item)
+            content = "\n".join(item.content for item in batch)
+            try:
+                with METRICS.timer("pappu_discord_send_seconds", kind="send"):
+                    msg = await channel.send(content)
+            except Exception as e:
+                stats["errors"] += 1
+                METRICS.inc("pappu_errors_total", where="send")
+                for item in batch:
+                    if not item.future.done():
+                        item.future.set_exception(e)
+                continue
+            now = time.monotonic()
+            stats["sent"] += 1
+            stats["merged"] += len(batch) - 1
+            for item in batch:
+                lat = now - item.queued_at
+                stats["latency_sum"] += lat
+                stats["latency_max"] = max(stats["latency_max"], lat)
+                if not item.future.done():
+                    item.future.set_result(msg)
+            for cb in self.listeners:
+                try:
+                    cb(channel, msg)
+                except Exception:
+                    pass
 
+    def depth(self, channel_id) -> int:
+        q = self._queues.get(channel_id)
+        return len(q) if q else 0
 
-async def send_long_message(channel: discord.abc.Messageable, text: str):
+    def stats(self) -> Dict[Any, Dict[str, float]]:
+        out = {}
+        for key, st in self._stats.items():
+            delivered = st["sent"] + st["merged"]
+            out[key] = {
+                "depth": self.depth(key),
+                "sent": st["sent"],
+                "merged": st["merged"],
+                "errors": st["errors"],
+                "avg_latency_ms": (st["latency_sum"] / delivered * 1000) if delivered else 0.0,
+                "max_latency_ms": st["latency_max"] * 1000,
+            }
+        return out
+
+
+OUTBOUND = OutboundDispatcher()
+OUTBOUND.listeners.append(lambda channel, msg: BOT_MESSAGES.add(msg))
+
+
+async def send_message(channel: discord.abc.Messageable, text: str) -> discord.Message:
+    return await OUTBOUND.send(channel, text)
+
+
+async def send_long_message(channel: discord.abc.Messageable, text: str) -> List[discord.Message]:
     if not text:
-        await channel.send("Papa ji, reply thoda khali sa aa gaya, dobara try karo.")
-        return
-    max_len = 1900
-    for i in range(0, len(text), max_len):
-        await channel.send(text[i:i + max_len])
-        await asyncio.sleep(0.06)
+        return [await send_message(channel, "Papa ji, reply thoda khali sa aa gaya, dobara try karo.")]
+    return await OUTBOUND.send_many(channel, split_message(text))
+
+
+# Streaming replies: pehla sentence aate hi message post, phir rate-limited edits
+STREAM_EDIT_INTERVAL = float(os.getenv("STREAM_EDIT_INTERVAL", "1.0"))  # seconds between edits
+STREAM_FIRST_POST_CHARS = 200
+STREAM_CUT_NOTE = " … _(jawab beech me kat gaya, dobara pucho)_"
+_SENTENCE_END_RE = re.compile(r"[.!?\u0964\n]")
+
+
+class StreamingReply:
+    """
+    Streamed chunks ko Discord message(s) me dikhata hai. Edits
+    STREAM_EDIT_INTERVAL se zyada tez nahi; 1900 chars par naya message.
+    complete = stream bina error ke khatam hua (tabhi jawab cache karne layak).
+    """
+
+    def __init__(self, channel: discord.abc.Messageable, prefix: str = ""):
+        self.channel = channel
+        self.full = ""
+        self.messages: List[discord.Message] = []
+        self._segment = prefix
+        self._msg: Optional[discord.Message] = None
+        self._shown = ""
+        self._last_edit = 0.0
+        self.complete = False
+
+    @property
+    def posted(self) -> bool:
+        return bool(self.messages)
+
+    async def feed(self, chunk: str):
+        self.full += chunk
+        self._segment += chunk
+        while len(self._segment) > DISCORD_MSG_LIMIT:
+            head, self._segment = _cut_chunk(self._segment, DISCORD_MSG_LIMIT)
+            await self._show(head)
+            self._msg = None
+            self._shown = ""
+        if self._msg is None:
+            if _SENTENCE_END_RE.search(self._segment) or len(self._segment) >= STREAM_FIRST_POST_CHARS:
+                await self._show(self._segment)
+        elif time.monotonic() - self._last_edit >= STREAM_EDIT_INTERVAL:
+            await self._show(self._segment)
+
+    async def _show(self, text: str):
+        if not text.strip() or text == self._shown:
+            return
+        if self._msg is None:
+            self._msg = await OUTBOUND.send(self.channel, text, coalesce=False)
+            self.messages.append(self._msg)
+        else:
+            with METRICS.timer("pappu_discord_send_seconds", kind="edit"):
+                await self._msg.edit(content=text)
+        self._shown = text
+        self._last_edit = time.monotonic()
+
+    async def finish(self):
+        await self._show(self._segment)
+
+    async def consume(self, chunks) -> str:
+        """
+        Poora stream padho. Kuch aane se pehle error aaye to raise (caller
+        fallback kare); beech me aaye to jo mila uske saath "kat gaya" note
+        dikhao aur complete=False rehne do.
+        """
+        try:
+            async for chunk in chunks:
+                await self.feed(chunk)
+        except Exception as e:
+            if not self.posted and not self.full:
+                raise
+            METRICS.inc("pappu_errors_total", where="stream")
+            print("Warning: reply stream cut off:", repr(e))
+            await self._show(self._segment.rstrip() + STREAM_CUT_NOTE)
+            return self.full
+        if self.full:
+            await self.finish()
+        self.complete = True
+        return self.full
+
+
+async def generate_reply(channel: discord.abc.Messageable, prompt: str, prefix: str = "") -> tuple:
+    """
+    (text, sent, complete). Streaming ON ho to text already channel me chala gaya
+    hota hai (sent = posted messages ki list); warna sent=[] aur caller khud send kare.
+    complete=False => stream beech me toota, text adhoora hai (cache mat karo).
+    """
+    if not RUNTIME_SETTINGS.get("streaming", True):
+        async with channel.typing():
+            return await generate_text(prompt), [], True
+    reply = StreamingReply(channel, prefix)
+    async with channel.typing():
+        out = await reply.consume(stream_text(prompt))
+    return out, reply.messages, reply.complete
 
 
 # ---------- PART 4: Live-search helpers + prompt builder ----------
 
-def perform_search_serpapi(query: str, num: int = 3) -> str:
+# Shared keep-alive HTTP pool (lazy, event loop ke andar banta hai)
+_HTTP_SESSION: Optional[aiohttp.ClientSession] = None
+SEARCH_CACHE = TTLCache(SEARCH_CACHE_SIZE, SEARCH_CACHE_TTL)
+
+
+def _http_session() -> aiohttp.ClientSession:
+    global _HTTP_SESSION
+    if _HTTP_SESSION is None or _HTTP_SESSION.closed:
+        _HTTP_SESSION = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=32, ttl_dns_cache=300, keepalive_timeout=60),
+            timeout=aiohttp.ClientTimeout(total=SEARCH_TIMEOUT),
+        )
+    return _HTTP_SESSION
+
+
+async def close_http_session():
+    global _HTTP_SESSION
+    if _HTTP_SESSION is not None and not _HTTP_SESSION.closed:
+        await _HTTP_SESSION.close()
+    _HTTP_SESSION = None
+
+
+def _normalize_query(query: str) -> str:
+    q = re.sub(r"[^\w\s]", " ", (query or "").lower())
+    return " ".join(q.split())
+
+
+async def perform_search_serpapi(query: str, num: int = 3) -> str:
     if not SERPAPI_KEY:
         return ""
     params = {"engine": "google", "q": query, "num": num, "api_key": SERPAPI_KEY}
-    try:
-        r = requests.get("https://serpapi.com/search", params=params, timeout=8)
-        data = r.json()
-        out = []
-        for item in data.get("organic_results", [])[:num]:
-            title = item.get("title", "")
-            snippet = item.get("snippet", "")
-            link = item.get("link", "")
-            out.append(f"{title}\n{snippet}\n{link}")
-        return "\n\n".join(out)
-    except Exception:
-        return ""
-
-
-def perform_search_google(query: str, num: int = 3) -> str:
+    async with _http_session().get("https://serpapi.com/search", params=params) as r:
+        data = await r.json(content_type=None)
+    out = []
+    for item in data.get("organic_results", [])[:num]:
+        title = item.get("title", "")
+        snippet = item.get("snippet", "")
+        link = item.get("link", "")
+        out.append(f"{title}\n{snippet}\n{link}")
+    return "\n\n".join(out)
+
+
+async def perform_search_google(query: str, num: int = 3) -> str:
     if not GOOGLE_API_KEY or not GOOGLE_CSE_ID:
         return ""
-    try:
-        params = {"key": GOOGLE_API_KEY, "cx": GOOGLE_CSE_ID, "q": query, "num": num}
-        r = requests.get("https://www.googleapis.com/customsearch/v1", params=params, timeout=8)
-        data = r.json()
-        out = []
-        for it in data.get("items", [])[:num]:
-            out.append(f"{it.get('title', '')}\n{it.get('snippet', '')}\n{it.get('link', '')}")
-        return "\n\n".join(out)
-    except Exception:
-        return ""
+    params = {"key": GOOGLE_API_KEY, "cx": GOOGLE_CSE_ID, "q": query, "num": num}
+    async with _http_session().get("https://www.googleapis.com/customsearch/v1", params=params) as r:
+        data = await r.json(content_type=None)
+    out = []
+    for it in data.get("items", [])[:num]:
+        out.append(f"{it.get('title', '')}\n{it.get('snippet', '')}\n{it.get('link', '')}")
+    return "\n\n".join(out)
+
+
+async def perform_search_fake(query: str, num: int = 3) -> str:
+    """Offline provider: deterministic results, network bilkul nahi."""
+    delay = float(os.getenv("PAPPU_SEARCH_FAKE_DELAY", "0"))
+    if delay:
+        await asyncio.sleep(delay)
+    q = _normalize_query(query) or "query"
+    return "\n\n".join(
+        f"Fake result {i + 1} for {q}\nOffline snippet about {q}.\nhttps://example.invalid/{i + 1}"
+        for i in range(num)
+    )
 
 
-def perform_live_search(query: str) -> str:
+def _search_providers() -> list:
+    if SEARCH_FAKE:
+        return [perform_search_fake]
+    providers = []
     if SERPAPI_KEY:
-        s = perform_search_serpapi(query)
-        if s:
-            return s
+        providers.append(perform_search_serpapi)
     if GOOGLE_API_KEY and GOOGLE_CSE_ID:
-        s = perform_search_google(query)
-        if s:
-            return s
-    return ""
+        providers.append(perform_search_google)
+    return providers
 
 
-def build_normal_prompt(user_name: str, user_text: str, owner_flag: bool, lang: str, uid: Optional[int] = None) -> str:
+async def perform_live_search(query: str) -> str:
     """
-    ORIGINAL behaviour + Ultra Memory injection.
+    Cache pehle; miss par saare configured providers ek saath race karte hain,
+    pehla non-empty result jeet-ta hai aur baaki cancel ho jaate hain.
     """
-    mode = RUNTIME_SETTINGS.get("mode", "funny")
-    tone = {
-        "funny": "masti + light roast",
-        "angry": "short + savage",
-        "serious": "calm + informative",
-        "flirty": "playful",
-        "sarcastic": "sarcastic",
-        "bhaukaal": "mafia-tone",
-        "coder": "technical"
-    }.get(mode, "masti + light roast")
+    key = _normalize_query(query)
+    cached = SEARCH_CACHE.get(key)
+    if cached is not None:
+        return cached
+
+    providers = _search_providers()
+    if not providers:
+        return ""
+
+    tasks = [asyncio.ensure_future(fn(query)) for fn in providers]
+    result = ""
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + SEARCH_TIMEOUT
+    pending = set(tasks)
+    with METRICS.timer("pappu_search_seconds"):
+        try:
+            # overall deadline sirf yahan; kisi provider ka apna timeout (aiohttp) bas
+            # us provider ki error hai – baaki race chalti rehti hai
+            while pending and not result:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                done, pending = await asyncio.wait(pending, timeout=remaining, return_when=asyncio.FIRST_COMPLETED)
+                for t in done:
+                    try:
+                        res = t.result()
+                    except Exception:
+                        METRICS.inc("pappu_errors_total", where="search")
+                        continue
+                    if res:
+                        result = res
+                        break
+        finally:
+            for t in tasks:
+                t.cancel()
+
+    if result:
+        SEARCH_CACHE.put(key, result)
+    return result
+
+
+# LLM response cache: repeat sawaal (creator, date, common coding doubts) bina
+# API call ke. Sirf un prompts ke liye jo user ki memory par depend nahi karte.
+LLM_CACHE_SIZE = int(os.getenv("LLM_CACHE_SIZE", "512"))
+LLM_CACHE_DEFAULT_TTL = int(os.getenv("LLM_CACHE_TTL", "900"))  # seconds
+LLM_CACHE_MODE_TTLS = {
+    "serious": 3600,
+    "coder": 3600,
+    "funny": 600,
+    "sarcastic": 600,
+    "flirty": 300,
+    "angry": 300,
+}
+RESPONSE_CACHE = TTLCache(LLM_CACHE_SIZE, LLM_CACHE_DEFAULT_TTL)
+
+# First-person pronouns/possessives: sawaal user ke apne context/memory ke baare me hai.
+# "me"/"mein"/"main"/"mai" (postpositions) nahi – wo lagbhag har Hinglish sawaal me hote hain.
+MEMORY_DEPENDENT_WORDS = {
+    "mera", "meri", "mere", "mujhe", "mujhse", "maine", "mene",
+    "hum", "hamara", "humara", "hamari", "humari", "i", "im", "my", "mine", "myself", "we", "our",
+}
+
+
+def needs_user_memory(text: str) -> bool:
+    words = CHAT_DATA.memory_words
+    return any(w in words for w in _normalize_query(text).split())
+
+
+def response_cache_key(text: str, mode: str, lang: str, is_announcement: bool, owner_flag: bool) -> tuple:
+    return (_normalize_query(text), mode, lang, bool(is_announcement), bool(owner_flag))
+
+
+def response_cache_ttl(mode: str) -> int:
+    return LLM_CACHE_MODE_TTLS.get(mode, LLM_CACHE_DEFAULT_TTL)
+
+
+@functools.lru_cache(maxsize=64)
+def build_lang_preamble(mode: str, owner_flag: bool, lang: str) -> str:
+    """
+    Bot identity + owner rules + language/tone instruction (per combination ek baar banta hai;
+    data reload par cache clear hota hai).
+    """
+    tone = CHAT_DATA.mode_tones.get(mode) or "masti + light roast"
 
     base_rules = (
         "You are a Discord bot named Pappu on a private Indian server. "
@@ -529,38 +2983,261 @@ def build_normal_prompt(user_name: str, user_text: str, owner_flag: bool, lang:
             + ". Keep answers short (2–6 lines) and avoid long lectures."
         )
 
-    memory_block = ""
-    if uid is not None:
-        u = get_deep_user(uid)
-        last_msgs = u.get("messages", [])[-10:]
-        topics = u.get("topics", [])
-        traits = u.get("personality", {})
-        mood = u.get("mood", "normal")
-        memory_block = f"""
-[USER PROFILE MEMORY]
-- Friendliness: {traits.get('friendliness', 5):.1f}/10
-- Toxicity: {traits.get('toxicity', 5):.1f}/10
-- Respect: {traits.get('respect', 5):.1f}/10
-- Sarcasm: {traits.get('sarcasm', 5):.1f}/10
-- Mood: {mood}
+    return lang_preamble
+
+
+# ---------- Hot-reloadable data files: roasts, keyword lists, modes ----------
+# PAPPU_DATA_DIR (default: repo folder):
+#   pappu_keywords.txt – "[section]" headers, har line ek entry. Sections = KEYWORD_LISTS ki
+#                        categories + memory, modes ("mode = tone"), safe_roasts, profane_roasts.
+#                        Jo section file me nahi, uske liye code wali default list.
+#   roasts_strong.txt  – extra profane roasts ({name} placeholder)
+#   slurs.txt          – extra profanity keywords
+# "#" se shuru line comment. Watcher ya `pappu reload` naya snapshot background me
+# compile karke ek hi step me swap karta hai – gateway connection nahi tootta.
+DATA_DIR = Path(os.getenv("PAPPU_DATA_DIR", str(Path(__file__).resolve().parent)))
+KEYWORDS_FILE = DATA_DIR / "pappu_keywords.txt"
+STRONG_ROASTS_FILE = DATA_DIR / "roasts_strong.txt"
+SLURS_FILE = DATA_DIR / "slurs.txt"
+DATA_WATCH_INTERVAL = float(os.getenv("DATA_WATCH_INTERVAL", "5"))  # seconds, 0 => watcher off
+
+
+def _data_signature() -> tuple:
+    out = []
+    for path in (KEYWORDS_FILE, STRONG_ROASTS_FILE, SLURS_FILE):
+        try:
+            st = path.stat()
+            out.append((st.st_mtime_ns, st.st_size))
+        except OSError:
+            out.append(None)
+    return tuple(out)
+
+
+def _read_lines(path: Path) -> List[str]:
+    if not path.exists():
+        return []
+    lines = []
+    for line in path.read_text(encoding="utf-8").splitlines():
+        line = line.strip()
+        if line and not line.startswith("#"):
+            lines.append(line)
+    return lines
+
+
+def _read_sections(path: Path) -> Dict[str, List[str]]:
+    sections: Dict[str, List[str]] = {}
+    current: Optional[List[str]] = None
+    for line in _read_lines(path):
+        if line.startswith("[") and line.endswith("]"):
+            current = sections.setdefault(line[1:-1].strip().lower(), [])
+        elif current is None:
+            raise ValueError(f"{path.name}: entry before any [section]: {line[:40]}")
+        else:
+            current.append(line)
+    return sections
+
+
+def _merged(*lists) -> List[str]:
+    return list(dict.fromkeys(item for items in lists for item in items))
+
+
+def _valid_roasts(lines: List[str]) -> List[str]:
+    out = []
+    for line in lines:
+        try:
+            line.format(name="x")
+        except (KeyError, IndexError, ValueError):
+            print("Warning: roast skipped (sirf {name} placeholder chalta hai):", line[:40])
+            continue
+        out.append(line)
+    return out
+
+
+class ChatData:
+    """Ek reload ka poora, pehle se compile kiya hua snapshot."""
+
+    __slots__ = ("matcher", "safe_roasts", "profane_roasts", "memory_words", "mode_tones", "signature")
+
+    def summary(self) -> str:
+        keywords = sum(len(kws) for kws in self.matcher.categories.values())
+        return (
+            f"{keywords} keywords, {len(self.profane_roasts)} strong + {len(self.safe_roasts)} safe roasts, "
+            f"{len(self.mode_tones)} modes"
+        )
+
+
+def load_chat_data(use_files: bool = True) -> ChatData:
+    """Files padho + matcher compile (blocking – reload par worker thread me chalta hai)."""
+    signature = _data_signature()  # padhne se pehle: beech me file badli to agla poll phir reload karega
+    sections = _read_sections(KEYWORDS_FILE) if use_files else {}
+    lists = {cat: sections.get(cat, kws) for cat, kws in KEYWORD_LISTS.items()}
+    if use_files:
+        lists["profane"] = _merged(lists["profane"], _read_lines(SLURS_FILE))
+    profane_roasts = sections.get("profane_roasts", PROFANE_ROASTS)
+    if use_files:
+        profane_roasts = _merged(profane_roasts, _read_lines(STRONG_ROASTS_FILE))
+
+    modes: Dict[str, str] = {}
+    for line in sections.get("modes", ()):
+        name, _, tone = line.partition("=")
+        modes[name.strip().lower()] = tone.strip()
+
+    data = ChatData()
+    data.matcher = KeywordMatcher(lists)
+    data.safe_roasts = _valid_roasts(sections.get("safe_roasts", SAFE_ROASTS)) or list(SAFE_ROASTS)
+    data.profane_roasts = _valid_roasts(profane_roasts) or list(PROFANE_ROASTS)
+    data.memory_words = frozenset(w.lower() for w in sections.get("memory", MEMORY_DEPENDENT_WORDS))
+    data.mode_tones = modes or dict(MODE_TONES)
+    data.signature = signature
+    return data
+
+
+def apply_chat_data(data: ChatData):
+    """Swap – event loop par, beech me koi await nahi, to koi handler aadha-purana mix nahi dekhta."""
+    global CHAT_DATA, KEYWORD_MATCHER
+    CHAT_DATA = data
+    KEYWORD_MATCHER = data.matcher
+    build_lang_preamble.cache_clear()
+
+
+async def reload_chat_data() -> ChatData:
+    with METRICS.timer("pappu_reload_seconds"):
+        data = await asyncio.to_thread(load_chat_data)
+    apply_chat_data(data)
+    return data
+
+
+async def data_watch_loop():
+    """Data files ka mtime/size poll; badle to background reload. Toota file => purani lists."""
+    failed = None
+    while True:
+        await asyncio.sleep(DATA_WATCH_INTERVAL)
+        signature = _data_signature()
+        if signature == CHAT_DATA.signature or signature == failed:
+            continue
+        try:
+            data = await reload_chat_data()
+            failed = None
+            print("Data files reloaded:", data.summary())
+        except Exception as e:
+            failed = signature  # file dobara badalne tak warning repeat nahi
+            METRICS.inc("pappu_errors_total", where="reload")
+            print("Warning: data file reload failed, old lists stay active:", e)
+
+
+try:
+    apply_chat_data(load_chat_data())
+except Exception as e:
+    print("Warning: data files load failed, using built-in lists:", e)
+    apply_chat_data(load_chat_data(use_files=False))
+
+
+# Prompt size budget: memory block pehle trim hota hai, phir search results, phir user text
+PROMPT_MAX_CHARS = int(os.getenv("PROMPT_MAX_CHARS", "6000"))          # ~1500 tokens
+PROMPT_MEMORY_BUDGET = int(os.getenv("PROMPT_MEMORY_BUDGET", "1500"))  # chars
+PROMPT_MSG_MAX_CHARS = 300  # memory me ek message ka max hissa
 
+
+def _render_memory_block(u: UserProfile, budget: int) -> str:
+    """Budget me fit karne ke liye pehle purane messages, phir purane topics chhodo."""
+    header = f"""
+[USER PROFILE MEMORY]
+- Friendliness: {u.trait('friendliness'):.1f}/10
+- Toxicity: {u.trait('toxicity'):.1f}/10
+- Respect: {u.trait('respect'):.1f}/10
+- Sarcasm: {u.trait('sarcasm'):.1f}/10
+- Mood: {u.mood}
+"""
+    msgs = [m if len(m) <= PROMPT_MSG_MAX_CHARS else m[:PROMPT_MSG_MAX_CHARS] + "…" for m in u.recent_messages(10)]
+    topics = list(u.topics)
+    while True:
+        block = header + f"""
 [LAST 10 USER MESSAGES]
-{json.dumps(last_msgs, ensure_ascii=False)}
+{json.dumps(msgs, ensure_ascii=False)}
 
 [USER TOPICS]
 {json.dumps(topics, ensure_ascii=False)}
 """
+        if len(block) <= budget or (not msgs and not topics):
+            return block
+        if msgs:
+            msgs.pop(0)
+        else:
+            topics.pop(0)
+
+
+def memory_block_for(u: UserProfile, budget: int = PROMPT_MEMORY_BUDGET) -> str:
+    """Rendered memory block, user ki memory badalne tak cached."""
+    cached = u.prompt_block
+    if cached is not None and cached[0] == u.version and cached[1] == budget:
+        return cached[2]
+    block = _render_memory_block(u, budget)
+    u.prompt_block = (u.version, budget, block)
+    return block
+
+
+def build_normal_prompt(
+    user_name: Optional[str],
+    user_text: str,
+    owner_flag: bool,
+    lang: str,
+    uid: Optional[int] = None,
+    search_summary: str = "",
+    history: Optional[List[_Turn]] = None,
+) -> str:
+    """
+    ORIGINAL behaviour + Ultra Memory injection.
+    user_name=None + uid=None => shared (cacheable) prompt, kisi user-specific detail ke bina.
+    history = conversation thread ke turns (CONVO_HISTORY_TOKENS budget me).
+    Poora prompt PROMPT_MAX_CHARS ke andar rehta hai.
+    """
+    mode = RUNTIME_SETTINGS.get("mode", "funny")
+    lang_preamble = build_lang_preamble(mode, owner_flag, lang)
+    user_line = f"User name: {user_name}\n" if user_name else ""
+    search_part = f"\nSearch results for you to optionally use:\n{search_summary}\n\n" if search_summary else ""
 
-    prompt = f"""{lang_preamble}
+    def history_part(budget_tokens: int) -> str:
+        convo = ConversationStore.render(history, budget_tokens) if history else ""
+        return f"Conversation so far (oldest first):\n{convo}\n\n" if convo else ""
+
+    convo_part = history_part(CONVO_HISTORY_TOKENS)
+
+    def assemble(memory_block: str, text: str, search: str) -> str:
+        return f"""{lang_preamble}
 
 {memory_block}
 
-User name: {user_name}
-User message: {user_text}
+{convo_part}{user_line}User message: {text}
 
 Answer concisely in chat style. If additional info from web is provided, you may use it.
 Avoid monologues; keep it crisp and readable for Discord.
-"""
+""" + search
+
+    u = get_deep_user(uid) if uid is not None else None
+    memory_block = memory_block_for(u) if u is not None else ""
+    prompt = assemble(memory_block, user_text, search_part)
+    over = len(prompt) - PROMPT_MAX_CHARS
+    if over <= 0:
+        return prompt
+
+    # 1) memory chhota karo
+    if u is not None:
+        memory_block = _render_memory_block(u, max(0, len(memory_block) - over))
+        prompt = assemble(memory_block, user_text, search_part)
+        over = len(prompt) - PROMPT_MAX_CHARS
+    # 2) conversation history ke purane turns
+    if over > 0 and convo_part:
+        convo_part = history_part(max(0, (len(convo_part) - over) // CHARS_PER_TOKEN))
+        prompt = assemble(memory_block, user_text, search_part)
+        over = len(prompt) - PROMPT_MAX_CHARS
+    # 3) search results kaato
+    if over > 0 and search_part:
+        search_part = search_part[:max(0, len(search_part) - over)]
+        prompt = assemble(memory_block, user_text, search_part)
+        over = len(prompt) - PROMPT_MAX_CHARS
+    # 4) aakhir me user text
+    if over > 0:
+        prompt = assemble(memory_block, user_text[:max(200, len(user_text) - over)], search_part)
     return prompt
 
 
@@ -602,18 +3279,20 @@ User's new message asking to simplify:
 Now respond with a simpler, shorter version of your original reply, following the style rules.
 """
 
-    if model is not None:
+    if llm_available() and RATE_LIMITER.allow("rewrite", user.id, _guild_id_of(channel)):
         try:
             async with channel.typing():
-                resp = model.generate_content(prompt)
-                out = getattr(resp, "text", None)
+                out = await generate_text(prompt)
                 if not out:
                     out = "Thoda simple version nahi bana paaya, Papa Ji. Ek baar fir se pooch lo."
-                await send_long_message(channel, out)
+                sent = await send_long_message(channel, out)
+                CONVERSATIONS.record(getattr(channel, "id", 0), user.id, instruction_text, out,
+                                     [m.id for m in sent], parent=original_message.id)
                 return
         except Exception as e:
-            await channel.send(f"Gemini error/timeout while simplifying: {e}")
-            return
+            METRICS.inc("pappu_errors_total", where="llm")
+            print("Warning: simplify failed:", repr(e))
+            # neeche wala trim fallback
 
     # Fallback: original reply ko hi thoda trim karke bhej do
     txt = original_message.content or ""
@@ -661,68 +3340,84 @@ User's new message asking for more detail:
 Now respond with a more detailed explanation of your original reply, following the style rules.
 """
 
-    if model is not None:
+    if llm_available() and RATE_LIMITER.allow("rewrite", user.id, _guild_id_of(channel)):
         try:
-            async with channel.typing():
-                resp = model.generate_content(prompt)
-                out = getattr(resp, "text", None)
+            out, sent, _complete = await generate_reply(channel, prompt)
+            if not sent:
                 if not out:
                     out = "Detail me samjhate waqt thoda issue aaya, Papa Ji. Ek baar fir se try kar lo."
-                await send_long_message(channel, out)
-                return
-        except Exception as e:
-            await channel.send(f"Gemini error/timeout while expanding: {e}")
+                sent = await send_long_message(channel, out)
+            CONVERSATIONS.record(getattr(channel, "id", 0), user.id, instruction_text, out or "",
+                                 [m.id for m in sent], parent=original_message.id)
             return
+        except Exception as e:
+            METRICS.inc("pappu_errors_total", where="llm")
+            print("Warning: expand failed:", repr(e))
+            # neeche wala fallback
 
     # Fallback: original reply hi bhej do (at least kuch toh mile)
     txt = original_message.content or ""
     await send_long_message(channel, txt)
 
 
-async def ask_pappu(user: discord.abc.User, text: str, is_announcement: bool, channel: discord.abc.Messageable):
+async def ask_pappu(
+    user: discord.abc.User,
+    text: str,
+    is_announcement: bool,
+    channel: discord.abc.Messageable,
+    feats: Optional[MessageFeatures] = None,
+    reply_to: Optional[int] = None,
+    llm_allowed: Optional[bool] = None,
+):
+    """
+    reply_to = Pappu ke jis message ka user ne reply kiya (thread wahi se banta hai).
+    llm_allowed: None => llm quota yahin check/charge; True => caller (batch) token le chuka;
+    False => model call nahi (quota caller pe deny ho chuka ya model down) – sasta path.
+    """
     owner_flag = is_owner(user)
+    if feats is None or feats.clean_text != text:
+        feats = analyze_text(text)
+    hits = feats.hits
     name = get_nice_name(user)
 
     # strict language choice per owner's english_lock setting
     lang = choose_language_for_reply(text)  # 'en' or 'hi'
 
-    # improved follow-up resolution using short context (ye same rakha)
-    ctx = get_context(user.id)
-    short_followups = [
-        "naam", "name",
-        "bta", "bata",
-        "aur", "or", "bhi",
-        "wahi", "same",
-        "desh", "country",
-        "phir", "fir", "next",
-        "ek aur"
-    ]
-    if ctx and len(text.split()) <= 8 and any(w in text.lower() for w in short_followups):
-        items = ctx.get("items") or []
-        if items:
-            text = f"{ctx.get('last_query')} — items: {', '.join(items[:6])} — follow-up: {text}"
-        else:
-            text = f"{ctx.get('last_query')} — follow-up: {text}"
-
-    # determine if user likely wants live info
-    triggers = [
-        "search", "kab", "aaj", "news", "release", "lyrics",
-        "khabar", "price", "brand", "date", "kab aayega"
-    ]
-    wants_live = any(t in (text or "").lower() for t in triggers)
+    # conversation thread: Pappu ke kisi message ka reply => wahi exact thread;
+    # warna chhota follow-up => is channel me user ka pichhla thread
+    channel_id = getattr(channel, "id", 0)
+    thread: List[_Turn] = []
+    if reply_to is not None:
+        thread = CONVERSATIONS.thread_for_message(reply_to)
+    if not thread and feats.word_count <= 8 and hits.has("followup"):
+        thread = CONVERSATIONS.thread(CONVERSATIONS.last(channel_id, user.id))
+    parent = thread[-1].message_ids[0] if thread and thread[-1].message_ids else reply_to
+
+    # determine if user likely wants live info (follow-up me topic pichhle sawaal se aata hai)
+    search_query = f"{thread[-1].question} — {text}" if thread else text
+    wants_live = (KEYWORD_MATCHER.scan(search_query) if thread else hits).has("live")
+    guild_id = _guild_id_of(channel)
 
     search_summary = ""
-    if wants_live:
-        search_summary = perform_live_search(text)
+    if wants_live and RATE_LIMITER.allow("search", user.id, guild_id):
+        search_summary = await perform_live_search(search_query)
         if not search_summary:
             await send_long_message(channel, "Papa ji, live-search keys/config missing ya result nahi mila.")
             return
 
-    # If Gemini model present, prefer it
-    if model is not None:
-        prompt = build_normal_prompt(user.display_name, text, owner_flag, lang, uid=user.id)
-        if search_summary:
-            prompt += f"\nSearch results for you to optionally use:\n{search_summary}\n\n"
+    # If Gemini model (ya gateway) present, prefer it
+    if llm_available():
+        mode = RUNTIME_SETTINGS.get("mode", "funny")
+        cache_key = None
+        if not search_summary and not thread and not needs_user_memory(text):
+            # memory-independent sawaal => shared prompt, response cache se serve ho sakta hai
+            cache_key = response_cache_key(text, mode, lang, is_announcement, owner_flag)
+            prompt = build_normal_prompt(None, text, owner_flag, lang)
+        else:
+            prompt = build_normal_prompt(
+                user.display_name, text, owner_flag, lang, uid=user.id,
+                search_summary=search_summary, history=thread,
+            )
 
         # If announcement, slightly change instruction
         if is_announcement:
@@ -732,36 +3427,44 @@ async def ask_pappu(user: discord.abc.User, text: str, is_announcement: bool, ch
             )
             prompt = announce_intro + "\n\n" + prompt
 
-        try:
-            async with channel.typing():
-                resp = model.generate_content(prompt)
-                out = getattr(resp, "text", None)
+        # cache hit quota nahi khaata; over-quota => neeche wala sasta canned path
+        cached = RESPONSE_CACHE.get(cache_key) if cache_key else None
+        if llm_allowed is None:
+            llm_allowed = cached is None and RATE_LIMITER.allow("llm", user.id, guild_id)
+        if cached is not None or llm_allowed:
+            try:
+                pref = deep_mood_prefix(user.id)
+                sent: List[discord.Message] = []
+                out = cached
+                if out is None and cache_key and LLM_GATEWAY is not None and not is_announcement:
+                    # shared sawaal: gateway ka cross-process cache + dedup + micro-batching
+                    async with channel.typing():
+                        out = await generate_text(prompt, job={
+                            "cache_key": json.dumps(cache_key, ensure_ascii=False),
+                            "ttl": response_cache_ttl(mode),
+                            "batchable": True,
+                            "preamble": build_lang_preamble(mode, owner_flag, lang),
+                            "question": text,
+                        })
+                    # local cache me nahi: jawab batch fragment ho sakta hai – cache gateway ka kaam
+                elif out is None:
+                    out, sent, complete = await generate_reply(channel, prompt, prefix=pref)
+                    if out and not complete:
+                        out += STREAM_CUT_NOTE  # thread history me bhi adhoora hi dikhe
+                    elif out and cache_key:
+                        RESPONSE_CACHE.put(cache_key, out, ttl=response_cache_ttl(mode))
                 if not out:
                     out = search_summary or "Papa ji, thoda blank sa aa gaya. Dobara bhejo."
 
-                # save context items if extractable (ye tumhara purana logic)
-                items = []
-                for line in out.splitlines():
-                    l = line.strip()
-                    if l and len(l.split()) <= 6 and len(l) < 120:
-                        items.append(l)
-                    if len(items) >= 8:
-                        break
-                if items:
-                    subj = "general"
-                    if "extract_subject_from_text" in globals():
-                        try:
-                            subj = extract_subject_from_text(text)  # type: ignore
-                        except Exception:
-                            pass
-                    set_context(user.id, subj, text, items=items)
-
                 # 🔥 Yahan Ultra Memory ka mood prefix bhi use kar rahe
-                pref = deep_mood_prefix(user.id)
-                await send_long_message(channel, pref + out)
+                if not sent:
+                    sent = await send_long_message(channel, pref + out)
+                CONVERSATIONS.record(channel_id, user.id, text, out, [m.id for m in sent], parent=parent)
                 return
-        except Exception as e:
-            await channel.send(f"Gemini error/timeout: {e}. Falling back to simple reply.")
+            except Exception as e:
+                # exception text channel me nahi – seedha sasta fallback reply
+                METRICS.inc("pappu_errors_total", where="llm")
+                print("Warning: LLM reply failed, using fallback:", repr(e))
 
     # If no model or Gemini failed:
     if search_summary:
@@ -783,18 +3486,219 @@ async def ask_pappu(user: discord.abc.User, text: str, is_announcement: bool, ch
         reply = f"{base} (Hinglish mode)"
     pref = deep_mood_prefix(user.id)
     await send_long_message(channel, pref + reply)
+
+
+# ---------- Per-channel ask scheduling: backpressure, fairness, batching ----------
+ASK_QUEUE_MAX = int(os.getenv("ASK_QUEUE_MAX", "8"))                  # pending sawaal per channel
+ASK_CHANNEL_CONCURRENCY = int(os.getenv("ASK_CHANNEL_CONCURRENCY", "2"))
+ASK_STALE_AFTER = float(os.getenv("ASK_STALE_AFTER", "45"))           # seconds
+ASK_BATCHING = os.getenv("PAPPU_ASK_BATCHING", "0") == "1"
+ASK_BATCH_MAX = int(os.getenv("ASK_BATCH_MAX", "4"))
+_BATCH_SPLIT_RE = re.compile(r"^###\s*(\d+)\s*$", re.M)
+
+
+class _AskJob:
+    __slots__ = ("user", "text", "feats", "reply_to", "queued_at")
+
+    def __init__(self, user: discord.abc.User, text: str, feats: Optional[MessageFeatures],
+                 reply_to: Optional[int] = None):
+        self.user = user
+        self.text = text
+        self.feats = feats
+        self.reply_to = reply_to
+        self.queued_at = time.monotonic()
+
+
+class ChannelAskScheduler:
+    """
+    ask_pappu ke aage per-channel queue:
+    - har user ka ek hi pending sawaal (naya aaye to purana replace = stale merge,
+      aur user line ke end me chala jaata hai => ek spammer baaki sabko starve nahi karta)
+    - queue full ho to naya sawaal turant sasta "bheed hai" reply paata hai
+    - ASK_STALE_AFTER se purane sawaal drop
+    - optional: kai pending sawaal ek hi model call me (PAPPU_ASK_BATCHING=1)
+    """
+
+    def __init__(self):
+        self._pending: Dict[Any, "OrderedDict[int, _AskJob]"] = {}
+        self._workers: Dict[Any, int] = {}
+        self.stats = {"submitted": 0, "merged": 0, "rejected": 0, "stale": 0, "batched": 0, "batches": 0}
+
+    async def submit(self, user: discord.abc.User, text: str, channel: discord.abc.Messageable,
+                     feats: Optional[MessageFeatures] = None, reply_to: Optional[int] = None):
+        key = getattr(channel, "id", None) or id(channel)
+        pending = self._pending.setdefault(key, OrderedDict())
+        self.stats["submitted"] += 1
+        if user.id in pending:
+            self.stats["merged"] += 1
+            pending.pop(user.id)
+        elif len(pending) >= ASK_QUEUE_MAX:
+            self.stats["rejected"] += 1
+            await send_message(channel, f"{get_nice_name(user)}, abhi bheed zyada hai – thodi der me pooch. 🙏")
+            return
+        pending[user.id] = _AskJob(user, text, feats, reply_to)
+        if self._workers.get(key, 0) < ASK_CHANNEL_CONCURRENCY:
+            self._workers[key] = self._workers.get(key, 0) + 1
+            asyncio.get_running_loop().create_task(self._drain(key, channel))
+
+    def depth(self, channel_id) -> int:
+        return len(self._pending.get(channel_id) or ())
+
+    def _take(self, key, guild_id: Optional[int]) -> List[_AskJob]:
+        pending = self._pending.get(key)
+        if not pending:
+            return []
+        _, job = pending.popitem(last=False)
+        jobs = [job]
+        if ASK_BATCHING and pending and _batchable(job, key, guild_id):
+            for uid in list(pending):
+                if len(jobs) >= ASK_BATCH_MAX:
+                    break
+                if _batchable(pending[uid], key, guild_id):
+                    jobs.append(pending.pop(uid))
+        return jobs
+
+    async def _drain(self, key, channel):
+        try:
+            while True:
+                jobs = self._take(key, _guild_id_of(channel))
+                if not jobs:
+                    break
+                now = time.monotonic()
+                fresh = []
+                for job in jobs:
+                    if now - job.queued_at > ASK_STALE_AFTER:
+                        self.stats["stale"] += 1
+                        await send_message(channel, f"{job.user.mention} bheed me tera sawaal purana ho gaya, dobara pooch lo.")
+                    else:
+                        fresh.append(job)
+                try:
+                    if len(fresh) > 1:
+                        await self._run_batch(fresh, channel)
+                    elif fresh:
+                        await ask_pappu(fresh[0].user, fresh[0].text, False, channel,
+                                        feats=fresh[0].feats, reply_to=fresh[0].reply_to)
+                except Exception as e:
+                    METRICS.inc("pappu_errors_total", where="ask")
+                    print("Warning: ask worker failed:", e)
+        finally:
+            self._workers[key] = self._workers.get(key, 1) - 1
+            if self._workers[key] <= 0:
+                self._workers.pop(key, None)
+                if not self._pending.get(key):
+                    self._pending.pop(key, None)
+
+    async def _run_batch(self, jobs: List[_AskJob], channel: discord.abc.Messageable):
+        guild_id = _guild_id_of(channel)
+        allowed = []
+        for job in jobs:
+            if RATE_LIMITER.allow("llm", job.user.id, guild_id):
+                allowed.append(job)
+            else:
+                await ask_pappu(job.user, job.text, False, channel, feats=job.feats, llm_allowed=False)
+        jobs = allowed
+        if not jobs:
+            return
+        self.stats["batches"] += 1
+        self.stats["batched"] += len(jobs)
+        mode = RUNTIME_SETTINGS.get("mode", "funny")
+        lang = choose_language_for_reply("")
+        questions = "\n".join(f"### {i + 1}\n{job.text}" for i, job in enumerate(jobs))
+        prompt = (
+            build_lang_preamble(mode, False, lang)
+            + "\n\nSeveral different users asked you questions at the same time. "
+            "Answer each one separately and independently, in the same numbered format: "
+            "a line '### <number>' followed by that answer. Do not add anything else.\n\n"
+            + questions
+        )
+        answers: Dict[int, str] = {}
+        model_down = False
+        try:
+            async with channel.typing():
+                out = await generate_text(prompt) or ""
+            parts = _BATCH_SPLIT_RE.split(out)
+            # split => ["pre", "1", "ans1", "2", "ans2", ...]
+            for i in range(1, len(parts) - 1, 2):
+                ans = parts[i + 1].strip()
+                if ans:
+                    answers[int(parts[i])] = ans
+        except Exception as e:
+            METRICS.inc("pappu_errors_total", where="batch")
+            print("Warning: batched ask failed:", e)
+            # model/gateway hi down hai to har user ke liye dobara call bekaar
+            model_down = isinstance(e, LLMUnavailable) or getattr(e, "code", None) == "unavailable"
+
+        for i, job in enumerate(jobs):
+            ans = answers.get(i + 1)
+            if not ans:
+                # batch se jawab nahi nikla – is user ke liye normal path (token already charged)
+                await ask_pappu(job.user, job.text, False, channel, feats=job.feats, llm_allowed=not model_down)
+                continue
+            # cache nahi: combined batch prompt ka jawab akele sawaal ke prompt jaisa nahi hota
+            sent = await send_long_message(channel, f"{job.user.mention} {deep_mood_prefix(job.user.id)}{ans}")
+            CONVERSATIONS.record(getattr(channel, "id", 0), job.user.id, job.text, ans, [m.id for m in sent])
+
+
+def _batchable(job: _AskJob, channel_id, guild_id: Optional[int]) -> bool:
+    """Sirf simple, shared-prompt sawaal batch me jaate hain (aur jinka LLM quota bacha hai)."""
+    if is_owner(job.user) or needs_user_memory(job.text):
+        return False
+    if not RATE_LIMITER.allow("llm", job.user.id, guild_id, consume=False):
+        return False
+    hits = job.feats.hits if job.feats is not None and job.feats.clean_text == job.text else KEYWORD_MATCHER.scan(job.text)
+    if hits.has("live"):
+        return False
+    if job.reply_to is not None or (hits.has("followup") and CONVERSATIONS.last(channel_id, job.user.id)):
+        return False
+    return True
+
+
+ASK_SCHEDULER = ChannelAskScheduler()
+
+
+def _collect_runtime_metrics() -> List[tuple]:
+    """Scrape-time gauges: caches, queues, persistence counters."""
+    out = []
+    for label, cache in (("llm", RESPONSE_CACHE), ("search", SEARCH_CACHE)):
+        out.append(("pappu_cache_hits", {"cache": label}, cache.hits))
+        out.append(("pappu_cache_misses", {"cache": label}, cache.misses))
+    out.append(("pappu_outbound_queue_depth", {}, sum(OUTBOUND.depth(k) for k in list(OUTBOUND._queues))))
+    out.append(("pappu_ask_pending", {}, sum(ASK_SCHEDULER.depth(k) for k in list(ASK_SCHEDULER._pending))))
+    for name, value in list(ASK_SCHEDULER.stats.items()):
+        out.append(("pappu_ask_jobs", {"outcome": name}, value))
+    for name, value in list(PERSIST_STATS.items()):
+        out.append((f"pappu_persist_{name}", {}, value))
+    for name, value in CONVERSATIONS.stats().items():
+        out.append((f"pappu_conversation_{name}", {}, value))
+    for phase, sec in list(STARTUP_TIMINGS.items()):
+        out.append(("pappu_startup_seconds", {"phase": phase}, sec))
+    out.append(("pappu_llm_abandoned_threads", {}, llm_client.abandoned_count()))
+    for ep in LLM_CLIENT.endpoints:
+        out.append(("pappu_llm_breaker_open", {"model": ep.name}, int(ep.breaker.state != "closed")))
+    return out
+
+
+METRICS.collectors.append(_collect_runtime_metrics)
+
+
 # ---------- PART 6: SECRET ADMIN + OWNER NL ADMIN ----------
+_EDIT_LAST_RE = re.compile(
+    r"^\s*pappu\s+edit\s+(?:last|pichla)(?:\s+(?:reply|message|msg))?\s*[:\-]?\s+(.+)$",
+    re.I | re.S,
+)
+
+
 async def handle_secret_admin(message: discord.Message, clean_text: str) -> bool:
     if not is_owner(message.author):
         return False
 
-    global ALLOW_PROFANITY
     text = (clean_text or "").lower().strip()
 
     # shutdown
     if text in ("pappu shutdown", "pappu stop", "pappu sleep"):
-        await message.channel.send("Theek hai Papa ji, going offline. 👋")
+        await send_message(message.channel, "Theek hai Papa ji, going offline. 👋")
         save_persistent_state()
+        await close_http_session()
         try:
             await bot.close()
         except Exception:
@@ -803,88 +3707,175 @@ async def handle_secret_admin(message: discord.Message, clean_text: str) -> bool
 
     # restart
     if text in ("pappu restart", "pappu reboot"):
-        await message.channel.send("Restarting now, Papa ji... 🔁")
+        await send_message(message.channel, "Restarting now, Papa ji... 🔁")
         save_persistent_state()
         try:
             python = sys.executable
             os.execv(python, [python] + sys.argv)
         except Exception as e:
-            await message.channel.send(f"Restart failed: `{e}` — restart from panel.")
+            await send_message(message.channel, f"Restart failed: `{e}` — restart from panel.")
+        return True
+
+    # roasts / keyword lists / modes data files se dobara (reconnect ke bina)
+    if text in ("pappu reload", "pappu reload data"):
+        t0 = time.perf_counter()
+        try:
+            data = await reload_chat_data()
+        except Exception as e:
+            METRICS.inc("pappu_errors_total", where="reload")
+            await send_message(message.channel, f"Reload failed: `{e}` — purani lists hi chal rahi hain.")
+            return True
+        ms = (time.perf_counter() - t0) * 1000
+        await send_message(message.channel, f"Reload ho gaya ({ms:.0f} ms): {data.summary()}.")
         return True
 
     # owner_dm toggle
     if text.startswith("pappu owner_dm"):
         if "on" in text:
-            RUNTIME_SETTINGS["owner_dm_only"] = True
-            save_persistent_state()
-            await message.channel.send("Owner DM only mode ON.")
+            update_setting("owner_dm_only", True)
+            await send_message(message.channel, "Owner DM only mode ON.")
         elif "off" in text:
-            RUNTIME_SETTINGS["owner_dm_only"] = False
-            save_persistent_state()
-            await message.channel.send("Owner DM only mode OFF.")
+            update_setting("owner_dm_only", False)
+            await send_message(message.channel, "Owner DM only mode OFF.")
         else:
-            await message.channel.send("Use: `pappu owner_dm on` / `pappu owner_dm off`")
+            await send_message(message.channel, "Use: `pappu owner_dm on` / `pappu owner_dm off`")
         return True
 
     # stealth
     if text.startswith("pappu stealth"):
         if "on" in text:
-            RUNTIME_SETTINGS["stealth"] = True
-            save_persistent_state()
-            await message.channel.send("Stealth ON.")
-            try:
-                await bot.change_presence(status=discord.Status.invisible)
-            except Exception:
-                pass
+            update_setting("stealth", True)
+            await send_message(message.channel, "Stealth ON.")
+            await apply_presence()
         elif "off" in text:
-            RUNTIME_SETTINGS["stealth"] = False
-            save_persistent_state()
-            await message.channel.send("Stealth OFF.")
-            try:
-                await bot.change_presence(status=discord.Status.online)
-            except Exception:
-                pass
+            update_setting("stealth", False)
+            await send_message(message.channel, "Stealth OFF.")
+            await apply_presence()
         else:
-            await message.channel.send("Use: `pappu stealth on` / `pappu stealth off`")
+            await send_message(message.channel, "Use: `pappu stealth on` / `pappu stealth off`")
         return True
 
     # mode
     if text.startswith("pappu mode"):
         parts = text.split()
         if len(parts) >= 3 and apply_mode(parts[2]):
-            await message.channel.send(f"Mode set to `{parts[2]}`.")
+            await send_message(message.channel, f"Mode set to `{parts[2]}`.")
         else:
-            await message.channel.send("Usage: `pappu mode funny|angry|serious|...`")
+            await send_message(message.channel, "Usage: `pappu mode funny|angry|serious|...`")
         return True
 
     # english strict toggle (owner)
     if text.startswith("pappu english"):
         if "on" in text:
-            RUNTIME_SETTINGS["english_lock"] = True
-            save_persistent_state()
-            await message.channel.send("English-Lock ON. Ab sirf English me reply karunga.")
+            update_setting("english_lock", True)
+            await send_message(message.channel, "English-Lock ON. Ab sirf English me reply karunga.")
+        elif "off" in text:
+            update_setting("english_lock", False)
+            await send_message(message.channel, "English-Lock OFF. Ab sirf Hinglish me reply karunga.")
+        else:
+            await send_message(message.channel, "Use: `pappu english on` / `pappu english off`")
+        return True
+
+    # streaming replies toggle (owner)
+    if text.startswith("pappu stream"):
+        if "on" in text:
+            update_setting("streaming", True)
+            await send_message(message.channel, "Streaming replies ON.")
         elif "off" in text:
-            RUNTIME_SETTINGS["english_lock"] = False
-            save_persistent_state()
-            await message.channel.send("English-Lock OFF. Ab sirf Hinglish me reply karunga.")
+            update_setting("streaming", False)
+            await send_message(message.channel, "Streaming replies OFF.")
         else:
-            await message.channel.send("Use: `pappu english on` / `pappu english off`")
+            await send_message(message.channel, "Use: `pappu stream on` / `pappu stream off`")
         return True
 
     # profanity toggle (owner)
     if "allow_profanity" in text:
         if "on" in text:
-            RUNTIME_SETTINGS["allow_profanity"] = True
-            ALLOW_PROFANITY = True
-            save_persistent_state()
-            await message.channel.send("ALLOW_PROFANITY set to ON (owner-approved).")
+            update_setting("allow_profanity", True)
+            await send_message(message.channel, "ALLOW_PROFANITY set to ON (owner-approved).")
         elif "off" in text:
-            RUNTIME_SETTINGS["allow_profanity"] = False
-            ALLOW_PROFANITY = False
-            save_persistent_state()
-            await message.channel.send("ALLOW_PROFANITY set to OFF.")
+            update_setting("allow_profanity", False)
+            await send_message(message.channel, "ALLOW_PROFANITY set to OFF.")
+        else:
+            await send_message(message.channel, "Use: `pappu allow_profanity on` / `pappu allow_profanity off`")
+        return True
+
+    # metrics summary (owner)
+    if text.startswith("pappu stats"):
+        lines = METRICS.summary_lines() + LLM_CLIENT.status()
+        for label, cache in (("LLM cache", RESPONSE_CACHE), ("Search cache", SEARCH_CACHE)):
+            lines.append(f"{label}: {cache.stats()['hit_rate'] * 100:.1f}% hits")
+        lines.append(f"Startup: {startup_report()}")
+        await send_long_message(message.channel, "\n".join(lines))
+        return True
+
+    # response/search cache stats (owner)
+    if text.startswith("pappu cache"):
+        if "clear" in text:
+            RESPONSE_CACHE.clear()
+            SEARCH_CACHE.clear()
+            await send_message(message.channel, "Response + search cache clear kar diya.")
+            return True
+        lines = []
+        for label, cache in (("LLM", RESPONSE_CACHE), ("Search", SEARCH_CACHE)):
+            st = cache.stats()
+            lines.append(
+                f"{label}: {st['hits']} hits / {st['misses']} misses "
+                f"({st['hit_rate'] * 100:.1f}%), size {st['size']}/{st['maxsize']}"
+            )
+        await send_message(message.channel, "\n".join(lines))
+        return True
+
+    # rate limits + quota usage (owner)
+    if text.startswith("pappu limits") or text.startswith("pappu quota"):
+        lines = ["Rate limits (capacity / seconds, 0 = unlimited):"]
+        for op, scopes in RATE_LIMITER.limits().items():
+            desc = ", ".join(f"{scope} {int(c)}/{int(sec)}s" for scope, (c, sec) in scopes.items())
+            lines.append(f"- {op}: {desc}")
+        top = QUOTA_USAGE.top(10)
+        if top:
+            lines.append("Top usage (allowed / denied):")
+            lines.extend(f"- `{key}`: {allowed} / {denied}" for key, allowed, denied in top)
+        await send_long_message(message.channel, "\n".join(lines))
+        return True
+
+    if text.startswith("pappu limit "):
+        parts = text.split()
+        # pappu limit <op> <user|guild> <capacity> <seconds>  |  pappu limit <op> <user|guild> off
+        if (
+            len(parts) >= 5
+            and parts[2] in RATE_LIMIT_OPS
+            and parts[3] in ("user", "guild")
+            and (parts[4] == "off" or (len(parts) >= 6 and parts[4].isdigit() and parts[5].isdigit()))
+        ):
+            if parts[4] == "off":
+                RATE_LIMITER.set_limit(parts[2], parts[3], 0, 60)
+                await send_message(message.channel, f"`{parts[2]}` {parts[3]} limit OFF.")
+            else:
+                RATE_LIMITER.set_limit(parts[2], parts[3], int(parts[4]), max(1, int(parts[5])))
+                await send_message(
+                    message.channel, f"`{parts[2]}` {parts[3]} limit: {parts[4]} per {parts[5]}s."
+                )
         else:
-            await message.channel.send("Use: `pappu allow_profanity on` / `pappu allow_profanity off`")
+            await send_message(
+                message.channel,
+                "Use: `pappu limit llm|search|rewrite user|guild <count> <seconds>` ya `... off`",
+            )
+        return True
+
+    # outbound send queues (owner)
+    if text.startswith("pappu outbox"):
+        stats = OUTBOUND.stats()
+        if not stats:
+            await send_message(message.channel, "Outbox khali hai, abhi tak kuch nahi bheja.")
+            return True
+        busiest = sorted(stats.items(), key=lambda kv: kv[1]["sent"], reverse=True)[:10]
+        lines = [
+            f"<#{cid}>: depth {st['depth']}, sent {st['sent']} (+{st['merged']} merged), "
+            f"avg {st['avg_latency_ms']:.0f}ms, max {st['max_latency_ms']:.0f}ms, errors {st['errors']}"
+            for cid, st in busiest
+        ]
+        await send_long_message(message.channel, "\n".join(lines))
         return True
 
     # Guild-only admin commands
@@ -902,19 +3893,64 @@ async def handle_secret_admin(message: discord.Message, clean_text: str) -> bool
             target_member = m
             break
 
-    # delete last bot message
+    # edit last bot message: "pappu edit last <naya text>"
+    edit_match = _EDIT_LAST_RE.match(clean_text or "")
+    if edit_match:
+        new_text = edit_match.group(1).strip()
+        if target_channel is not message.channel:
+            new_text = new_text.replace(target_channel.mention, "").strip()
+        last = await recent_bot_messages(target_channel, 1)
+        if not last or not new_text:
+            await send_message(message.channel, "Papa ji, edit karne ko last Pappu message nahi mila.")
+            return True
+        try:
+            try:
+                edited = await last[0].edit(content=new_text[:DISCORD_MSG_LIMIT])
+            except discord.NotFound:
+                # index wala message kisi ne delete kar diya – hata ke history se agla lo
+                BOT_MESSAGES.discard(last[0].id, target_channel.id)
+                last = await recent_bot_messages(target_channel, 1)
+                if not last:
+                    raise
+                edited = await last[0].edit(content=new_text[:DISCORD_MSG_LIMIT])
+            if edited is not None:
+                BOT_MESSAGES.add(edited)
+            await send_message(message.channel, "Last Pappu message edit kar diya.")
+        except Exception as e:
+            await send_message(message.channel, f"Edit nahi hua: `{e}`")
+        return True
+
+    # delete last bot message(s): "pappu delete last" / "pappu delete last 5"
     if any(k in text for k in ["delete", "del", "uda", "hata", "remove"]) and any(
         k in text for k in ["last", "pichla", "pichle"]
     ):
-        async for msg in target_channel.history(limit=50):
-            if msg.author == bot.user:
+        count_match = re.search(r"\b(\d{1,3})\b", text)
+        count = min(BOT_CHANNEL_INDEX_SIZE, max(1, int(count_match.group(1)))) if count_match else 1
+        targets = await recent_bot_messages(target_channel, count)
+        if not targets:
+            await send_message(message.channel, "Papa ji, last Pappu message nahi mila.")
+            return True
+        deleted = 0
+        if len(targets) > 1:
+            try:
+                # ek hi bulk-delete API call (14 din se purane ho to neeche ek-ek karke)
+                await target_channel.delete_messages(targets)
+                deleted = len(targets)
+            except Exception:
+                deleted = 0
+        if not deleted:
+            for msg in targets:
                 try:
                     await msg.delete()
+                    deleted += 1
                 except Exception:
                     pass
-                await message.channel.send(f"{target_channel.mention} me last Pappu message delete kar diya.")
-                return True
-        await message.channel.send("Papa ji, last Pappu message nahi mila.")
+        for msg in targets:
+            BOT_MESSAGES.discard(msg.id, target_channel.id)
+        if count == 1:
+            await send_message(message.channel, f"{target_channel.mention} me last Pappu message delete kar diya.")
+        else:
+            await send_message(message.channel, f"{target_channel.mention} me Pappu ke {deleted} message delete kar diye.")
         return True
 
     # announcement
@@ -926,7 +3962,7 @@ async def handle_secret_admin(message: discord.Message, clean_text: str) -> bool
             topic = topic.replace(ch.mention, "")
         topic = topic.strip()
         if not topic:
-            await message.channel.send("Announcement kis topic par chahiye Papa ji?")
+            await send_message(message.channel, "Announcement kis topic par chahiye Papa ji?")
             return True
         await ask_pappu(message.author, topic, True, target_channel)
         return True
@@ -935,64 +3971,64 @@ async def handle_secret_admin(message: discord.Message, clean_text: str) -> bool
     # UNMUTE
     if "unmute" in text:
         if not target_member:
-            await message.channel.send("Kisko unmute karna hai @mention karo.")
+            await send_message(message.channel, "Kisko unmute karna hai @mention karo.")
             return True
         muted_role = discord.utils.get(guild.roles, name="Muted")
         if not muted_role:
-            await message.channel.send("Muted role nahi mila.")
+            await send_message(message.channel, "Muted role nahi mila.")
             return True
         try:
             await target_member.remove_roles(muted_role)
-            await message.channel.send(f"{target_member.mention} ka mute hata diya.")
+            await send_message(message.channel, f"{target_member.mention} ka mute hata diya.")
         except Exception as e:
-            await message.channel.send(f"Error: `{e}`")
+            await send_message(message.channel, f"Error: `{e}`")
         return True
 
     # MUTE
     if "mute" in text and "unmute" not in text:
         if not target_member:
             # no direct mention => treat as baat-cheet, not command
-            await message.channel.send(
+            await send_message(message.channel, 
                 "Samajh gaya Papa ji, kisi ka mute scene chal raha hai. "
                 "Agar mujhe mute karwana ho to @mention ke saath bolo. 🙂"
             )
             return True
         muted_role = discord.utils.get(guild.roles, name="Muted")
         if not muted_role:
-            await message.channel.send("Muted role nahi mila.")
+            await send_message(message.channel, "Muted role nahi mila.")
             return True
         try:
             await target_member.add_roles(muted_role)
-            await message.channel.send(f"{target_member.mention} ko mute kar diya.")
+            await send_message(message.channel, f"{target_member.mention} ko mute kar diya.")
         except Exception as e:
-            await message.channel.send(f"Error: `{e}`")
+            await send_message(message.channel, f"Error: `{e}`")
         return True
 
     # KICK
     if "kick" in text or "bahar nikal" in text:
         if not target_member:
-            await message.channel.send("Kisko kick karna hai @mention karo.")
+            await send_message(message.channel, "Kisko kick karna hai @mention karo.")
             return True
         try:
             await target_member.kick()
-            await message.channel.send(f"{target_member} ko kick kar diya.")
+            await send_message(message.channel, f"{target_member} ko kick kar diya.")
         except Exception as e:
-            await message.channel.send(f"Error: `{e}`")
+            await send_message(message.channel, f"Error: `{e}`")
         return True
 
     # BAN
     if "ban" in text and "unban" not in text:
         if not target_member:
-            await message.channel.send(
+            await send_message(message.channel, 
                 "Samajh gaya Papa ji, kisi ko ban kiya gaya hai ya ban ki baat ho rahi hai. "
                 "Agar mujhe kisi ko ban karwana ho to @mention ke saath bolna. 🙂"
             )
             return True
         try:
             await guild.ban(target_member)
-            await message.channel.send(f"{target_member} ko ban kar diya.")
+            await send_message(message.channel, f"{target_member} ko ban kar diya.")
         except Exception as e:
-            await message.channel.send(f"Error: `{e}`")
+            await send_message(message.channel, f"Error: `{e}`")
         return True
 
     # UNBAN
@@ -1004,7 +4040,7 @@ async def handle_secret_admin(message: discord.Message, clean_text: str) -> bool
                 target_spec = p
                 break
         if not target_spec and target_member is None:
-            await message.channel.send("Kisko unban karna hai? user#1234 ya ID batao.")
+            await send_message(message.channel, "Kisko unban karna hai? user#1234 ya ID batao.")
             return True
         try:
             bans = await guild.bans()
@@ -1021,12 +4057,12 @@ async def handle_secret_admin(message: discord.Message, clean_text: str) -> bool
                         user_obj = user
                         break
             if not user_obj:
-                await message.channel.send("Ban list me user nahi mila.")
+                await send_message(message.channel, "Ban list me user nahi mila.")
                 return True
             await guild.unban(user_obj)
-            await message.channel.send(f"{user_obj} ko unban kar diya.")
+            await send_message(message.channel, f"{user_obj} ko unban kar diya.")
         except Exception as e:
-            await message.channel.send(f"Error: `{e}`")
+            await send_message(message.channel, f"Error: `{e}`")
         return True
 
     # owner-requested insult (ye HI dusro ko roast karega, baaki auto nahi)
@@ -1039,56 +4075,68 @@ async def handle_secret_admin(message: discord.Message, clean_text: str) -> bool
         ]
     ):
         if not target_member:
-            await message.channel.send("Kisko insult bhejna hai @mention karo.")
+            await send_message(message.channel, "Kisko insult bhejna hai @mention karo.")
             return True
         prof = RUNTIME_SETTINGS.get("allow_profanity", False)
         roast = choose_roast(get_nice_name(target_member), profane=prof)
-        await message.channel.send(roast)
+        await send_message(message.channel, roast)
         return True
 
     return False
 
 
 # ---------- PART 7: Events + commands (on_message includes auto-retaliation) ----------
+async def _setup_hook():
+    # login ho chuka, gateway abhi connect hoga – state load uske saath-saath
+    startup_mark("login")
+    if DEFER_STATE:
+        start_state_load()
+
+
+bot.setup_hook = _setup_hook
+
+
 @bot.event
 async def on_ready():
+    await ensure_state_loaded()
+    if "ready" not in STARTUP_TIMINGS:
+        startup_mark("ready")
+        print("Startup:", startup_report())
     print(f"✅ {bot.user} online hai Papa ji!")
-    try:
-        if RUNTIME_SETTINGS.get("stealth"):
-            await bot.change_presence(status=discord.Status.invisible)
-        else:
-            await bot.change_presence(status=discord.Status.online)
-    except Exception:
-        pass
+    start_background_task("persistence", persistence_loop)
+    start_background_task("expiry", expiry_loop)
+    start_background_task("loop_lag", loop_lag_loop)
+    if DATA_WATCH_INTERVAL > 0:
+        start_background_task("data_watch", data_watch_loop)
+    if SHARED_SETTINGS is not None:
+        start_background_task("settings_sync", settings_sync_loop)
+    await apply_presence()
 
 
 @bot.event
 async def on_message(message: discord.Message):
     if message.author.bot:
         return
+    await ensure_state_loaded()  # fast start: state aane tak pehle messages ruk jaate hain
+    METRICS.inc("pappu_messages_total")
 
-    content = message.content or ""
-    content_lower = content.lower()
+    # ek baar analysis – memory updates + routing sab isi record se padhte hain
+    feats = analyze_message(message)
+    content = feats.text
+    hits = feats.hits
 
     # 🔥 ULTRA MEMORY HOOK – har non-bot message log + traits + mood
-    process_deep_memory(message.author.id, content)
+    process_deep_memory(message.author.id, feats)
+
+    # reply ho to referenced message ek hi baar resolve (aksar bina API call ke)
+    ref_msg = await resolve_reference(message) if message.reference else None
+    reply_to_bot = ref_msg is not None and ref_msg.author == bot.user
 
     # ---------- SUPER FOLLOW-UP HANDLER (Detail expansion on reply) ----------
-    if (
-        message.reference
-        and message.reference.resolved
-        and message.reference.resolved.author == bot.user
-    ):
-        detail_keywords = [
-            "detail", "details", "thoda detail", "thodi detail",
-            "zyada detail", "aur detail", "deep me", "deep mein",
-            "in depth", "zyada smjha", "zyada samjha"
-        ]
-        if any(k in content_lower for k in detail_keywords):
-            original = message.reference.resolved
-            await expand_previous_reply(message.author, original, content, message.channel)
-            await bot.process_commands(message)
-            return
+    if reply_to_bot and hits.has("detail"):
+        await expand_previous_reply(message.author, ref_msg, content, message.channel)
+        await bot.process_commands(message)
+        return
 
     # owner_dm_only enforcement
     if RUNTIME_SETTINGS.get("owner_dm_only", False) and not is_owner(message.author):
@@ -1097,24 +4145,10 @@ async def on_message(message: discord.Message):
     # ---------------------------------------
     # STEP 1: reply-par "isko simple/asan way me bta" detection
     # ---------------------------------------
-    simplify_keywords = [
-        "simple", "simpler", "easy", "easy way",
-        "asan", "aasan", "aasaan",
-        "short", "chhota", "chota",
-        "aasaan way", "asan way"
-    ]
-    ref_msg = None
-    if message.reference:
-        try:
-            ref_msg = await message.fetch_reference()
-        except Exception:
-            ref_msg = None
-
-        if ref_msg and ref_msg.author == bot.user:
-            if any(k in content_lower for k in simplify_keywords):
-                await simplify_previous_reply(message.author, ref_msg, content, message.channel)
-                await bot.process_commands(message)
-                return
+    if reply_to_bot and hits.has("simplify"):
+        await simplify_previous_reply(message.author, ref_msg, content, message.channel)
+        await bot.process_commands(message)
+        return
 
     # ---------------------------------------
     # STEP 2: Invocation detection
@@ -1122,13 +4156,11 @@ async def on_message(message: discord.Message):
     #  - "pappu" in text
     #  - reply to Pappu (bina naam likhe)
     # ---------------------------------------
-    invoked = bot.user.mentioned_in(message) or ("pappu" in content_lower)
-    if not invoked and ref_msg and ref_msg.author == bot.user:
-        invoked = True
+    invoked = feats.invoked or reply_to_bot
 
     if invoked:
-        clean_text = content.replace(f"<@{bot.user.id}>", "").replace(f"<@!{bot.user.id}>", "").strip()
-        lowered = clean_text.lower()
+        METRICS.inc("pappu_invocations_total")
+        clean_text = feats.clean_text
 
         # Owner secret admin try first
         if is_owner(message.author):
@@ -1138,15 +4170,8 @@ async def on_message(message: discord.Message):
                 return
 
         # Creator / Owner questions
-        creator_triggers = [
-            "kisne banaya", "kisne tumhe banaya", "kisne tume banaya",
-            "who made you", "who created you", "creator kaun",
-            "developer kaun", "programmer kaun",
-            "owner kaun", "tumhara owner", "tumhara malik",
-            "papa kaun", "pappa kaun", "papa ji kaun"
-        ]
-        if any(kw in lowered for kw in creator_triggers):
-            await message.channel.send(
+        if hits.has("creator"):
+            await send_message(message.channel, 
                 f"Mujhe mere creator {CREATOR_NICK} ne banaya hai – "
                 f"yahi mere 'Papa Ji' hain is server pe. 😎"
             )
@@ -1154,59 +4179,72 @@ async def on_message(message: discord.Message):
             return
 
         # AUTO-RETALIATE ON INSULTS – sirf jab Pappu ko gaali di ho
-        has_profanity = any(k in lowered for k in PROFANE_KEYWORDS)
+        has_profanity = hits.has("profane")
         insult_to_bot = False
 
         if has_profanity:
             # Case 1: reply to Pappu ke message pe gaali
-            if ref_msg and ref_msg.author == bot.user:
+            if reply_to_bot:
                 insult_to_bot = True
             # Case 2: text me 'pappu' + gaali, aur kisi aur user ka @mention nahi
-            elif "pappu" in lowered and not message.mentions:
+            elif feats.says_pappu and not message.mentions:
                 insult_to_bot = True
 
         if has_profanity and insult_to_bot:
             if RUNTIME_SETTINGS.get("allow_profanity", False):
                 roaster_name = get_nice_name(message.author)
                 roast = choose_roast(roaster_name, profane=True)
-                await message.channel.send(roast)
+                await send_message(message.channel, roast)
                 await bot.process_commands(message)
                 return
             else:
-                await message.channel.send("Papa ji, shishtachar rakho. Aise mat bolo.")
+                await send_message(message.channel, "Papa ji, shishtachar rakho. Aise mat bolo.")
                 await bot.process_commands(message)
                 return
 
         # Normal chat
-        if not clean_text or clean_text.lower() in ["pappu", "pappu?", "pappu!", "pappu bot"]:
+        if not clean_text or feats.clean_lower in ["pappu", "pappu?", "pappu!", "pappu bot"]:
             name = get_nice_name(message.author)
-            await message.channel.send(f"Haan {name}, bol kya scene hai? 😎")
+            await send_message(message.channel, f"Haan {name}, bol kya scene hai? 😎")
         else:
-            await ask_pappu(message.author, clean_text, False, message.channel)
+            await ASK_SCHEDULER.submit(
+                message.author, clean_text, message.channel, feats,
+                reply_to=ref_msg.id if reply_to_bot else None,
+            )
 
     await bot.process_commands(message)
 
 
+@bot.event
+async def on_raw_message_delete(payload):
+    # koi aur Pappu ka message uda de to index me stale ID na rahe
+    BOT_MESSAGES.discard(payload.message_id, payload.channel_id)
+
+
 # Simple commands
 @bot.command(name="hello")
 async def hello_cmd(ctx):
     name = get_nice_name(ctx.author)
-    await ctx.send(f"Namaste {name}! 🙏 Main Pappu Programmer hu.")
+    await send_message(ctx.channel, f"Namaste {name}! 🙏 Main Pappu Programmer hu.")
 
 
 @bot.command(name="ask")
 async def ask_cmd(ctx, *, question: str):
-    await ask_pappu(ctx.author, question, False, ctx.channel)
+    await ASK_SCHEDULER.submit(ctx.author, question, ctx.channel)
 
 
 # ---------- PART 8: Run + alias + final save ----------
 # compatibility alias so older callsites keep working
 handle_owner_nl_admin = handle_secret_admin
 
+startup_mark("module")
+
 if __name__ == "__main__":
     if not DISCORD_TOKEN:
         print("❌ DISCORD_TOKEN missing in .env")
         sys.exit(1)
+    if METRICS_PORT:
+        start_metrics_server(METRICS_PORT)
     try:
         bot.run(DISCORD_TOKEN)
     finally:
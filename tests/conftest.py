@@ -0,0 +1,83 @@
+import importlib
+import itertools
+import sys
+from pathlib import Path
+
+import pytest
+
+REPO_DIR = Path(__file__).resolve().parents[1]
+
+
+@pytest.fixture(scope="module")
+def main(tmp_path_factory):
+    # main import par pappu_state.json / pappu_memory.db cwd me bante hain
+    mp = pytest.MonkeyPatch()
+    mp.chdir(tmp_path_factory.mktemp("pappu"))
+    mp.setenv("GEMINI_API_KEY", "")
+    mp.setenv("DATA_WATCH_INTERVAL", "0")
+    mp.syspath_prepend(str(REPO_DIR))
+    module = importlib.import_module("main")
+    yield module
+    mp.undo()
+    sys.modules.pop("main", None)
+
+
+@pytest.fixture(scope="module")
+def llm():
+    mp = pytest.MonkeyPatch()
+    mp.syspath_prepend(str(REPO_DIR))
+    module = importlib.import_module("llm_client")
+    yield module
+    mp.undo()
+
+
+_IDS = itertools.count(1000)
+
+
+class FakeMessage:
+    def __init__(self, channel, content):
+        self.id = next(_IDS)
+        self.channel = channel
+        self.content = content
+
+    async def edit(self, content):
+        self.content = content
+        return self
+
+
+class FakeChannel:
+    def __init__(self):
+        self.id = 42
+        self.sent = []
+
+    async def send(self, content):
+        msg = FakeMessage(self, content)
+        self.sent.append(msg)
+        return msg
+
+    def typing(self):
+        return _AsyncNull()
+
+
+class _AsyncNull:
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+
+class FakeUser:
+    id = 7
+    name = display_name = "tester"
+    mention = "<@7>"
+
+
+@pytest.fixture
+def channel():
+    return FakeChannel()
+
+
+@pytest.fixture
+def user():
+    return FakeUser()
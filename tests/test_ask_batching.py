@@ -0,0 +1,21 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("discord")
+pytest.importorskip("aiohttp")
+pytest.importorskip("dotenv")
+
+
+def test_batched_answers_are_not_cached(main, monkeypatch, channel, user):
+    async def batch_reply(prompt, timeout=None, job=None):
+        return "### 1\npehla jawab\n### 2\ndoosra jawab"
+
+    monkeypatch.setattr(main, "generate_text", batch_reply)
+    main.RESPONSE_CACHE.clear()
+    jobs = [main._AskJob(user, "python kya hai", None), main._AskJob(user, "java kya hai", None)]
+
+    asyncio.run(main.ChannelAskScheduler()._run_batch(jobs, channel))
+
+    assert [m.content for m in channel.sent] == ["<@7> pehla jawab", "<@7> doosra jawab"]
+    assert len(main.RESPONSE_CACHE) == 0
@@ -0,0 +1,34 @@
+import pytest
+
+pytest.importorskip("discord")
+pytest.importorskip("aiohttp")
+pytest.importorskip("dotenv")
+
+
+class _Ch:
+    def __init__(self, cid):
+        self.id = cid
+
+
+class _Msg:
+    def __init__(self, mid, channel):
+        self.id = mid
+        self.channel = channel
+
+
+def test_discard_ignores_foreign_ids_and_stays_in_channel(main):
+    cache = main.BotMessageCache(maxsize=2, per_channel=3)
+    a, b = _Ch(1), _Ch(2)
+    for mid in (10, 11, 12, 13):
+        cache.add(_Msg(mid, a))
+    cache.add(_Msg(20, b))
+
+    cache.discard(999, 1)  # kisi aur ka message
+    cache.discard(10, 1)  # index se pehle hi gir chuka
+    assert cache.recent_ids(1, 5) == [13, 12, 11]
+
+    cache.discard(11, 1)  # object LRU se nikal chuka, sirf ID index me
+    assert cache.recent_ids(1, 5) == [13, 12]
+    cache.discard(20, 2)
+    assert cache.recent_ids(2, 5) == []
+    assert cache._indexed == {12, 13}
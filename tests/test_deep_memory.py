@@ -0,0 +1,101 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("discord")
+pytest.importorskip("aiohttp")
+pytest.importorskip("dotenv")
+
+
+def _hit(main, store, key, text, toxic=False):
+    prof = store.get(key)
+    if prof is None:
+        prof = main.UserProfile()
+        store.put(key, prof)
+    prof.add_message(text)
+    prof.add_topic(text)
+    if toxic:
+        prof.bump_trait("toxicity", 1)
+    store.touch(key)
+
+
+def _flush(store):
+    store.write_rows(store.take_dirty())
+
+
+def test_shared_stores_merge_instead_of_overwriting(main, tmp_path):
+    db = tmp_path / "shared.db"
+    a = main.SqliteDeepMemoryStore(db, 8, shared=True)
+    b = main.SqliteDeepMemoryStore(db, 8, shared=True)
+
+    _hit(main, a, "1", "a1")
+    _hit(main, b, "1", "b1", toxic=True)
+    _hit(main, a, "1", "a2", toxic=True)
+    _flush(b)
+    _flush(a)
+    # b ka hot copy flush ke saath gaya – agli access a ke writes bhi dekhe
+    _hit(main, b, "1", "b2")
+    _flush(b)
+
+    prof = a.get("1")
+    assert prof.messages == ["b1", "a1", "a2", "b2"]
+    assert prof.topics == ["b1", "a1", "a2", "b2"]
+    assert prof.trait("toxicity") == 7.0
+
+
+def test_shared_store_keeps_spilled_deltas(main, tmp_path):
+    store = main.SqliteDeepMemoryStore(tmp_path / "shared.db", 1, shared=True)
+    _hit(main, store, "1", "first")
+    _hit(main, store, "2", "other")  # "1" hot set se spill
+    _hit(main, store, "1", "second")
+    assert store.get("1").messages == ["first", "second"]
+    _flush(store)
+    assert store.get("1").messages == ["first", "second"]
+    assert store.get("2").messages == ["other"]
+
+
+def test_state_file_written_by_one_cluster_only(main, monkeypatch):
+    main.PERSIST_FILE.unlink(missing_ok=True)
+    monkeypatch.setattr(main, "STATE_LOADED", True)
+    monkeypatch.setattr(main, "STATE_FILE_WRITER", False)
+    main._write_snapshot_rows([], "{}")
+    assert not main.PERSIST_FILE.exists()
+    monkeypatch.setattr(main, "STATE_FILE_WRITER", True)
+    main._write_snapshot_rows([], "{}")
+    assert main.PERSIST_FILE.exists()
+
+
+def _age(store, key):
+    store.get(key).last_interaction = 100
+
+
+@pytest.mark.parametrize("shared", [False, True])
+def test_expire_before_drops_dirty_hot_users(main, tmp_path, shared):
+    store = main.SqliteDeepMemoryStore(tmp_path / "mem.db", 8, shared=shared)
+    _hit(main, store, "old", "purana")
+    _age(store, "old")
+    _flush(store)
+    _hit(main, store, "old", "phir se")  # hot + dirty, par phir bhi expired
+    _age(store, "old")
+    _hit(main, store, "active", "abhi")
+
+    asyncio.run(store.expire_before(int(main.time.time()) - 10))
+    _flush(store)
+
+    assert store.get("old") is None
+    assert store.get("active").messages == ["abhi"]
+
+
+@pytest.mark.parametrize("shared", [False, True])
+def test_expire_before_drops_spilled_rows(main, tmp_path, shared):
+    store = main.SqliteDeepMemoryStore(tmp_path / "mem.db", 1, shared=shared)
+    _hit(main, store, "gone", "x")
+    _age(store, "gone")
+    _hit(main, store, "active", "abhi")  # "gone" unflushed hi spill hua
+    assert store.dirty_count() == 2
+
+    asyncio.run(store.expire_before(int(main.time.time()) - 10))
+    _flush(store)
+
+    assert store.get("gone") is None
+    assert store.get("active").messages == ["abhi"]
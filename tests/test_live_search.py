@@ -0,0 +1,34 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("discord")
+pytest.importorskip("aiohttp")
+pytest.importorskip("dotenv")
+
+
+async def _times_out(query):
+    await asyncio.sleep(0.01)
+    raise asyncio.TimeoutError()  # provider ka apna (aiohttp) timeout
+
+
+async def _answers(query):
+    await asyncio.sleep(0.05)
+    return f"result for {query}"
+
+
+async def _hangs(query):
+    await asyncio.sleep(10)
+
+
+def test_provider_timeout_does_not_stop_race(main, monkeypatch):
+    monkeypatch.setattr(main, "_search_providers", lambda: [_times_out, _answers])
+    main.SEARCH_CACHE.clear()
+    assert asyncio.run(main.perform_live_search("ipl score")) == "result for ipl score"
+
+
+def test_overall_deadline_still_applies(main, monkeypatch):
+    monkeypatch.setattr(main, "_search_providers", lambda: [_times_out, _hangs])
+    monkeypatch.setattr(main, "SEARCH_TIMEOUT", 0.1)
+    main.SEARCH_CACHE.clear()
+    assert asyncio.run(main.perform_live_search("kal ka mausam")) == ""
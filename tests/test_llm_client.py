@@ -0,0 +1,107 @@
+import asyncio
+import threading
+
+import pytest
+
+
+class _Resp:
+    def __init__(self, text):
+        self.text = text
+
+
+class SlowModel:
+    """generate_content tab tak block jab tak release na ho."""
+
+    def __init__(self):
+        self.release = threading.Event()
+
+    def generate_content(self, prompt, stream=False, **_):
+        if stream:
+            return self._stream()
+        self.release.wait(5)
+        return _Resp("ok")
+
+    def _stream(self):
+        for i in range(100):
+            self.release.wait(0.01)
+            yield _Resp(f"c{i} ")
+
+
+async def _drain(llm):
+    """Worker threads khatam hone do, taaki slot isi loop par wapas aaye."""
+    for _ in range(200):
+        if not llm._LLM_ABANDONED:
+            return
+        await asyncio.sleep(0.01)
+
+
+def _half_open(breaker):
+    breaker.failures = breaker.max_failures
+    breaker.open_until = 0.0
+    assert breaker.state == "half-open"
+
+
+def test_cancelled_probe_frees_half_open_slot(llm):
+    slow = SlowModel()
+    ep = llm.ModelEndpoint("slow", slow)
+    client = llm.LLMClient([ep])
+    _half_open(ep.breaker)
+
+    async def run():
+        task = asyncio.ensure_future(client.generate("hi", timeout=5))
+        await asyncio.sleep(0.05)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        slow.release.set()
+        out = await client.generate("hi", timeout=5)
+        await _drain(llm)
+        return out
+
+    assert asyncio.run(run()) == "ok"
+    assert ep.breaker.state == "closed"
+
+
+def test_abandoned_stream_probe_frees_half_open_slot(llm):
+    slow = SlowModel()
+    ep = llm.ModelEndpoint("slow", slow)
+    client = llm.LLMClient([ep])
+    _half_open(ep.breaker)
+
+    async def run():
+        gen = client.stream("hi", timeout=5)
+        await gen.__anext__()
+        await gen.aclose()  # consumer beech me ruk gaya
+        await _drain(llm)
+        return ep.breaker.allow()
+
+    assert asyncio.run(run())
+
+
+def test_probe_slot_expires(llm, monkeypatch):
+    breaker = llm.CircuitBreaker(1, 30)
+    _half_open(breaker)
+    now = llm.time.monotonic()
+    assert breaker.allow()
+    assert not breaker.allow()  # probe chal raha hai
+    monkeypatch.setattr(llm.time, "monotonic", lambda: now + 31)
+    assert breaker.allow()
+
+
+def test_timed_out_call_keeps_worker_slot_until_thread_finishes(llm, monkeypatch):
+    monkeypatch.setattr(llm, "LLM_RETRIES", 0)
+    slow = SlowModel()
+    client = llm.LLMClient([llm.ModelEndpoint("slow", slow)])
+
+    async def run():
+        free = llm._LLM_SEMAPHORE._value
+        with pytest.raises(llm.LLMUnavailable):
+            await client.generate("hi", timeout=0.1)
+        stalled = (llm._LLM_SEMAPHORE._value, len(llm._LLM_ABANDONED))
+        slow.release.set()
+        await _drain(llm)
+        return free, stalled, llm._LLM_SEMAPHORE._value, len(llm._LLM_ABANDONED)
+
+    free, stalled, after, abandoned = asyncio.run(run())
+    assert stalled == (free - 1, 1)
+    assert (after, abandoned) == (free, 0)
@@ -0,0 +1,120 @@
+import asyncio
+import importlib
+import threading
+
+import pytest
+
+
+
+class _Resp:
+    def __init__(self, text):
+        self.text = text
+
+
+class FakeModel:
+    """'down' naam wala model hamesha fail; 'stall' ka stream pehla chunk nahi deta."""
+
+    release = threading.Event()
+
+    def __init__(self, name):
+        self.name = name
+
+    def generate_content(self, prompt, stream=False, **_):
+        if self.name == "down":
+            raise RuntimeError("503")
+        if stream:
+            return self._stream()
+        return _Resp(f"{self.name}: ok")
+
+    def _stream(self):
+        if self.name == "stall":
+            self.release.wait(5)
+        yield _Resp("chunk")
+
+
+class RecordingBackend:
+    def __init__(self):
+        self.prompts = []
+
+    async def generate(self, prompt, timeout=None):
+        self.prompts.append(prompt)
+        return "### 1\njawab 1\n### 2\njawab 2" if "### 2" in prompt else "jawab"
+
+
+@pytest.fixture
+def gateway(llm, monkeypatch):
+    genai = pytest.importorskip("google.generativeai")
+    monkeypatch.setattr(genai, "GenerativeModel", FakeModel)
+    monkeypatch.setattr(llm, "LLM_RETRIES", 0)
+    return importlib.import_module("llm_gateway")
+
+
+@pytest.fixture
+def plain_gateway(llm):
+    return importlib.import_module("llm_gateway")
+
+
+def _job(n):
+    return {"prompt": f"preamble\n\ncontext {n}\nUser message: q{n}", "timeout": 5, "cache_key": f"k{n}",
+            "batchable": True, "preamble": "preamble", "question": f"q{n}"}
+
+
+def test_single_batchable_job_uses_full_prompt(plain_gateway):
+    backend = RecordingBackend()
+    gw = plain_gateway.LLMGateway(backend, rpm=0, batch_window=0.01)
+
+    resp = asyncio.run(gw.generate(_job(1)))
+
+    assert resp["text"] == "jawab"
+    assert backend.prompts == [_job(1)["prompt"]]
+    assert gw.cache.get("k1") == "jawab"
+
+
+def test_real_batch_combines_questions(plain_gateway):
+    backend = RecordingBackend()
+    gw = plain_gateway.LLMGateway(backend, rpm=0, batch_window=0.05)
+
+    async def run():
+        return await asyncio.gather(gw.generate(_job(1)), gw.generate(_job(2)))
+
+    texts = [r["text"] for r in asyncio.run(run())]
+
+    assert texts == ["jawab 1", "jawab 2"]
+    assert len(backend.prompts) == 1 and "### 1\nq1" in backend.prompts[0]
+    # batch fragments cache me nahi jaate
+    assert gw.cache.get("k1") is None and gw.cache.get("k2") is None
+
+
+def test_gemini_backend_falls_back_through_llm_client(gateway, monkeypatch):
+    monkeypatch.setenv("GEMINI_FALLBACK_MODELS", "backup")
+    gw = gateway.LLMGateway(gateway.GeminiBackend("down", 2), rpm=0)
+
+    resp = asyncio.run(gw.generate({"prompt": "hi", "timeout": 5}))
+
+    assert resp["text"] == "backup: ok"
+    assert [ep.name for ep in gw.backend.client.endpoints] == ["down", "backup"]
+    assert gw.backend.client.endpoints[0].breaker.failures == 1
+
+
+def test_gemini_backend_stream_first_chunk_timeout(gateway, llm, monkeypatch):
+    monkeypatch.setenv("GEMINI_FALLBACK_MODELS", "")
+    monkeypatch.setattr(llm, "LLM_FIRST_CHUNK_TIMEOUT", 0.1)
+    FakeModel.release.clear()
+    backend = gateway.GeminiBackend("stall", 2)
+    sent = []
+
+    async def send(msg):
+        sent.append(msg)
+
+    async def run():
+        gw = gateway.LLMGateway(backend, rpm=0)
+        await gw.handle({"id": 1, "op": "stream", "prompt": "hi", "timeout": 5}, send)
+        FakeModel.release.set()
+        for _ in range(200):
+            if not llm._LLM_ABANDONED:
+                break
+            await asyncio.sleep(0.01)
+
+    asyncio.run(run())
+    assert sent == [{"ok": False, "error": "unavailable", "id": 1}]
+    assert not llm._LLM_ABANDONED
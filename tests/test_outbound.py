@@ -0,0 +1,55 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("discord")
+pytest.importorskip("aiohttp")
+pytest.importorskip("dotenv")
+
+
+def test_idle_channel_entries_are_dropped(main, channel):
+    out = main.OutboundDispatcher(rate=2, per=1.0)
+
+    async def run():
+        await out.send(channel, "ek")
+        await out.send(channel, "do")
+        busy = (set(out._queues), set(out._buckets))
+        # bucket khali hai – worker rukta hai, beech ka message turant jaata hai
+        t0 = asyncio.get_running_loop().time()
+        await out.send(channel, "teen")
+        waited = asyncio.get_running_loop().time() - t0
+        while channel.id in out._workers:
+            await asyncio.sleep(0.02)
+        return busy, waited
+
+    busy, waited = asyncio.run(run())
+    assert busy == ({channel.id}, {channel.id})
+    assert waited < 0.8  # linger (1s) khatam hone ka intezaar nahi
+    assert not out._queues and not out._buckets and not out._wakeups
+    assert out.stats()[channel.id]["sent"] == 3
+
+
+def test_stats_are_bounded(main):
+    out = main.OutboundDispatcher(stats_channels=2)
+    for key in range(5):
+        out._channel_stats(key)
+    assert list(out._stats) == [3, 4]
+
+
+def test_streamed_code_block_is_split_with_fences(main, monkeypatch, channel):
+    monkeypatch.setattr(main, "OUTBOUND", main.OutboundDispatcher(rate=10 ** 6))
+    code = "```python\n" + "".join(f"print('line {i}')\n" for i in range(200)) + "```\n"
+
+    async def run():
+        reply = main.StreamingReply(channel)
+        for i in range(0, len(code), 50):
+            await reply.feed(code[i:i + 50])
+        await reply.finish()
+        return reply
+
+    reply = asyncio.run(run())
+    assert len(reply.messages) > 1
+    for msg in reply.messages:
+        assert len(msg.content) <= 2000
+        assert msg.content.count("```") % 2 == 0
+    assert reply.messages[1].content.startswith("```python\n")
@@ -0,0 +1,38 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("discord")
+pytest.importorskip("aiohttp")
+pytest.importorskip("dotenv")
+
+
+def _stream(*_args, **_kwargs):
+    async def gen():
+        yield "sorted(list) use karo."
+
+    return gen()
+
+
+@pytest.mark.parametrize("text", [
+    "python me list sort kaise kare",
+    "delhi mein sabse achha khana kahan milta hai",
+    "last world cup kisne jeeta",
+])
+def test_generic_hinglish_question_gets_cache_key(main, monkeypatch, channel, user, text):
+    monkeypatch.setattr(main, "llm_available", lambda: True)
+    monkeypatch.setattr(main, "stream_text", _stream)
+    monkeypatch.setitem(main.RUNTIME_SETTINGS, "streaming", True)
+    main.RESPONSE_CACHE.clear()
+
+    asyncio.run(main.ask_pappu(user, text, False, channel, llm_allowed=True))
+
+    mode = main.RUNTIME_SETTINGS.get("mode", "funny")
+    lang = main.choose_language_for_reply(text)
+    key = main.response_cache_key(text, mode, lang, False, False)
+    assert main.RESPONSE_CACHE.get(key) == "sorted(list) use karo."
+
+
+@pytest.mark.parametrize("text", ["mera naam kya hai", "mujhe kya pasand hai", "what is my mood"])
+def test_first_person_question_skips_cache(main, text):
+    assert main.needs_user_memory(text)
@@ -0,0 +1,27 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("discord")
+pytest.importorskip("aiohttp")
+pytest.importorskip("dotenv")
+
+
+def _broken_stream(*_args, **_kwargs):
+    async def gen():
+        yield "Python me list sort karne ke liye sorted() use karo. "
+        raise RuntimeError("connection reset")
+
+    return gen()
+
+
+def test_stream_cut_off_is_not_cached(main, monkeypatch, channel, user):
+    monkeypatch.setattr(main, "llm_available", lambda: True)
+    monkeypatch.setattr(main, "stream_text", _broken_stream)
+    monkeypatch.setitem(main.RUNTIME_SETTINGS, "streaming", True)
+    main.RESPONSE_CACHE.clear()
+
+    asyncio.run(main.ask_pappu(user, "python list sort kaise kare", False, channel, llm_allowed=True))
+
+    assert len(main.RESPONSE_CACHE) == 0
+    assert channel.sent and channel.sent[-1].content.endswith(main.STREAM_CUT_NOTE)